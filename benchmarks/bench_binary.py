@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+#       bench_binary.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""Measure the per-call cost of reading integers with the precompiled
+readers of treatyofbabel.utils._binaryfuncs, against building a format
+string and calling struct.unpack_from on every read as they used to.
+
+"""
+
+
+import os
+import sys
+import struct
+import timeit
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from treatyofbabel.utils import _binaryfuncs
+
+
+def old_read_int(file_buffer, offset, endian_char='>'):
+    return struct.unpack_from('{0}I'.format(endian_char), file_buffer,
+                              offset)[0]
+
+
+def read_old(file_buffer, count):
+    return [old_read_int(file_buffer, i * 4) for i in xrange(count)]
+
+
+def read_new(file_buffer, count):
+    read_int = _binaryfuncs.read_int
+    return [read_int(file_buffer, i * 4) for i in xrange(count)]
+
+
+def read_cursor(file_buffer, count):
+    reader = _binaryfuncs.BinaryReader(file_buffer)
+    return [reader.read_int() for i in xrange(count)]
+
+
+def read_bulk(file_buffer, count):
+    return _binaryfuncs.BinaryReader(file_buffer).read_ints(count)
+
+
+if __name__ == "__main__":
+    count = 100000
+    file_buffer = buffer(struct.pack(">{0}I".format(count), *xrange(count)))
+    for name, func in [("format string per call", read_old),
+                       ("precompiled read_int", read_new),
+                       ("BinaryReader.read_int", read_cursor),
+                       ("BinaryReader.read_ints", read_bulk)]:
+        elapsed = min(timeit.repeat(lambda: func(file_buffer, count),
+                                    number=1, repeat=5))
+        print "{0}: {1:.0f} ns per integer".format(name,
+                                                   elapsed * 1e9 / count)
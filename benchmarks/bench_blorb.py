@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+#       bench_blorb.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Measure the throughput of BlorbBuilder on blorbs with many resources,
+given as files and as in-memory buffers, and of indexing the result with
+BlorbFile.
+
+"""
+
+
+import os
+import sys
+import random
+import shutil
+import struct
+import tempfile
+import timeit
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from treatyofbabel.wrappers import blorb
+
+
+def make_png(rand, size):
+    header = ("\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + "IHDR" +
+              struct.pack(">IIBBBBB", 64, 64, 8, 2, 0, 0, 0))
+    return header + "".join([chr(rand.randint(0, 255))
+                             for i in xrange(size - len(header))])
+
+
+def make_builder(story, pictures, as_files, tmp_dir):
+    builder = blorb.BlorbBuilder()
+    builder.add_story(story, "glulx")
+    for number, picture in enumerate(pictures):
+        if as_files:
+            path = os.path.join(tmp_dir, "pict{0}.png".format(number))
+            if not os.path.exists(path):
+                with open(path, "wb") as h:
+                    h.write(picture)
+            picture = path
+        else:
+            picture = bytearray(picture)
+        builder.add_picture(picture, number + 1,
+                            description="Picture {0}".format(number + 1))
+    builder.set_frontispiece(1)
+    return builder
+
+
+if __name__ == "__main__":
+    rand = random.Random(42)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        story = os.path.join(tmp_dir, "story.ulx")
+        with open(story, "wb") as h:
+            h.write("Glul" + "\0" * (4 * 1024 * 1024 - 4))
+        out_path = os.path.join(tmp_dir, "out.gblorb")
+        print "{0:<12}{1:>10}{2:>10}{3:>12}{4:>12}".format(
+            "resources", "source", "MB", "build (ms)", "MB/s")
+        for count in (100, 500):
+            pictures = [make_png(rand, 8 * 1024) for i in xrange(count)]
+            for as_files in (True, False):
+                def run():
+                    make_builder(story, pictures, as_files,
+                                 tmp_dir).write(out_path)
+                elapsed = min(timeit.repeat(run, number=1, repeat=3))
+                size = os.path.getsize(out_path) / float(1 << 20)
+                print "{0:<12}{1:>10}{2:>10.1f}{3:>12.1f}{4:>12.1f}".format(
+                    count, "files" if as_files else "buffers", size,
+                    elapsed * 1000, size / elapsed)
+            with open(out_path, "rb") as h:
+                data = h.read()
+            elapsed = min(timeit.repeat(lambda: blorb.BlorbFile(data),
+                                        number=1, repeat=3))
+            print "{0:<12}{1:>10}{2:>10.1f}{3:>12.1f}".format(
+                count, "index", len(data) / float(1 << 20), elapsed * 1000)
+    finally:
+        shutil.rmtree(tmp_dir)
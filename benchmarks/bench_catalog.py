@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+#       bench_catalog.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Measure loading an IFictionCatalog from a large iFiction file and
+looking up many IFIDs in it, against searching the DOM with
+ifiction.get_story.
+
+"""
+
+
+import os
+import sys
+import random
+import timeit
+from StringIO import StringIO
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from treatyofbabel import ifiction
+from treatyofbabel.catalog import IFictionCatalog
+
+
+STORY_TEMPLATE = """<story><identification><ifid>{0}</ifid>\
+<format>glulx</format></identification><bibliographic>\
+<title>Story {1}</title><author>Author {1}</author></bibliographic></story>"""
+
+
+def make_ifiction(count):
+    stories = [STORY_TEMPLATE.format("GLULX-{0:06d}".format(i), i)
+               for i in xrange(count)]
+    return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            "<ifindex version=\"1.0\" "
+            "xmlns=\"http://babel.ifarchive.org/protocol/iFiction/\">" +
+            "".join(stories) + "</ifindex>")
+
+
+if __name__ == "__main__":
+    rand = random.Random(42)
+    story_count = 50000
+    lookup_count = 10000
+    text = make_ifiction(story_count)
+    ifids = ["GLULX-{0:06d}".format(rand.randrange(story_count * 2))
+             for i in xrange(lookup_count)]
+    catalog = IFictionCatalog()
+    elapsed = min(timeit.repeat(lambda: catalog.load(StringIO(text)),
+                                number=1, repeat=3))
+    print "load {0} stories: {1:.1f} ms".format(story_count, elapsed * 1000)
+    elapsed = min(timeit.repeat(lambda: [catalog.get(ifid) for ifid in ifids],
+                                number=1, repeat=3))
+    print "look up {0} IFIDs: {1:.1f} ms".format(lookup_count,
+                                                 elapsed * 1000)
+    # The DOM search is linear in the catalog size, so only time a sample
+    dom = ifiction.get_ifiction_dom(text)
+    sample = ifids[:10]
+    elapsed = min(timeit.repeat(
+        lambda: [ifiction.get_story(dom, ifid) for ifid in sample],
+        number=1, repeat=1))
+    print "look up {0} IFIDs with get_story: {1:.1f} ms (~{2:.0f} s for " \
+        "{3})".format(len(sample), elapsed * 1000,
+                      elapsed * lookup_count / len(sample), lookup_count)
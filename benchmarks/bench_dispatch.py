@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+#       bench_dispatch.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare the signature-indexed handler dispatch against probing every
+handler in turn, for stories whose extension is missing or wrong and for
+files of no known format.
+
+"""
+
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import treatyofbabel as babel
+from treatyofbabel.babelerrors import BabelError
+
+
+def old_level9_claim(story_buffer):
+    """The level9 claim without its check for a registered game."""
+    version, ifid = babel.level9._get_l9_version(story_buffer)
+    return version > 0 and ifid is not None
+
+
+def old_quest_claim(story_buffer):
+    """The quest claim without its check for the end of a zip archive."""
+    try:
+        babel.quest._extract_aslx(story_buffer)
+    except:
+        return False
+    return True
+
+
+OLD_CLAIMS = {babel.level9: old_level9_claim, babel.quest: old_quest_claim}
+
+
+def old_claim(handler, story_buffer):
+    return OLD_CLAIMS.get(handler, handler.claim_story_file)(story_buffer)
+
+
+def linear_claim(story_buffer, extension):
+    """The handler lookup as it was before the signature index, probing
+    every handler in HANDLERS order with the claims of that time.
+
+    """
+    handler = babel.EXTENSION_MAP.get(extension)
+    if handler is None or not old_claim(handler, story_buffer):
+        for h in babel.HANDLERS:
+            if old_claim(h, story_buffer):
+                return h
+        raise BabelError("Unknown story format")
+    return handler
+
+
+def indexed_claim(story_buffer, extension):
+    return babel._claim_handler(story_buffer, extension)
+
+
+def make_cases():
+    rand = random.Random(42)
+    noise = ''.join([chr(rand.randint(0, 255)) for i in xrange(256 * 1024)])
+    glulx = 'Glul' + noise[4:]
+    tads3 = babel.tads3.T3_SIGNATURE + noise[len(babel.tads3.T3_SIGNATURE):]
+    text = ''.join([chr(rand.randint(32, 126)) for i in xrange(256 * 1024)])
+    return [("glulx as .dat", glulx, ".dat"),
+            ("tads3, no extension", tads3, None),
+            ("unknown 16k", noise[:16 * 1024], ".bin"),
+            ("unknown text 256k", text, ".txt"),
+            ("unknown 256k", noise, ".bin")]
+
+
+def time_claim(claim, story_buffer, extension, number):
+    def run():
+        try:
+            claim(story_buffer, extension)
+        except BabelError:
+            pass
+    return min(timeit.repeat(run, number=number, repeat=3)) / number
+
+
+if __name__ == "__main__":
+    print "{0:<22}{1:>14}{2:>14}{3:>12}".format("case", "linear (ms)",
+                                             "indexed (ms)", "speedup")
+    for name, story_buffer, extension in make_cases():
+        number = 1 if name.startswith("unknown") else 5
+        linear = time_claim(linear_claim, story_buffer, extension, number)
+        indexed = time_claim(indexed_claim, story_buffer, extension, number)
+        print "{0:<22}{1:>14.3f}{2:>14.3f}{3:>11.1f}x".format(
+            name, linear * 1000, indexed * 1000, linear / indexed)
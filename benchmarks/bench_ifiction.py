@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+#       bench_ifiction.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare writing iFiction for many stories with ifiction.write_ifiction
+against building a minidom DOM and calling toprettyxml.
+
+"""
+
+
+import os
+import sys
+import timeit
+from cStringIO import StringIO
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from treatyofbabel import ifiction
+
+
+def make_record(number):
+    record = ifiction.StoryRecord()
+    record.identification["ifid_list"] = ["GLULX-{0:06d}".format(number)]
+    record.identification["ifformat"] = "glulx"
+    record.bibliographic.update(
+        title=u"Story {0}".format(number), author=u"Author & Co.",
+        headline=u"An interactive <fiction>", language=u"en",
+        description=u"A story. " * 40)
+    record.contact["url"] = "http://example.com/{0}".format(number)
+    record.cover.update(format="png", height="600", width="800")
+    record.releases = [({"releasedate": "2026-01-01", "version": "1",
+                         "compiler": None, "compilerversion": None}, False)]
+    record.colophon.update(generator="bench", originated="2026-01-01")
+    record.annotation = {"ifdb": {"tuid": "tuid{0}".format(number)}}
+    return record
+
+
+def write_dom(records):
+    dom = ifiction.create_ifiction_dom()
+    for record in records:
+        ifiction.add_story_record(dom, record)
+    return dom.toprettyxml(indent="\t", encoding="UTF-8")
+
+
+def write_direct(records):
+    out_file = StringIO()
+    ifiction.write_ifiction(out_file, records)
+    return out_file.getvalue()
+
+
+if __name__ == "__main__":
+    records = [make_record(i) for i in xrange(10000)]
+    if write_dom(records[:100]) != write_direct(records[:100]):
+        sys.exit("Outputs differ")
+    for name, func in [("minidom", write_dom), ("write_ifiction",
+                                                write_direct)]:
+        elapsed = min(timeit.repeat(lambda: func(records), number=1,
+                                    repeat=3))
+        print "{0:<16}{1:>10.1f} ms".format(name, elapsed * 1000)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+#       test_analysis.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import hashlib
+import os.path
+import shutil
+import struct
+import tempfile
+from cStringIO import StringIO
+
+import treatyofbabel as babel
+from treatyofbabel.babelerrors import BabelError
+
+
+def make_zcode_story(release=88, serial="840726", checksum=0xA129,
+                     length=1024):
+    """Build a minimal, syntactically valid z-code story file."""
+    header = bytearray(length)
+    header[0] = 3
+    struct.pack_into(">H", header, 0x02, release)
+    for offset in range(4, 15, 2):
+        struct.pack_into(">H", header, offset, 0x40)
+    header[0x12:0x18] = serial
+    struct.pack_into(">H", header, 0x1C, checksum)
+    return str(header)
+
+
+class CountingFile(object):
+    """A file-like object which counts how often it is read."""
+    def __init__(self, data, name=None):
+        self._handle = StringIO(data)
+        self.name = name
+        self.reads = 0
+
+    def read(self, *args):
+        self.reads += 1
+        return self._handle.read(*args)
+
+
+class AnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.story_data = make_zcode_story()
+        self.story_path = os.path.join(self.tmp_dir, "zork.z3")
+        with open(self.story_path, "wb") as h:
+            h.write(self.story_data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_matches_module_functions(self):
+        with babel.analyze(self.story_path) as analysis:
+            self.assertEqual(analysis.story_format,
+                             babel.deduce_format(self.story_path))
+            self.assertEqual(analysis.ifids,
+                             babel.get_ifids(self.story_path))
+            self.assertEqual(analysis.meta, babel.get_meta(self.story_path))
+            self.assertEqual(analysis.cover,
+                             babel.get_cover(self.story_path))
+            self.assertEqual(analysis.story,
+                             babel.get_story(self.story_path))
+            self.assertEqual(analysis.ifids, ["ZCODE-88-840726"])
+            self.assertEqual(analysis.size, len(self.story_data))
+        self.assertEqual(babel._get_story_data(self.story_path),
+                         self.story_data)
+
+    def test_single_read(self):
+        story_handle = CountingFile(self.story_data)
+        analysis = babel.analyze(story_handle)
+        analysis.story_format
+        analysis.ifids
+        analysis.get_meta(True)
+        analysis.cover
+        self.assertEqual(story_handle.reads, 1)
+
+    def test_buffer_input(self):
+        analysis = babel.analyze(bytearray(self.story_data))
+        self.assertEqual(analysis.story_format, "zcode")
+
+    def test_handler_memoized(self):
+        with babel.analyze(self.story_path) as analysis:
+            self.assertIs(analysis.handler, analysis.handler)
+
+    def test_mmap(self):
+        with babel.analyze(self.story_path, use_mmap=True) as analysis:
+            self.assertEqual(analysis.story_format, "zcode")
+            self.assertEqual(analysis.ifids, ["ZCODE-88-840726"])
+            self.assertEqual(analysis.story[:], self.story_data)
+        self.assertEqual(babel.get_story(self.story_path, use_mmap=True),
+                         self.story_data)
+
+    def test_header_only(self):
+        with open(self.story_path, "ab") as h:
+            h.write("\0" * 65536)
+        with babel.analyze(self.story_path) as analysis:
+            self.assertEqual(analysis.story_format, "zcode")
+            self.assertEqual(analysis.ifids, ["ZCODE-88-840726"])
+            self.assertIsNone(analysis.meta)
+            self.assertIsNone(analysis.cover)
+            self.assertEqual(analysis.size, len(self.story_data) + 65536)
+            self.assertIsNone(analysis._raw_data)
+            reader = analysis._header_reader
+            self.assertFalse(reader._story_handle.closed)
+        self.assertTrue(reader._story_handle.closed)
+
+    def test_header_full_read(self):
+        # Non-vintage z-code stories may have a UUID anywhere in the file
+        story_data = make_zcode_story(serial="120101") + "UUID://ABC-123//"
+        with open(self.story_path, "wb") as h:
+            h.write(story_data)
+        with babel.analyze(self.story_path) as analysis:
+            self.assertEqual(analysis.ifids, ["ABC-123"])
+            self.assertEqual(analysis.story, story_data)
+
+    def test_md5_hashed_once(self):
+        hashed = []
+        def counting_md5(file_buffer):
+            hashed.append(file_buffer)
+            return old_md5(file_buffer)
+        old_md5 = babel.analysis.get_md5
+        babel.analysis.get_md5 = counting_md5
+        try:
+            with babel.analyze(self.story_path, use_mmap=True) as analysis:
+                digest = analysis.md5
+                self.assertEqual(analysis.md5, digest)
+        finally:
+            babel.analysis.get_md5 = old_md5
+        self.assertEqual(len(hashed), 1)
+        self.assertEqual(digest,
+                         hashlib.md5(self.story_data).hexdigest().upper())
+        with babel.analyze(self.story_path) as analysis:
+            self.assertEqual(analysis.md5, digest)
+            self.assertIsNone(analysis._raw_data)
+
+    def test_badargs(self):
+        self.assertRaises(ValueError, babel.analyze, None)
+        self.assertRaises(ValueError, babel.analyze, "")
+        self.assertRaises(TypeError, babel.analyze, 0)
+
+    def test_unknown_format(self):
+        analysis = babel.analyze(bytearray("\xff" * 64))
+        with self.assertRaises(BabelError):
+            analysis.story_format
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,8 @@
 
 import unittest
 import os.path
+import zipfile
+from cStringIO import StringIO
 
 import treatyofbabel as babel
 from treatyofbabel.babelerrors import BabelError
@@ -63,3 +65,40 @@ class BabelTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             for func in BABEL_FUNCS:
                 func(empty_story_file)
+
+
+class DispatchTest(unittest.TestCase):
+
+    def test_signature_dispatch(self):
+        padding = "\0" * 512
+        cases = [(babel.glulx, "Glul" + padding),
+                 (babel.tads3, babel.tads3.T3_SIGNATURE + padding),
+                 (babel.tads2, babel.tads2.T2_SIGNATURE + padding),
+                 (babel.magscrolls, "MaSc" + padding)]
+        for handler, story_buffer in cases:
+            for extension in [None, ".dat", ".z5", handler.FORMAT_EXT[0]]:
+                self.assertIs(babel._claim_handler(story_buffer, extension),
+                              handler)
+
+    def test_heuristic_order(self):
+        costs = [h.CLAIM_COST for h in babel.HEURISTIC_HANDLERS]
+        self.assertEqual(costs, sorted(costs))
+        for h in babel.HANDLERS:
+            if not h.SIGNATURES:
+                self.assertIn(h, babel.HEURISTIC_HANDLERS)
+
+    def test_quest_without_signature(self):
+        zip_buffer = StringIO()
+        game_zip = zipfile.ZipFile(zip_buffer, "w")
+        game_zip.writestr("game.aslx", '<asl><game name="Test">'
+                          '<gameid>QUEST-TEST-0001</gameid></game></asl>')
+        game_zip.close()
+        for story_buffer in [zip_buffer.getvalue(),
+                             "\0" * 64 + zip_buffer.getvalue()]:
+            self.assertIs(babel._claim_handler(story_buffer), babel.quest)
+            self.assertEqual(babel.quest.get_story_file_ifid(story_buffer),
+                             "QUEST-TEST-0001")
+
+    def test_unknown(self):
+        with self.assertRaises(BabelError):
+            babel._claim_handler("\xff" * 64, ".dat")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+#
+#       test_binaryfuncs.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import unittest
+import struct
+
+from treatyofbabel.utils import _binaryfuncs
+
+
+class BinaryReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.data = struct.pack("<IHB3s4I", 0x01020304, 0x0506, 7, "abc",
+                                1, 2, 3, 4)
+
+    def test_read(self):
+        for file_buffer in (self.data, buffer(self.data)):
+            reader = _binaryfuncs.BinaryReader(file_buffer, 0, '<')
+            self.assertEqual(reader.read_int(), 0x01020304)
+            self.assertEqual(reader.read_short(), 0x0506)
+            self.assertEqual(reader.read_byte(), 7)
+            self.assertEqual(reader.read_bytes(3), "abc")
+            self.assertEqual(reader.read_ints(4), (1, 2, 3, 4))
+            self.assertEqual(reader.remaining(), 0)
+
+    def test_unpack(self):
+        reader = _binaryfuncs.BinaryReader(self.data, 4, '<')
+        self.assertEqual(reader.unpack("HB3s"), (0x0506, 7, "abc"))
+        self.assertEqual(reader.offset, 10)
+        reader.skip(4)
+        self.assertEqual(reader.read_shorts(2), (2, 0))
+        reader.seek(0)
+        self.assertEqual(reader.read_int(), 0x01020304)
+        self.assertRaises(struct.error,
+                          _binaryfuncs.BinaryReader(self.data, 26).read_int)
+
+    def test_read_functions(self):
+        self.assertEqual(_binaryfuncs.read_int(self.data, 0), 0x04030201)
+        self.assertEqual(_binaryfuncs.read_int(self.data, 0, '<'), 0x01020304)
+        self.assertEqual(_binaryfuncs.read_short(self.data, 4, '<'), 0x0506)
+        self.assertEqual(_binaryfuncs.read_byte(self.data, 6), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,7 +20,18 @@
 #       along with Grotesque.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os.path
+import shutil
+import struct
+import tempfile
+import unittest
+from cStringIO import StringIO
+
 import test_storyformat
+import treatyofbabel as babel
+from treatyofbabel.babelerrors import BabelError
+from treatyofbabel.wrappers import blorb
+from test_analysis import make_zcode_story
 
 
 class blorbTest(test_storyformat.StoryTest):
@@ -28,5 +39,137 @@ class blorbTest(test_storyformat.StoryTest):
         super(blorbTest, self).setUp('blorb')
 
 
+class WriteOnlyFile(object):
+    """A non-seekable file-like object."""
+    def __init__(self, handle):
+        self.write = handle.write
+
+
+class BlorbFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.story_data = make_zcode_story()
+        story_path = os.path.join(self.tmp_dir, "story.z3")
+        with open(story_path, "wb") as h:
+            h.write(self.story_data)
+        cover_path = os.path.join(self.tmp_dir, "cover.png")
+        with open(cover_path, "wb") as h:
+            h.write("\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + "IHDR" +
+                    struct.pack(">IIBBBBB", 120, 80, 8, 2, 0, 0, 0) +
+                    "\0" * 4)
+        self.blorb_path = os.path.join(self.tmp_dir, "story.zblorb")
+        blorb.create(self.blorb_path, story_path, "zcode",
+                     coverart_file=cover_path)
+        self.story_path = story_path
+        self.cover_path = cover_path
+        with open(self.blorb_path, "rb") as h:
+            self.blorb_data = h.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index(self):
+        blorb_file = blorb.BlorbFile(self.blorb_data)
+        self.assertEqual(blorb_file.get_resources(),
+                         [("Exec", 0), ("Pict", 1)])
+        self.assertEqual(blorb_file.get_story_format(), "zcode")
+        self.assertEqual(blorb_file.get_story_file()[:], self.story_data)
+        self.assertEqual(blorb_file.get_embedded_ifid(), "ZCODE-88-840726")
+        self.assertEqual(blorb_file.get_chunk("IFmd"), (None, None))
+        cover = blorb_file.get_story_file_cover()
+        self.assertEqual((cover.img_format, cover.width, cover.height),
+                         ("png", 120, 80))
+
+    def test_create_stream(self):
+        # An odd-sized story is padded, which moves the cover art along
+        self.story_data = make_zcode_story(length=1023)
+        with open(self.story_path, "wb") as h:
+            h.write(self.story_data)
+        out = StringIO()
+        out_handle = WriteOnlyFile(out)
+        blorb.create(out_handle, self.story_path, "zcode",
+                     coverart_file=self.cover_path)
+        blorb_file = blorb.BlorbFile(out.getvalue())
+        self.assertEqual(blorb_file.get_story_file()[:], self.story_data)
+        self.assertEqual(blorb_file.get_story_file_cover().width, 120)
+
+    def test_builder(self):
+        png = open(self.cover_path, "rb").read()
+        aiff = "FORM" + struct.pack(">I", 5) + "AIFFx"
+        builder = blorb.BlorbBuilder()
+        builder.add_story(StringIO(self.story_data), "zcode")
+        for i in range(1, 4):
+            builder.add_picture(bytearray(png), i,
+                                description=u"Picture {0}".format(i))
+        builder.add_sound(buffer(aiff), 3, description="Beep")
+        builder.add_data(self.story_path, 1, "BINA")
+        builder.set_frontispiece(2)
+        builder.set_release(7)
+        builder.set_metadata(buffer("<ifindex/>"))
+        self.assertRaises(BabelError, builder.add_data, "x", 1, "TEXT")
+        out = StringIO()
+        builder.write(out)
+        blorb_file = blorb.BlorbFile(out.getvalue())
+        self.assertEqual(blorb_file.get_resources(),
+                         [("Exec", 0), ("Pict", 1), ("Pict", 2), ("Pict", 3),
+                          ("Snd ", 3), ("Data", 1)])
+        self.assertEqual(blorb_file.get_story_file()[:], self.story_data)
+        self.assertEqual(blorb_file.get_resource_description("Pict", 2),
+                         "Picture 2")
+        self.assertEqual(blorb_file.get_resource_description("Snd ", 3),
+                         "Beep")
+        index, length = blorb_file.get_resource("Snd ", 3)
+        self.assertEqual(out.getvalue()[index - 8:index + length], aiff)
+        index, length = blorb_file.get_chunk("RelN")
+        self.assertEqual(out.getvalue()[index:index + length], "\0\7")
+        self.assertEqual(blorb_file.get_story_file_meta(), "<ifindex/>")
+        self.assertEqual(blorb_file.get_story_file_cover().width, 120)
+
+    def test_iter_resources(self):
+        png = open(self.cover_path, "rb").read()
+        aiff = "FORM" + struct.pack(">I", 5) + "AIFFx"
+        builder = blorb.BlorbBuilder()
+        builder.add_story(self.story_path, "zcode")
+        builder.add_picture(self.cover_path, 1)
+        builder.add_sound(buffer(aiff), 2)
+        out = StringIO()
+        builder.write(out)
+        data = out.getvalue()
+        resources = list(blorb.iter_resources(data))
+        self.assertEqual([r[:3] for r in resources],
+                         [("Exec", 0, "ZCOD"), ("Pict", 1, "PNG "),
+                          ("Snd ", 2, "FORM")])
+        for usage, number, chunk_type, offset, length, view in resources:
+            self.assertEqual(view[:], data[offset:offset + length])
+        self.assertEqual(resources[0][5][:], self.story_data)
+        self.assertEqual(resources[1][5][:], png)
+        self.assertEqual(resources[2][5][:], aiff)
+        self.assertEqual(
+            [blorb.get_resource_extension(r[2], r[5]) for r in resources],
+            [".z3", ".png", ".aiff"])
+
+    def test_module_functions(self):
+        self.assertEqual(blorb.get_story_file_ifid(self.blorb_data),
+                         ["ZCODE-88-840726"])
+        blorb_file = blorb.BlorbFile(self.blorb_data)
+        self.assertEqual(blorb.get_story_file_ifid(blorb_file),
+                         ["ZCODE-88-840726"])
+        self.assertEqual(blorb.get_story_file_extension(blorb_file),
+                         blorb.get_story_file_extension(self.blorb_data))
+        self.assertEqual(list(blorb.iter_resources(blorb_file)),
+                         list(blorb.iter_resources(self.blorb_data)))
+        self.assertEqual(babel.deduce_format(self.blorb_path),
+                         "blorbed zcode")
+
+    def test_analysis_owns_index(self):
+        with babel.analyze(self.blorb_path, use_mmap=True) as analysis:
+            blorb_file = analysis._blorb_file
+            self.assertEqual(analysis.story_format, "blorbed zcode")
+            self.assertEqual(analysis.ifids, ["ZCODE-88-840726"])
+            self.assertIs(analysis._blorb_file, blorb_file)
+            self.assertIs(analysis.blorb_file, blorb_file)
+        self.assertNotIn("blorb_file", analysis._cache)
+
+
 if __name__ == "__main__":
     unittest.main()
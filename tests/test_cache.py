@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+#       test_cache.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import treatyofbabel as babel
+from treatyofbabel import cache
+from treatyofbabel.ifstory import IFStory
+from test_analysis import make_zcode_story
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, "cache.db")
+        self.story_paths = []
+        for i in range(3):
+            path = os.path.join(self.tmp_dir, "story{0}.z3".format(i))
+            with open(path, "wb") as h:
+                h.write(make_zcode_story(serial="84072{0}".format(i)))
+            self.story_paths.append(path)
+        self.cache = cache.AnalysisCache(self.cache_file)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hits(self):
+        path = self.story_paths[0]
+        self.assertEqual(babel.deduce_format(path, cache=self.cache), "zcode")
+        self.assertEqual(babel.get_ifids(path, cache=self.cache),
+                         ["ZCODE-88-840720"])
+        self.assertIsNone(babel.get_meta(path, cache=self.cache))
+        self.assertIsNone(babel.get_cover(path, cache=self.cache))
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 1))
+
+    def test_persistent(self):
+        self.cache.lookup(self.story_paths[0])
+        self.cache.close()
+        self.cache = cache.AnalysisCache(self.cache_file)
+        story = IFStory()
+        story.load_from_story_file(self.story_paths[0], cache=self.cache)
+        self.assertEqual(story.ifid_list, ["ZCODE-88-840720"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+    def test_changed_file(self):
+        path = self.story_paths[0]
+        self.cache.lookup(path)
+        with open(path, "wb") as h:
+            h.write(make_zcode_story(serial="840799", length=2048))
+        self.assertEqual(babel.get_ifids(path, cache=self.cache),
+                         ["ZCODE-88-840799"])
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_moved_file(self):
+        self.cache.lookup(self.story_paths[0])
+        new_path = os.path.join(self.tmp_dir, "moved.z3")
+        os.rename(self.story_paths[0], new_path)
+        self.assertEqual(self.cache.lookup(new_path).ifids,
+                         ["ZCODE-88-840720"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_eviction(self):
+        self.cache.max_entries = 2
+        for path in self.story_paths:
+            self.cache.lookup(path)
+        self.assertEqual(len(self.cache), 2)
+        self.cache.lookup(self.story_paths[0])
+        self.assertEqual(self.cache.misses, 4)
+
+    def test_max_bytes(self):
+        self.cache.max_bytes = 1
+        self.cache.lookup(self.story_paths[0])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_generation(self):
+        self.cache.lookup(self.story_paths[0])
+        self.cache.close()
+        old_generation = cache._get_generation
+        cache._get_generation = lambda: "other"
+        try:
+            self.cache = cache.AnalysisCache(self.cache_file)
+        finally:
+            cache._get_generation = old_generation
+        self.assertEqual(len(self.cache), 0)
+
+    def test_hashed_once(self):
+        self.cache.lookup(self.story_paths[0])
+        hashed = []
+        def counting_hash(path):
+            hashed.append(path)
+            return old_hash(path)
+        def counting_md5(file_buffer):
+            hashed.append(file_buffer)
+            return old_md5(file_buffer)
+        old_hash = cache._hash_file
+        old_md5 = babel.analysis.get_md5
+        cache._hash_file = counting_hash
+        babel.analysis.get_md5 = counting_md5
+        try:
+            # A new file of the same size as a cached one is hashed to look
+            # for a copy of it, and that digest is stored
+            self.cache.lookup(self.story_paths[1])
+            self.assertEqual(len(hashed), 1)
+            # A new file of a new size is hashed only by its analysis
+            path = os.path.join(self.tmp_dir, "long.z3")
+            with open(path, "wb") as h:
+                h.write(make_zcode_story(length=4096))
+            self.cache.lookup(path)
+            self.assertEqual(len(hashed), 2)
+        finally:
+            cache._hash_file = old_hash
+            babel.analysis.get_md5 = old_md5
+        self.assertEqual(self.cache.misses, 3)
+        os.rename(path, path + ".moved")
+        self.assertEqual(self.cache.lookup(path + ".moved").ifids,
+                         ["ZCODE-88-840726"])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_version(self):
+        self.cache.lookup(self.story_paths[0])
+        self.cache.close()
+        cache.CACHE_VERSION += 1
+        try:
+            self.cache = cache.AnalysisCache(self.cache_file)
+        finally:
+            cache.CACHE_VERSION -= 1
+        self.assertEqual(len(self.cache), 0)
+
+    def test_unknown_format(self):
+        path = os.path.join(self.tmp_dir, "notastory.bin")
+        with open(path, "wb") as h:
+            h.write("\xff" * 64)
+        self.assertIsNone(self.cache.lookup(path))
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+#       test_catalog.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from StringIO import StringIO
+
+from treatyofbabel import catalog, ifiction
+from treatyofbabel.babelerrors import IFictionError
+from test_ifiction import make_catalog
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = catalog.IFictionCatalog(StringIO(make_catalog(3)))
+
+    def test_lookup(self):
+        self.assertEqual(len(self.catalog), 3)
+        record = self.catalog["ZCODE-1-840726"]
+        self.assertIs(self.catalog.get("ZCODE-1-840726-ALT"), record)
+        self.assertEqual(record.bibliographic["title"], "Story 1")
+        self.assertIsNone(self.catalog.get("ZCODE-9-840726"))
+        self.assertNotIn("ZCODE-9-840726", self.catalog)
+
+    def test_add_replace_remove(self):
+        record = ifiction.StoryRecord()
+        record.identification["ifid_list"] = ["ZCODE-1-840726", "NEW-IFID"]
+        self.assertRaises(IFictionError, self.catalog.add, record)
+        self.catalog.replace(record)
+        self.assertEqual(len(self.catalog), 3)
+        self.assertIs(self.catalog["NEW-IFID"], record)
+        self.assertNotIn("ZCODE-1-840726-ALT", self.catalog)
+        self.catalog.remove("NEW-IFID")
+        self.assertNotIn("ZCODE-1-840726", self.catalog)
+        self.assertRaises(KeyError, self.catalog.remove, "NEW-IFID")
+        self.assertEqual([r.bibliographic["title"] for r in self.catalog],
+                         ["Story 0", "Story 2"])
+
+    def test_round_trip(self):
+        text = self.catalog.to_ifiction()
+        reloaded = catalog.IFictionCatalog(StringIO(text))
+        for original, record in zip(self.catalog, reloaded):
+            self.assertEqual(vars(original), vars(record))
+        dom = ifiction.get_ifiction_dom(text)
+        story = ifiction.get_story(dom, "ZCODE-2-840726-ALT")
+        self.assertEqual(ifiction.get_bibliographic(story)["title"],
+                         "Story 2")
+        self.assertIsNone(ifiction.get_story(dom, "NO-SUCH-IFID"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+#       test_enrich.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from treatyofbabel import enrich, ifdb
+from test_analysis import make_zcode_story
+from test_ifdb import start_stub_server
+
+
+class EnrichTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_stub_server()
+        self.client = ifdb.IFDBClient(self.server.base_url, backoff=0)
+        self.tmp_dir = tempfile.mkdtemp()
+        # Two copies of the same story share an IFID
+        for name, serial in [("a.z3", "840720"), ("b.z3", "840721"),
+                             ("copy.z3", "840720")]:
+            with open(os.path.join(self.tmp_dir, name), "wb") as h:
+                h.write(make_zcode_story(serial=serial))
+        self.bad_story = os.path.join(self.tmp_dir, "notastory.bin")
+        with open(self.bad_story, "wb") as h:
+            h.write("\xff" * 64)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_enrich(self):
+        stats = enrich.EnrichStats()
+        results = dict((os.path.basename(result.path), result)
+                       for result in enrich.enrich(self.tmp_dir, self.client,
+                                                  workers=1, stats=stats))
+        self.assertEqual(len(results), 4)
+        self.assertIsNone(results["notastory.bin"].story)
+        self.assertIsNotNone(results["notastory.bin"].error)
+        for name in ["a.z3", "b.z3", "copy.z3"]:
+            result = results[name]
+            self.assertTrue(result.found)
+            self.assertIsNone(result.error)
+            ifid = result.story.ifid_list[0]
+            self.assertEqual(result.story.bibliographic["title"],
+                             "Story " + ifid)
+            self.assertEqual(result.story.format, "zcode")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual((stats.analyzed, stats.analysis_errors,
+                          stats.requests, stats.duplicates,
+                          stats.fetch_errors), (4, 1, 2, 1, 0))
+        self.assertEqual(len(stats.report()), 3)
+
+    def test_fetch_errors(self):
+        self.client.retries = 0
+        self.server.failures = 10
+        results = list(enrich.enrich(self.tmp_dir, self.client, workers=2))
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertFalse(result.found)
+            self.assertIsNotNone(result.error)
+        # The stories still carry what the files say about themselves
+        ifids = sorted(result.story.ifid_list[0] for result in results
+                       if result.story is not None)
+        self.assertEqual(ifids, ["ZCODE-88-840720", "ZCODE-88-840720",
+                                 "ZCODE-88-840721"])
+
+    def test_max_fetched(self):
+        stats = enrich.EnrichStats()
+        fetched = enrich.OrderedDict()
+        for ifid in ["A", "B", "C"]:
+            waiting = {ifid: []}
+            list(enrich._complete((ifid, "<ifindex/>", None), waiting,
+                                  fetched, 2, stats, 0))
+        self.assertEqual(fetched.keys(), ["B", "C"])
+        results = list(enrich.enrich(self.tmp_dir, self.client, workers=1,
+                                     max_fetched=0))
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len([result for result in results if result.found]),
+                         3)
+
+
+if __name__ == "__main__":
+    unittest.main()
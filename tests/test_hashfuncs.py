@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+#       test_hashfuncs.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import hashlib
+import mmap
+import tempfile
+
+from treatyofbabel.utils import _hashfuncs
+
+
+class HashTest(unittest.TestCase):
+    def setUp(self):
+        self.data = "".join(chr(i % 251) for i in xrange(200000))
+        self.digest = hashlib.md5(self.data).hexdigest().upper()
+
+    def test_buffer(self):
+        self.assertEqual(_hashfuncs.get_md5(self.data), self.digest)
+        self.assertEqual(_hashfuncs.get_md5(buffer(self.data)), self.digest)
+        self.assertEqual(_hashfuncs.get_md5(""),
+                         hashlib.md5("").hexdigest().upper())
+
+    def test_file(self):
+        with tempfile.TemporaryFile() as h:
+            h.write(self.data)
+            h.flush()
+            self.assertEqual(_hashfuncs.get_file_md5(h), self.digest)
+            story_map = mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(_hashfuncs.get_md5(story_map), self.digest)
+            finally:
+                story_map.close()
+
+    def test_not_memoized(self):
+        data = bytearray(self.data)
+        _hashfuncs.get_md5(data)
+        data[0] = "x"
+        self.assertEqual(_hashfuncs.get_md5(data),
+                         hashlib.md5(data).hexdigest().upper())
+
+
+if __name__ == "__main__":
+    unittest.main()
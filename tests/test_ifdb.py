@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+#       test_ifdb.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import unittest
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+import urlparse
+
+import treatyofbabel as babel
+from treatyofbabel import ifdb
+from treatyofbabel.babelerrors import IFDBError
+from treatyofbabel.ifstory import IFStory
+
+
+IFICTION_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<ifindex version="1.0" xmlns="http://babel.ifarchive.org/protocol/iFiction/">\
+<story><identification><ifid>{0}</ifid><format>zcode</format>\
+</identification><bibliographic><title>Story {0}</title>\
+<author>Author</author></bibliographic><ifdb><tuid>tuid-{0}</tuid>\
+<coverart><url>{1}cover.png</url></coverart></ifdb></story></ifindex>"""
+COVER = ("\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + "IHDR" +
+         struct.pack(">IIBBBBB", 120, 80, 8, 2, 0, 0, 0) + "\0" * 4)
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        url = urlparse.urlsplit(self.path)
+        query = urlparse.parse_qs(url.query)
+        if fail:
+            self.reply(503, "")
+        elif url.path == "/cover.png":
+            self.reply(200, COVER)
+        elif url.path == "/old":
+            self.send_response(301)
+            self.send_header("Location", "/viewgame?ifiction&ifid=MOVED")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif url.path == "/viewgame" and "ifid" in query:
+            ifid = query["ifid"][0]
+            if ifid.startswith("UNKNOWN"):
+                self.reply(404, "")
+            else:
+                self.reply(200, IFICTION_TEMPLATE.format(ifid,
+                                                         server.base_url))
+        else:
+            self.reply(400, "")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_stub_server():
+    """Start an IFDB stand-in on a free local port, in a thread."""
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    server.failures = 0
+    server.base_url = "http://127.0.0.1:{0}/".format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class IFDBTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_stub_server()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = ifdb.IFDBClient(self.server.base_url, backoff=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_ifiction(self):
+        self.assertIn("<ifid>ZCODE-1</ifid>",
+                      self.client.get_ifiction("ZCODE-1"))
+        self.assertIsNone(self.client.get_ifiction("UNKNOWN-1"))
+        self.assertIn("<ifid>MOVED</ifid>",
+                      self.client.fetch(self.server.base_url + "old"))
+        self.assertRaises(IFDBError, self.client.get_ifiction, tuid="x")
+        # The requests were made over a single persistent connection
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_lookup(self):
+        ifids = ["ZCODE-{0}".format(i) for i in range(20)] + ["UNKNOWN-1"]
+        results = dict((key, (data, error)) for key, data, error
+                       in self.client.lookup(ifids))
+        self.assertEqual(sorted(results), sorted(ifids))
+        self.assertEqual(results["UNKNOWN-1"], (None, None))
+        self.assertIn("<ifid>ZCODE-7</ifid>", results["ZCODE-7"][0])
+        self.assertLessEqual(len(self.server.clients),
+                             self.client.max_connections)
+
+    def test_retry(self):
+        self.server.failures = 2
+        self.assertIsNotNone(self.client.get_ifiction("ZCODE-1"))
+        self.assertEqual(len(self.server.requests), 3)
+        self.server.failures = 4
+        self.assertRaises(IFDBError, self.client.get_ifiction, "ZCODE-1")
+        self.server.failures = 4
+        key, data, error = next(self.client.lookup(["ZCODE-2"]))
+        self.assertIsNone(data)
+        self.assertEqual(error, "HTTP error 503")
+
+    def test_cache(self):
+        cache_file = os.path.join(self.tmp_dir, "ifdb.db")
+        self.client.cache = ifdb.IFDBCache(cache_file)
+        first = self.client.get_ifiction("ZCODE-1")
+        self.client.cache.close()
+        self.client.cache = ifdb.IFDBCache(cache_file)
+        self.assertEqual(self.client.get_ifiction("ZCODE-1"), first)
+        self.assertEqual(len(self.server.requests), 1)
+        # Expired entries are fetched again, and evicted on opening
+        self.client.cache.ttl = -1
+        self.client.get_ifiction("ZCODE-1")
+        self.assertEqual(len(self.server.requests), 2)
+        self.client.cache.close()
+        self.client.cache = ifdb.IFDBCache(cache_file, ttl=-1)
+        self.assertEqual(len(self.client.cache), 0)
+        self.client.cache.close()
+
+    def test_ifstory(self):
+        story = IFStory()
+        story.load_from_ifdb(ifid="ZCODE-1", fetch_cover=True,
+                             client=self.client)
+        self.assertEqual(story.bibliographic["title"], "Story ZCODE-1")
+        self.assertEqual(story.annotation["ifdb"]["tuid"], "tuid-ZCODE-1")
+        self.assertEqual((story.cover.img_format, story.cover.width,
+                          story.cover.height), ("png", 120, 80))
+        self.assertRaises(babel.ifiction.IFictionError,
+                          IFStory().load_from_ifdb, ifid="UNKNOWN-1",
+                          client=self.client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#       test_ifiction.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import treatyofbabel as babel
+from treatyofbabel import ifiction
+from treatyofbabel.babelerrors import IFictionError
+from treatyofbabel.ifstory import IFStory
+
+
+STORY_TEMPLATE = """<story><identification><ifid>{0}</ifid><ifid>{0}-ALT</ifid>\
+<format>zcode</format></identification><bibliographic>\
+<title>Story {1}</title><author>Author {1}</author>\
+<description>A <b>bold</b> story.<br/>Really.</description></bibliographic>\
+<resources><auxiliary><leafname>map{1}.png</leafname>\
+<description>Map</description></auxiliary></resources>\
+<contact><url>http://example.com/{1}</url></contact>\
+<cover><format>png</format><height>80</height><width>120</width></cover>\
+<zcode><version>3</version><serial>8407{1}</serial></zcode>\
+<releases><history><release><releasedate>1984-01-0{1}</releasedate>\
+<version>1</version></release></history></releases>\
+<colophon><generator>test</generator><originated>2026-01-01</originated>\
+</colophon><annotation><ifdb><tuid>tuid{1}</tuid></ifdb></annotation></story>"""
+
+
+def make_catalog(count):
+    """Build an iFiction file with count stories."""
+    stories = [STORY_TEMPLATE.format("ZCODE-{0}-840726".format(i), i)
+               for i in range(count)]
+    return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            "<ifindex version=\"1.0\" "
+            "xmlns=\"http://babel.ifarchive.org/protocol/iFiction/\">" +
+            "".join(stories) + "</ifindex>")
+
+
+class IterStoriesTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = make_catalog(3)
+
+    def test_matches_dom(self):
+        records = list(ifiction.iter_stories(StringIO(self.catalog)))
+        dom = ifiction.get_ifiction_dom(self.catalog)
+        stories = ifiction.get_all_stories(dom)
+        self.assertEqual(len(records), 3)
+        for record, story in zip(records, stories):
+            expected = ifiction.get_story_record(story)
+            for attr in ["identification", "bibliographic", "resources",
+                         "contact", "cover", "format_info", "releases",
+                         "colophon", "annotation"]:
+                self.assertEqual(getattr(record, attr),
+                                 getattr(expected, attr), attr)
+
+    def test_markup(self):
+        record = next(ifiction.iter_stories(StringIO(self.catalog)))
+        self.assertEqual(ifiction.get_bibliographic(record)["description"],
+                         "A <b>bold</b> story.<br/>Really.")
+
+    def test_errors(self):
+        stories = ifiction.iter_stories(StringIO("<html><body/></html>"))
+        self.assertRaises(IFictionError, list, stories)
+        stories = ifiction.iter_stories(StringIO(self.catalog[:-40]))
+        self.assertRaises(IFictionError, list, stories)
+
+    def test_ifstory(self):
+        record = next(ifiction.iter_stories(StringIO(self.catalog)))
+        story = IFStory(ific_story_node=record)
+        self.assertEqual(story.ifid_list,
+                         ["ZCODE-0-840726", "ZCODE-0-840726-ALT"])
+        self.assertEqual(story.bibliographic["title"], "Story 0")
+        self.assertEqual(story.resources, [("map0.png", "Map")])
+        self.assertEqual(story.contacts["url"], "http://example.com/0")
+
+    def test_get_ifids(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "catalog.iFiction")
+            with open(path, "wb") as h:
+                h.write(self.catalog)
+            expected = ["ZCODE-0-840726", "ZCODE-0-840726-ALT",
+                        "ZCODE-1-840726", "ZCODE-1-840726-ALT",
+                        "ZCODE-2-840726", "ZCODE-2-840726-ALT"]
+            self.assertEqual(babel.get_ifids(path), expected)
+            self.assertEqual(babel.get_ifids(path, use_mmap=True), expected)
+            with open(path, "rb") as h:
+                self.assertEqual(babel.get_ifids(h), expected)
+            with open(path, "wb") as h:
+                h.write("<html><body/></html>" + " " * 20)
+            self.assertIsNone(babel.get_ifids(path))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class WriterTest(unittest.TestCase):
+    def setUp(self):
+        self.records = list(ifiction.iter_stories(StringIO(make_catalog(3))))
+
+    def dom_ifiction(self, records, indent="\t", comment=None):
+        dom = ifiction.create_ifiction_dom()
+        if comment is not None:
+            ifiction.add_comment(dom, comment)
+        for record in records:
+            ifiction.add_story_record(dom, record)
+        return dom.toprettyxml(indent=indent, encoding="UTF-8")
+
+    def parse(self, text):
+        return [vars(record) for record in
+                ifiction.iter_stories(StringIO(text))]
+
+    def test_matches_dom(self):
+        self.assertEqual(self.parse(ifiction.format_ifiction(self.records)),
+                         self.parse(self.dom_ifiction(self.records)))
+        text = ifiction.format_ifiction(self.records[:1], indent="  ",
+                                        comment="Generated")
+        self.assertEqual(self.parse(text),
+                         self.parse(self.dom_ifiction(self.records[:1])))
+        self.assertTrue(text.startswith(
+            self.dom_ifiction([], indent="  ",
+                              comment="Generated").rsplit("<", 1)[0]))
+        self.assertEqual(ifiction.format_ifiction([]),
+                         self.dom_ifiction([]))
+
+    def test_order(self):
+        record = self.records[0]
+        for key in ifiction.BIBLIO_ATTR:
+            record.bibliographic[key] = "1"
+        record.format_info = {"version": "3", "release": "1", "serial": "2"}
+        text = ifiction.format_ifiction([record])
+        positions = [text.index("<{0}>".format(key)) for key in
+                     ifiction.BIBLIO_ATTR + ["release", "serial", "version"]]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_escaping(self):
+        record = self.records[0]
+        record.bibliographic["title"] = u"Fish & <Chips> \"\u00e9\""
+        text = ifiction.format_ifiction([record])
+        self.assertTrue("<title>Fish &amp; &lt;Chips&gt; &quot;" in text)
+        parsed = next(ifiction.iter_stories(StringIO(text)))
+        self.assertEqual(parsed.bibliographic["title"],
+                         record.bibliographic["title"])
+
+    def test_invalid(self):
+        record = ifiction.StoryRecord()
+        self.assertRaises(IFictionError, ifiction.format_ifiction, [record])
+        record.identification["ifid_list"] = ["TEST-IFID"]
+        record.identification["ifformat"] = "zcode"
+        self.assertRaises(IFictionError, ifiction.format_ifiction, [record])
+        record = self.records[0]
+        for cover in [{"format": "bmp"}, {"height": "0"}, {"width": "wide"},
+                      {"height": None}]:
+            record.cover = {"format": "png", "height": "80", "width": "120",
+                            "description": None}
+            record.cover.update(cover)
+            self.assertRaises(IFictionError, ifiction.format_ifiction,
+                              [record])
+            self.assertRaises(IFictionError, self.dom_ifiction, [record])
+
+    def test_on_error(self):
+        record = ifiction.StoryRecord()
+        records = self.records[:1] + [record] + self.records[1:]
+        self.assertRaises(IFictionError, ifiction.format_ifiction, records)
+        errors = []
+        out = StringIO()
+        ifiction.write_ifiction(
+            out, records, on_error=lambda story, err: errors.append((story, err)))
+        self.assertEqual(len(errors), 1)
+        self.assertIs(errors[0][0], record)
+        self.assertTrue(isinstance(errors[0][1], IFictionError))
+        self.assertEqual(self.parse(out.getvalue()),
+                         self.parse(ifiction.format_ifiction(self.records)))
+
+    def test_ifstory(self):
+        story = IFStory(ific_story_node=self.records[1])
+        out = StringIO()
+        story.write_ifiction(out)
+        self.assertEqual(out.getvalue(), story.to_ifiction())
+        parsed = next(ifiction.iter_stories(StringIO(out.getvalue())))
+        self.assertEqual(parsed.identification,
+                         self.records[1].identification)
+        self.assertEqual(parsed.bibliographic,
+                         self.records[1].bibliographic)
+        self.assertEqual(parsed.releases, self.records[1].releases)
+
+
+if __name__ == "__main__":
+    unittest.main()
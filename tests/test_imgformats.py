@@ -22,10 +22,41 @@
 import unittest
 import glob
 import os.path
+import struct
+from StringIO import StringIO
 
+from treatyofbabel.babelerrors import BabelImgError
 from treatyofbabel.utils import _imgfuncs
 
 
+def make_jpeg(width, height, sof_marker=0xC2, padding=60000):
+    app0 = "JFIF\0\x01\x01\0\0\x01\0\x01\0\0"
+    sof = struct.pack(">BHHB", 8, height, width, 3) + "\0" * 9
+    return ("\xff\xd8" +
+            "\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0 +
+            "\xff\xe1" + struct.pack(">H", padding + 2) + "\0" * padding +
+            chr(0xff) + chr(sof_marker) + struct.pack(">H", len(sof) + 2) +
+            sof + "\xff\xda" + "\0" * 1000 + "\xff\xd9")
+
+
+class CountingFile(object):
+    """A file object which counts the bytes read from it."""
+    def __init__(self, data):
+        self._file = StringIO(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+
 class ImgTest(unittest.TestCase):
     def setUp(self):
         self.test_imgs = {"png": glob.glob("img/*.png"),
@@ -75,3 +106,57 @@ class ImgTest(unittest.TestCase):
             test_w, test_h = _imgfuncs.get_gif_dim(img_buf)
             self.assertEqual(test_w, w)
             self.assertEqual(test_h, h)
+
+
+class ProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.imgs = {
+            "jpeg": make_jpeg(640, 480),
+            "png": ("\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + "IHDR" +
+                    struct.pack(">IIBBBBB", 640, 480, 8, 2, 0, 0, 0)),
+            "gif": "GIF89a" + struct.pack("<HHBBB", 640, 480, 0, 0, 0),
+            "webp": ("RIFF" + struct.pack("<I", 30) + "WEBPVP8 " +
+                     struct.pack("<I", 10) + "\0\0\0\x9d\x01\x2a" +
+                     struct.pack("<HH", 640, 480))}
+
+    def test_probe(self):
+        for img_format, img in self.imgs.items():
+            self.assertEqual(_imgfuncs.probe_img(img),
+                             (img_format, 640, 480))
+            self.assertEqual(_imgfuncs.deduce_img_format(buffer(img)),
+                             img_format)
+        self.assertIsNone(_imgfuncs.probe_img("\0" * 64))
+        self.assertIsNone(_imgfuncs.probe_img(""))
+        self.assertRaises(BabelImgError, _imgfuncs.probe_img,
+                          self.imgs["png"][:20])
+
+    def test_jpeg_markers(self):
+        for marker in (0xC0, 0xC1, 0xC2, 0xCA):
+            img = make_jpeg(33, 17, sof_marker=marker, padding=10)
+            self.assertEqual(_imgfuncs.get_jpeg_dim(img), (33, 17))
+        # Huffman tables are not frame headers
+        img = make_jpeg(33, 17, sof_marker=0xC4, padding=10)
+        self.assertRaises(BabelImgError, _imgfuncs.get_jpeg_dim, img)
+        self.assertRaises(BabelImgError, _imgfuncs.get_png_dim, img)
+        # Nor are the frame headers of images embedded after another SOI
+        img = "\xff\xd8" + make_jpeg(160, 120, padding=10)
+        self.assertRaises(BabelImgError, _imgfuncs.get_jpeg_dim, img)
+
+    def test_webp(self):
+        lossless = ("RIFF" + struct.pack("<I", 30) + "WEBPVP8L" +
+                    struct.pack("<I", 5) + "\x2f" +
+                    struct.pack("<I", (479 << 14) | 639))
+        extended = ("RIFF" + struct.pack("<I", 30) + "WEBPVP8X" +
+                    struct.pack("<I", 10) + "\0" * 4 +
+                    struct.pack("<I", 639)[:3] + struct.pack("<I", 479)[:3])
+        for img in (lossless, extended):
+            self.assertEqual(_imgfuncs.get_webp_dim(img), (640, 480))
+
+    def test_file(self):
+        img_file = CountingFile("junk" + self.imgs["jpeg"])
+        img_file.seek(4)
+        self.assertEqual(_imgfuncs.probe_img(img_file), ("jpeg", 640, 480))
+        self.assertEqual(img_file.tell(), 4)
+        # Only the blocks holding the headers are read
+        self.assertLessEqual(img_file.bytes_read,
+                             2 * _imgfuncs.PROBE_BLOCK_SIZE)
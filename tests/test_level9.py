@@ -20,13 +20,255 @@
 #       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import random
+import struct
+import unittest
+
 import test_storyformat
+from treatyofbabel.formats import level9
+
+
+# The recognition functions as they were before the level9 scans were
+# rewritten, to check the rewrite against
+def reference_read_l9_int(file_buffer, i):
+    return ord(file_buffer[i+1]) * 2**8 + ord(file_buffer[i])
+
+
+def reference_v2_recognition(file_buffer):
+    for i in range(len(file_buffer) - 20):
+        if (reference_read_l9_int(file_buffer, i + 4) == 0x0020 and
+                reference_read_l9_int(file_buffer, i + 10) == 0x8000 and
+                reference_read_l9_int(file_buffer, i + 20) == reference_read_l9_int(file_buffer,
+                                                                  i + 22)):
+            length = reference_read_l9_int(file_buffer, i + 28)
+            if length and length + i <= len(file_buffer):
+                c = 0
+                for j in range(length + 1):
+                    c += ord(file_buffer[i + j])
+                return (2, length, c % 256)
+    return (0, None, None)
+
+
+def reference_v1_recognition(file_buffer):
+    a = 0xff
+    b = 0xff
+    i = 0
+    while i < len(file_buffer) - 20:
+        if file_buffer[i:i + 5] == 'ATTAC' and ord(file_buffer[i + 5]) == 0xcb:
+            a = ord(file_buffer[i + 6])
+            break
+        i += 1
+    while i < len(file_buffer) - 20:
+        if file_buffer[i:i + 4] == 'BUNC' and ord(file_buffer[i + 4]) == 0xc8:
+            b = ord(file_buffer[i + 5])
+            break
+        i += 1
+    if a is 0xff and b is 0xff:
+        return (0, None)
+    if a == 0x14 and b == 0xff:
+        return (1, 'LEVEL9-006')
+    elif a == 0x15 and b == 0x5d:
+        return (1, 'LEVEL9-013')
+    elif a == 0x1a and b == 0x24:
+        return (1, 'LEVEL9-005')
+    elif a == 0x20 and b == 0x3b:
+        return (1, 'LEVEL9-003')
+    return (1, None)
+
+
+def reference_v3_recognition_phase(phase, file_buffer):
+    ll = 0
+    extent = len(file_buffer)
+    for i in range(extent - 20):
+        if ll:
+            break
+        length = reference_read_l9_int(file_buffer, i)
+        end = length + i
+        if phase != 3:
+            if (end < (extent - 2) and
+                ((phase == 2 or
+                  ((ord(file_buffer[end - 1]) == 0 and
+                    ord(file_buffer[end - 2]) == 0) or
+                   (ord(file_buffer[end + 1]) == 0 and
+                    ord(file_buffer[end + 2]) == 0))) and
+                 length > 0x4000 and length <= 0xdb00)):
+                if length != 0 and ord(file_buffer[i + 13]) == 0:
+                    for j in range(i, i + 16, 2):
+                        i0 = reference_read_l9_int(file_buffer, j)
+                        i2 = reference_read_l9_int(file_buffer, j + 2)
+                        i4 = reference_read_l9_int(file_buffer, j + 4)
+                        if i0 + i2 == i4 and i0 + i2:
+                            ll += 1
+        else:
+            i2 = reference_read_l9_int(file_buffer, i + 2)
+            i4 = reference_read_l9_int(file_buffer, i + 4)
+            i6 = reference_read_l9_int(file_buffer, i + 6)
+            i8 = reference_read_l9_int(file_buffer, i + 8)
+            i10 = reference_read_l9_int(file_buffer, i + 10)
+            if (extent > 0x0fd0 and end <= (extent - 2) and
+                ((i2 + i4) == i6 and i2 != 0 and i4 != 0) and
+                ((i6 + i8) == i10 and
+                 (ord(file_buffer[i + 18]) == 0x2a or
+                  ord(file_buffer[i + 18]) == 0x2c) and
+                 ord(file_buffer[i + 19]) == 0 and
+                 ord(file_buffer[i + 20]) == 0 and
+                 ord(file_buffer[i + 21]) == 0)):
+                ll = 2
+        if ll > 1:
+            c = 0
+            if phase == 3:
+                ll = 1
+            else:
+                c = ord(file_buffer[end])
+                checksum = 0
+                for j in range(i, end+1):
+                    checksum += ord(file_buffer[j])
+                if not checksum % 256:
+                    ll = 1
+                else:
+                    ll = 0
+        else:
+            ll = 0
+    if ll != 0:
+        if length < 0x8500:
+            return (3, length, c)
+        else:
+            return (4, length, c)
+    return (0, None, None)
 
 
 class level9Test(test_storyformat.StoryTest):
     def setUp(self):
         super(level9Test, self).setUp('level9')
 
-    
+
+class RecognitionTest(unittest.TestCase):
+    def setUp(self):
+        self.rand = random.Random(9)
+
+    def make_noise(self, length):
+        # Mostly zeros, so that many offsets are worth a closer look
+        return bytearray(self.rand.choice([0, 0, 0, 0x20, 0x2a, 0x80, 0xc0,
+                                           self.rand.randint(0, 255)])
+                         for i in xrange(length))
+
+    def make_v2(self, length):
+        data = self.make_noise(length)
+        i = self.rand.randint(0, length - 64)
+        data[i + 4:i + 6] = "\x20\x00"
+        data[i + 10:i + 12] = "\x00\x80"
+        data[i + 20:i + 24] = "\x12\x34\x12\x34"
+        struct.pack_into("<H", data, i + 28,
+                         self.rand.randint(1, length - i - 1))
+        return data
+
+    def make_v1(self, length):
+        data = self.make_noise(length)
+        data[100:107] = "ATTAC\xcb\x15"
+        data[300:306] = "BUNC\xc8\x5d"
+        return data
+
+    def make_v3(self, length):
+        data = self.make_noise(length)
+        i = self.rand.randint(0, 512)
+        story_length = self.rand.randint(0x4001, length - i - 4)
+        struct.pack_into("<10H", data, i, story_length, 1, story_length + 1,
+                         2, story_length + 3, 4, 5, 6, 7, 8)
+        data[i + 13] = 0
+        end = i + story_length
+        data[end - 2:end] = "\x00\x00"
+        data[end - 3] = 0
+        data[end - 3] = -sum(data[i:end + 1]) % 256
+        return data
+
+    def make_v3_phase3(self, length):
+        data = self.make_noise(length)
+        i = self.rand.randint(0, length - 64)
+        struct.pack_into("<6H", data, i, 8, 1, 2, 3, 4, 7)
+        data[i + 18:i + 22] = "\x2c\x00\x00\x00"
+        return data
+
+    def check_same(self, data):
+        story = str(data)
+        checks = [(reference_v2_recognition, level9._v2_recognition, ()),
+                  (reference_v1_recognition, level9._v1_recognition, ())]
+        for phase in (1, 2, 3):
+            checks.append((reference_v3_recognition_phase,
+                           level9._v3_recognition_phase, (phase,)))
+        for reference, recognition, args in checks:
+            try:
+                expected = reference(*(args + (story,)))
+            except IndexError:
+                # The old scans could read past the end of the file
+                continue
+            self.assertEqual(recognition(*(args + (story,))), expected)
+
+    def test_noise(self):
+        for length in (0, 20, 21, 64, 5000, 70000):
+            self.check_same(self.make_noise(length))
+
+    def test_planted(self):
+        for make in (self.make_v1, self.make_v2, self.make_v3,
+                     self.make_v3_phase3):
+            for trial in range(5):
+                self.check_same(make(0x6000))
+
+    def make_registered_v2(self, length, story_length, c):
+        # No zeros outside of the planted game, so nothing else is found
+        data = bytearray(self.rand.randint(1, 255) for i in xrange(length))
+        i = self.rand.randint(0, length - story_length - 1)
+        data[i + 4:i + 6] = "\x20\x00"
+        data[i + 10:i + 12] = "\x00\x80"
+        data[i + 20:i + 24] = "\x12\x34\x12\x34"
+        struct.pack_into("<H", data, i + 28, story_length)
+        data[i + story_length] = 0
+        data[i + story_length] = (c - sum(data[i:i + story_length + 1])) % 256
+        return data
+
+    def make_registered_v3(self, length, story_length, c):
+        data = bytearray(self.rand.randint(1, 255) for i in xrange(length))
+        i = self.rand.randint(0, length - story_length - 4)
+        struct.pack_into("<10H", data, i, story_length, 1, story_length + 1,
+                         2, story_length + 3, 4, 5, 6, 7, 8)
+        data[i + 13] = 0
+        end = i + story_length
+        data[end - 2:end + 1] = "\x00\x00" + chr(c)
+        data[end - 3] = 0
+        data[end - 3] = -sum(data[i:end + 1]) % 256
+        return data
+
+    def full_claim(self, data):
+        version, ifid = level9._get_l9_version(str(data))
+        return version > 0 and ifid is not None
+
+    def test_claim(self):
+        for length in (0, 20, 5000, 0x4100, 70000):
+            data = self.make_noise(length)
+            self.assertEqual(level9.claim_story_file(str(data)),
+                             self.full_claim(data))
+        for make in (self.make_v1, self.make_v2, self.make_v3,
+                     self.make_v3_phase3):
+            data = make(0x6000)
+            self.assertEqual(level9.claim_story_file(str(data)),
+                             self.full_claim(data))
+        self.assertTrue(level9.claim_story_file(str(self.make_v1(0x6000))))
+        registered = [story for story in level9.L9_REGISTRY
+                      if story[0] > 0x4000]
+        for trial in range(5):
+            story_length, c, ifid = self.rand.choice(registered)
+            for make in (self.make_registered_v2, self.make_registered_v3):
+                data = str(make(story_length + 0x400, story_length, c))
+                self.assertTrue(self.full_claim(data))
+                self.assertTrue(level9.claim_story_file(data))
+        # A game of an unregistered length
+        data = str(self.make_registered_v2(0x4000, 0x2000, 0))
+        self.assertFalse(level9.claim_story_file(data))
+
+    def test_buffer(self):
+        data = str(self.make_v3(0x6000))
+        self.assertEqual(level9._v3_recognition_phase(1, buffer(data)),
+                         level9._v3_recognition_phase(1, data))
+
+
 if __name__ == "__main__":
     unittest.main()
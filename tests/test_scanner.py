@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+#       test_scanner.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from treatyofbabel import scanner
+from test_analysis import make_zcode_story
+
+
+class ScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp_dir, "sub"))
+        self.stories = {}
+        for i, name in enumerate(["a.z3", os.path.join("sub", "b.z5"),
+                                  os.path.join("sub", "c.dat")]):
+            path = os.path.join(self.tmp_dir, name)
+            serial = "84072{0}".format(i)
+            with open(path, "wb") as h:
+                h.write(make_zcode_story(serial=serial))
+            self.stories[path] = "ZCODE-88-{0}".format(serial)
+        self.bad_story = os.path.join(self.tmp_dir, "notastory.bin")
+        with open(self.bad_story, "wb") as h:
+            h.write("\xff" * 64)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_results(self, results):
+        results = dict((result.path, result) for result in results)
+        self.assertEqual(len(results), len(self.stories) + 1)
+        for path, ifid in self.stories.items():
+            self.assertIsNone(results[path].error)
+            self.assertEqual(results[path].story_format, "zcode")
+            self.assertEqual(results[path].ifids, [ifid])
+        self.assertIsNotNone(results[self.bad_story].error)
+
+    def test_scan_serial(self):
+        self.check_results(scanner.scan(self.tmp_dir, workers=1))
+
+    def test_scan_parallel(self):
+        self.check_results(scanner.scan(self.tmp_dir, workers=2,
+                                      max_pending=1))
+
+    def test_scan_paths(self):
+        paths = sorted(self.stories)
+        results = list(scanner.scan(paths, workers=1))
+        self.assertEqual([result.path for result in results], paths)
+
+    def test_scan_stop_early(self):
+        results = scanner.scan(self.tmp_dir, workers=2, max_pending=1)
+        self.assertIsNotNone(next(results))
+        results.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
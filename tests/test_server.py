@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#
+#       test_server.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import unittest
+import os
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+import treatyofbabel as babel
+from treatyofbabel import server
+from treatyofbabel.wrappers import blorb
+from test_analysis import make_zcode_story
+
+
+PYIFBABEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                         "pyifbabel.in")
+
+COVER = ("\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + "IHDR" +
+         struct.pack(">IIBBBBB", 120, 80, 8, 2, 0, 0, 0) + "\0" * 4)
+
+
+class ServerTest(unittest.TestCase):
+    workers = 1
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.story_path = os.path.join(self.tmp_dir, "story.z3")
+        with open(self.story_path, "wb") as h:
+            h.write(make_zcode_story())
+        cover_path = os.path.join(self.tmp_dir, "cover.png")
+        with open(cover_path, "wb") as h:
+            h.write(COVER)
+        self.blorb_path = os.path.join(self.tmp_dir, "story.zblorb")
+        blorb.create(self.blorb_path, self.story_path, "zcode",
+                     coverart_file=cover_path)
+        self.bad_story = os.path.join(self.tmp_dir, "notastory.bin")
+        with open(self.bad_story, "wb") as h:
+            h.write("\xff" * 64)
+        self.server = server.AnalysisServer(self.get_address(), self.workers)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.client = server.AnalysisClient(self.server.address)
+
+    def get_address(self):
+        return os.path.join(self.tmp_dir, "babel.sock")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_queries(self):
+        for func in ["deduce_format", "get_ifids", "get_meta"]:
+            self.assertEqual(getattr(self.client, func)(self.story_path),
+                             getattr(babel, func)(self.story_path))
+        self.assertIsNone(self.client.get_cover(self.story_path))
+        cover = self.client.get_cover(self.blorb_path)
+        self.assertEqual((cover.data, cover.img_format, cover.width,
+                          cover.height), (COVER, "png", 120, 80))
+        summary = self.client.analyze(self.blorb_path)
+        self.assertEqual(summary["format"], "blorbed zcode")
+        self.assertEqual(summary["cover"]["width"], 120)
+        self.assertRaises(babel.BabelError, self.client.deduce_format,
+                          self.bad_story)
+
+    def test_data(self):
+        with open(self.story_path, "rb") as h:
+            self.assertEqual(self.client.get_ifids(h), ["ZCODE-88-840726"])
+        self.assertEqual(
+            self.client.deduce_format(buffer(make_zcode_story())), "zcode")
+
+    def test_concurrent_clients(self):
+        results = []
+
+        def query():
+            with server.AnalysisClient(self.server.address) as client:
+                for i in range(5):
+                    results.append(client.get_ifids(self.story_path))
+
+        threads = [threading.Thread(target=query) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [["ZCODE-88-840726"]] * 20)
+        stats = self.client.get_stats()
+        self.assertEqual(stats["requests"]["ifids"], 20)
+        self.assertEqual(stats["errors"], 0)
+        self.assertLessEqual(stats["latency"]["p50"], stats["latency"]["max"])
+
+    def test_reconnect(self):
+        self.client.get_ifids(self.story_path)
+        self.client._sock.shutdown(2)
+        self.assertEqual(self.client.get_ifids(self.story_path),
+                         ["ZCODE-88-840726"])
+
+    def test_unencodable_response(self):
+        old_handle_request = self.server.handle_request
+        self.server.handle_request = lambda request: {"ok": True,
+                                                      "result": "\xff"}
+        try:
+            self.assertRaises(babel.BabelError, self.client.get_ifids,
+                              self.story_path)
+        finally:
+            self.server.handle_request = old_handle_request
+        self.assertEqual(self.client.get_ifids(self.story_path),
+                         ["ZCODE-88-840726"])
+
+    def test_restart(self):
+        self.client.get_ifids(self.story_path)
+        self.server.shutdown()
+        self.server.close()
+        self.thread.join()
+        self.server = server.AnalysisServer(self.server.address, self.workers)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.assertEqual(self.client.get_ifids(self.story_path),
+                         ["ZCODE-88-840726"])
+        self.assertEqual(self.client.get_stats()["requests"]["ifids"], 1)
+
+
+class TCPServerTest(ServerTest):
+    workers = 2
+
+    def get_address(self):
+        return ("127.0.0.1", 0)
+
+    def test_loopback_only(self):
+        for host in ["", "0.0.0.0", "::"]:
+            self.assertRaises(ValueError, server.AnalysisServer, (host, 0), 1)
+        with server.AnalysisServer(("localhost", 0), 1) as local_server:
+            self.assertEqual(local_server.address[0], "127.0.0.1")
+
+    def test_ipv6(self):
+        try:
+            local_server = server.AnalysisServer(("::1", 0), 1)
+        except socket.error:
+            self.skipTest("IPv6 is not available")
+        thread = threading.Thread(target=local_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            with server.AnalysisClient(local_server.address) as client:
+                self.assertEqual(client.get_ifids(self.story_path),
+                                 ["ZCODE-88-840726"])
+        finally:
+            local_server.shutdown()
+            local_server.close()
+
+
+class ServeCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.story_path = os.path.join(self.tmp_dir, "story.z3")
+        with open(self.story_path, "wb") as h:
+            h.write(make_zcode_story())
+        self.env = dict(os.environ, PYTHONPATH=os.path.dirname(PYIFBABEL))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def start(self, address):
+        return subprocess.Popen(
+            [sys.executable, PYIFBABEL, "--serve", address, "--jobs", "1"],
+            stderr=subprocess.PIPE, env=self.env)
+
+    def test_serve(self):
+        address = os.path.join(self.tmp_dir, "babel.sock")
+        process = self.start(address)
+        try:
+            self.assertTrue(
+                process.stderr.readline().startswith("Listening on"))
+            with server.AnalysisClient(address) as client:
+                self.assertEqual(client.get_ifids(self.story_path),
+                                 ["ZCODE-88-840726"])
+        finally:
+            process.send_signal(signal.SIGINT)
+            output = process.stderr.read()
+            process.wait()
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("1 requests", output)
+        self.assertFalse(os.path.exists(address))
+
+    def test_serve_refuses_other_hosts(self):
+        process = self.start("0.0.0.0:0")
+        output = process.stderr.read()
+        self.assertEqual(process.wait(), 1)
+        self.assertIn("Not a loopback address", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
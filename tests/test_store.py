@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+#       test_store.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyIFBabel.
+#
+#       pyIFBabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyIFBabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from treatyofbabel import catalog, ifiction, store
+from treatyofbabel.babelerrors import IFictionError
+from test_ifiction import make_catalog
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store_file = os.path.join(self.tmp_dir, "store.db")
+        self.store = store.IFictionStore(self.store_file)
+        self.store.import_ifiction(StringIO(make_catalog(3)))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get(self):
+        self.assertEqual(len(self.store), 3)
+        record = self.store.get("ZCODE-1-840726-ALT")
+        expected = catalog.IFictionCatalog(StringIO(make_catalog(3)))
+        self.assertEqual(vars(record), vars(expected["ZCODE-1-840726"]))
+        self.assertIsNone(self.store.get("NO-SUCH-IFID"))
+
+    def test_persistent_upsert(self):
+        self.store.close()
+        self.store = store.IFictionStore(self.store_file)
+        self.store.import_ifiction(StringIO(make_catalog(4)))
+        self.assertEqual(len(self.store), 4)
+        record = ifiction.StoryRecord()
+        record.identification["ifid_list"] = ["ZCODE-0-840726", "NEW-IFID"]
+        record.identification["ifformat"] = "glulx"
+        self.store.put(record)
+        self.assertEqual(len(self.store), 4)
+        self.assertNotIn("ZCODE-0-840726-ALT", self.store)
+        self.assertIn("NEW-IFID", self.store)
+        self.store.remove("ZCODE-0-840726")
+        self.assertNotIn("NEW-IFID", self.store)
+        self.assertRaises(KeyError, self.store.remove, "NEW-IFID")
+
+    def test_find_and_export(self):
+        titles = [r.bibliographic["title"] for r in
+                  self.store.find(author="Author 2")]
+        self.assertEqual(titles, ["Story 2"])
+        self.assertEqual(len(list(self.store.find(ifformat="zcode"))), 3)
+        self.assertEqual(list(self.store.find(title="Nothing")), [])
+        text = self.store.to_ifiction(self.store.find(title="Story 1"))
+        exported = catalog.IFictionCatalog(StringIO(text))
+        self.assertEqual(len(exported), 1)
+        self.assertEqual(exported["ZCODE-1-840726"].annotation,
+                         {"ifdb": {"tuid": "tuid1"}})
+
+    def test_failed_import(self):
+        self.assertRaises(IFictionError, self.store.import_ifiction,
+                          StringIO(make_catalog(5)[:-40]))
+        self.assertEqual(len(self.store), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,13 +20,88 @@
 #       along with pyIFBabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import unittest
+import struct
+
 import test_storyformat
+from treatyofbabel.formats import tads2, tads3
+
+
+GAMEINFO = "IFID: TADS-TEST-0001\nName: Test Game\nByline: by Some Author\n"
+
+
+def make_tads2_story(resources):
+    """Build a TADS 2 game file containing an HTMLRES section."""
+    data = tads2.T2_SIGNATURE.ljust(48, "\0")
+    index = ""
+    contents = ""
+    for name, rsc in resources:
+        index += struct.pack("<IIH", len(contents), len(rsc), len(name)) + name
+        contents += rsc
+    section = struct.pack("<II", len(resources), 0) + index + contents
+    next_section = len(data) + 12 + len(section)
+    data += (chr(len(tads2.HTML_RES_ID)) + tads2.HTML_RES_ID +
+             struct.pack("<I", next_section) + section)
+    data += (chr(len(tads2.EOF_RES_ID)) + tads2.EOF_RES_ID +
+             struct.pack("<I", 0))
+    return data
+
+
+def make_tads3_story(resources):
+    """Build a TADS 3 image file containing an MRES block."""
+    data = tads3.T3_SIGNATURE.ljust(69, "\0")
+    index_length = 2 + sum(9 + len(name) for name, rsc in resources)
+    index = struct.pack("<H", len(resources))
+    contents = ""
+    for name, rsc in resources:
+        index += struct.pack("<IIB", index_length + len(contents), len(rsc),
+                             len(name))
+        index += name.translate(tads3.NAME_TABLE)
+        contents += rsc
+    block = index + contents
+    data += "MRES" + struct.pack("<IH", len(block), 0) + block
+    data += "EOF " + struct.pack("<IH", 0, 0)
+    return data
 
 
 class tadsTest(test_storyformat.StoryTest):
     def setUp(self):
         super(tadsTest, self).setUp('tads')
-                
+
+
+class ResourceTest(unittest.TestCase):
+    def setUp(self):
+        self.resources = [("music.ogg", "OggS" + "\0" * 20),
+                          ("GameInfo.txt", GAMEINFO)]
+
+    def check_handler(self, handler, story_data):
+        directory = handler._get_resource_directory(story_data)
+        self.assertEqual(sorted(directory), ["gameinfo.txt", "music.ogg"])
+        self.assertEqual(handler._find_resource(story_data, "gameinfo.TXT")[:],
+                         GAMEINFO)
+        self.assertIsNone(handler._find_resource(story_data, "CoverArt.png"))
+        self.assertEqual(handler.get_story_file_ifid(story_data),
+                         "TADS-TEST-0001")
+        self.assertIn("Test Game", handler.get_story_file_meta(story_data))
+        resources = [(name, size, data[:]) for name, size, data in
+                     handler.iter_resources(story_data)]
+        self.assertEqual(resources, [(name, len(rsc), rsc)
+                                     for name, rsc in self.resources])
+
+    def check_duplicates(self, handler, make_story):
+        story_data = make_story(self.resources +
+                                [("gameinfo.txt", "IFID: TADS-TEST-0002\n")])
+        self.assertEqual(handler.get_story_file_ifid(story_data),
+                         "TADS-TEST-0001")
+
+    def test_tads2(self):
+        self.check_handler(tads2, make_tads2_story(self.resources))
+        self.check_duplicates(tads2, make_tads2_story)
+
+    def test_tads3(self):
+        self.check_handler(tads3, make_tads3_story(self.resources))
+        self.check_duplicates(tads3, make_tads3_story)
+
 
 if __name__ == "__main__":
     unittest.main()
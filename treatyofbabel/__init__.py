@@ -28,7 +28,21 @@ are contained directly in this module (treatyofbabel).  Functions for
 creating and manipulating iFiction metadata files are contained in the
 treatyofbabel.ifiction submodule.  Additionally, an object-oriented
 means of representing story files is provided by the IFStory class in
-the treatyofbabel.ifstory submodule.
+the treatyofbabel.ifstory submodule.  When several pieces of
+information are needed about the same file, the analyze function
+returns a StoryAnalysis object (treatyofbabel.analysis) which reads the
+file only once, and whole collections of files can be analyzed in
+parallel with the scan function (treatyofbabel.scanner).  Results can be
+kept between runs in an AnalysisCache (treatyofbabel.cache), which the
+query functions consult when one is given.  Metadata and cover art for
+many stories can be fetched from IFDB with an IFDBClient
+(treatyofbabel.ifdb), and the enrich function (treatyofbabel.enrich)
+does so for a whole collection of story files.  An AnalysisServer
+(treatyofbabel.server) keeps pyifbabel loaded in a long-running process
+and answers the same queries for AnalysisClient objects over a socket.
+These submodules, along with treatyofbabel.catalog and
+treatyofbabel.store, are not imported by this module, so that importing
+it stays cheap; import the ones that are needed directly.
 
 The treatyofbabel.formats and treatyofbabel.wrappers submodules
 provide low-level functions for handling individual story formats and
@@ -39,9 +53,9 @@ called.
 
 
 import os.path
-import xml.dom.minidom
 
 import ifiction
+from analysis import StoryAnalysis
 from babelerrors import BabelError
 from formats import (adrift, advsys, agt, alan, executable, glulx,
                      hugo, level9, magscrolls, quest, tads2, tads3,
@@ -53,11 +67,34 @@ TREATY_VERSION = u"9"
 HANDLERS = [adrift, advsys, agt, alan, executable, glulx, hugo,
             level9, magscrolls, quest, tads2, tads3, twine, zcode]
 EXTENSION_MAP = {}
+# Each handler declares the fixed byte strings (SIGNATURES, as (offset,
+# magic) pairs) that its story files start with, a rough relative cost
+# of its claim_story_file function (CLAIM_COST) and whether it can claim
+# files without a signature match (HEURISTIC_CLAIM).  SIGNATURE_MAP maps
+# (offset, length) to a dict of magic strings and their handlers, so that
+# most formats are recognized with a few dict lookups; only the
+# heuristic handlers are probed one by one, cheapest first.
+SIGNATURE_MAP = {}
+HEURISTIC_HANDLERS = []
+# Handlers which can claim (and possibly identify) a story from its first
+# few bytes declare how many they need (HEADER_READ_LENGTH, None if they
+# need the whole file).  HEADER_READ_LENGTH is enough for all of them, for
+# signature matching and for recognizing blorbs and iFiction files.
+HEADER_READ_LENGTH = 64
 
 
 for h in HANDLERS:
     for ext in h.get_file_extensions():
         EXTENSION_MAP[ext] = h
+    for offset, magic in h.SIGNATURES:
+        magic_map = SIGNATURE_MAP.setdefault((offset, len(magic)), {})
+        magic_map.setdefault(magic, []).append(h)
+        HEADER_READ_LENGTH = max(HEADER_READ_LENGTH, offset + len(magic))
+    if h.HEADER_READ_LENGTH is not None:
+        HEADER_READ_LENGTH = max(HEADER_READ_LENGTH, h.HEADER_READ_LENGTH)
+    if h.HEURISTIC_CLAIM:
+        HEURISTIC_HANDLERS.append(h)
+HEURISTIC_HANDLERS.sort(key=lambda h: h.CLAIM_COST)
 
 
 def deduce_handler(story_file, story_buffer):
@@ -77,17 +114,120 @@ def deduce_handler(story_file, story_buffer):
         raise ValueError()
     basename = os.path.basename(story_file)
     extension = os.path.splitext(basename)[1]
+    return _claim_handler(story_buffer, extension)
+
+
+def _claim_handler(story_buffer, extension=None):
+    """Find the handler claiming a story.
+
+    Args:
+        story_buffer: a buffer containing the story file data
+        extension: the story file's extension, if known (default: None)
+    Returns:
+        The babel format/wrapper handler appropriate for the file
+    Raises:
+        BabelError: if the story is of an unknown format
+
+    """
+    for h in _candidate_handlers(story_buffer, extension):
+        if h.claim_story_file(story_buffer):
+            return h
+    raise BabelError("Unknown story format")
+
+
+def _claim_header_handler(reader, extension=None):
+    """Find the handler claiming a story from the start of the file.
+
+    The candidate handlers are tried in the same order as by
+    _claim_handler, so the result is the same as if the whole file had
+    been read.
+
+    Args:
+        reader: an object with the story file's size, its first
+                HEADER_READ_LENGTH bytes (header) and a read(offset, length)
+                method for reading other parts of it
+        extension: the story file's extension, if known (default: None)
+    Returns:
+        The babel format/wrapper handler appropriate for the file or None if
+        the whole file is needed to tell
+
+    """
+    for h in _candidate_handlers(reader.header, extension):
+        if h.HEADER_READ_LENGTH is None:
+            return None
+        if h.claim_story_header(reader):
+            return h
+    return None
+
+
+def _candidate_handlers(story_buffer, extension=None):
+    """Iterate over the handlers which might claim a story.
+
+    The handler registered for the file extension comes first, then the
+    handlers whose signatures match the data and finally the heuristic
+    handlers, in order of increasing cost.  Each handler is yielded once.
+
+    Args:
+        story_buffer: a buffer containing at least the first
+                      HEADER_READ_LENGTH bytes of the story file
+        extension: the story file's extension, if known (default: None)
+    Returns:
+        An iterator over handlers
+
+    """
     handler = EXTENSION_MAP.get(extension)
-    if handler is None or not handler.claim_story_file(story_buffer):
-        for h in HANDLERS:
-            if h.claim_story_file(story_buffer):
-                handler = h
-                break
-            else:
-                handler = None
-    if handler is None:
-        raise BabelError("Unknown story format")
-    return handler
+    if handler is not None:
+        yield handler
+    tried = set([handler])
+    for h in _match_signatures(story_buffer):
+        if h not in tried:
+            tried.add(h)
+            yield h
+    for h in HEURISTIC_HANDLERS:
+        if h not in tried:
+            yield h
+
+
+def _match_signatures(story_buffer):
+    """Find the handlers whose signatures match a story.
+
+    Args:
+        story_buffer: a buffer containing the story file data
+    Returns:
+        A list of handlers, in the order of HANDLERS
+
+    """
+    candidates = []
+    for (offset, length), magic_map in SIGNATURE_MAP.items():
+        candidates.extend(magic_map.get(story_buffer[offset:offset + length],
+                                        []))
+    candidates.sort(key=HANDLERS.index)
+    return candidates
+
+
+def analyze(story_input, story_name=None, use_mmap=False):
+    """Analyze a story file, reading it only once.
+
+    The returned object computes the story's format, IFIDs, metadata and
+    cover art on demand and remembers them, so asking for several of them
+    costs a single read of the file.
+
+    Args:
+        story_input: the file path of a story file, a file object open for
+                     reading or a buffer containing the story data
+        story_name: the file name used to guess the story's format from its
+                    extension when story_input is not a path (default: None)
+        use_mmap: memory-map the file rather than reading it into memory;
+                  the analysis should then be closed after use (default:
+                  False)
+    Returns:
+        A StoryAnalysis object
+    Raises:
+        ValueError: if story_input is None or empty
+        TypeError: if story_input is not a path, file object or buffer
+
+    """
+    return StoryAnalysis(story_input, story_name, use_mmap)
 
 
 def _get_story_data(story_file):
@@ -102,125 +242,116 @@ def _get_story_data(story_file):
         is unusually small
 
     """
-    if story_file is None or story_file == "":
-        raise ValueError("No story file specified")
-    with open(story_file, 'rb') as story_handle:
-        story_data = story_handle.read()
-    # If the data read is less than 20 bytes (arbitrarily chosen), it probably
-    # doesn't contain a valid story file.
-    if len(story_data) < 20:
-        raise ValueError("Truncated story file")
-    return story_data
+    with analyze(story_file) as analysis:
+        return analysis.story_data
 
 
-def deduce_format(story_file):
+def deduce_format(story_file, use_mmap=False, cache=None):
     """Deduce the format of a story file.
 
     Args:
         story_file: the file path of a story file
+        use_mmap: memory-map the file rather than reading it into memory
+                  (default: False)
+        cache: an AnalysisCache to consult (default: None)
     Returns:
         The name of the formt of the story, which could be blorbed
 
     """
-    story_data = _get_story_data(story_file)
-    if blorb.claim_story_file(story_data):
-        story_format = blorb.get_story_format(story_data)
-        return "blorbed {0}".format(story_format)
-    handler = deduce_handler(story_file, story_data)
-    return handler.get_format_name()
+    if cache is not None:
+        result = cache.lookup(story_file)
+        if result is not None:
+            return result.story_format
+    with analyze(story_file, use_mmap=use_mmap) as analysis:
+        return analysis.story_format
 
 
-def get_ifids(story_file):
+def get_ifids(story_file, use_mmap=False, cache=None):
     """Get the IFID from a story file or from an ifiction file.
 
     Args:
         story_file: the file path of a story file or an iFiction file
+        use_mmap: memory-map the file rather than reading it into memory
+                  (default: False)
+        cache: an AnalysisCache to consult (default: None)
     Returns:
         A list of IFIDs associated with the file or None if the iFiction file
         is bogus
 
     """
-    try:
-        xml_doc = xml.dom.minidom.parse(story_file)
-    except:
-        story_data = _get_story_data(story_file)
-        if blorb.claim_story_file(story_data):
-            try:
-                ifids = blorb.get_story_file_ifid(story_data)
-            except:
-                return [blorb._get_embedded_ifid(story_data)]
-            else:
-                return ifids
-        handler = deduce_handler(story_file, story_data)
-        return [handler.get_story_file_ifid(story_data)]
-    else:
-        if not ifiction.is_ifiction(xml_doc):
-            return None
-        ifids = []
-        stories = ifiction.get_all_stories(xml_doc)
-        for story in stories:
-            ifids.append(ifiction.get_identification(story)["ifid"])
-        return ifids
+    if cache is not None:
+        result = cache.lookup(story_file)
+        if result is not None:
+            return result.ifids
+    with analyze(story_file, use_mmap=use_mmap) as analysis:
+        return analysis.ifids
 
 
-def get_meta(story_file, truncate=False):
+def get_meta(story_file, truncate=False, use_mmap=False, cache=None):
     """Get the available metadata for a story file.
 
     Args:
         story_file: the file path of a story file
         truncate: truncate the metadata fields to 240 characters (2400
                   characters for the description) (default: False)
+        use_mmap: memory-map the file rather than reading it into memory
+                  (default: False)
+        cache: an AnalysisCache to consult; only untruncated metadata is
+               cached (default: None)
     Returns:
         An iFiction metadata file or None if the story's format does not
         provide metadata
 
     """
-    story_data = _get_story_data(story_file)
-    if blorb.claim_story_file(story_data):
-        return blorb.get_story_file_meta(story_data)
-    else:
-        handler = deduce_handler(story_file, story_data)
-        if handler.HAS_META:
-            return handler.get_story_file_meta(story_data, truncate)
-    return None
+    if cache is not None and not truncate:
+        result = cache.lookup(story_file)
+        if result is not None:
+            return result.meta
+    with analyze(story_file, use_mmap=use_mmap) as analysis:
+        return analysis.get_meta(truncate)
 
 
-def get_cover(story_file):
+def get_cover(story_file, use_mmap=False, cache=None):
     """Extract cover art from a story file.
 
     Args:
         story_file: the file path of a story file
+        use_mmap: memory-map the file rather than reading it into memory
+                  (default: False)
+        cache: an AnalysisCache to consult; only the cover's dimensions are
+               cached, so the file is still read if it has a cover
+               (default: None)
     Returns:
         A CoverImage object containing the cover data (see
         treatyofbabel.utils._imgfuncs) or None if the story does not have a
         cover associated with it
 
     """
-    story_data = _get_story_data(story_file)
-    if blorb.claim_story_file(story_data):
-        return blorb.get_story_file_cover(story_data)
-    else:
-        handler = deduce_handler(story_file, story_data)
-        if handler.HAS_COVER:
-            return handler.get_story_file_cover(story_data)
-    return None
+    if cache is not None:
+        result = cache.lookup(story_file)
+        if result is not None and result.cover_format is None:
+            return None
+    with analyze(story_file, use_mmap=use_mmap) as analysis:
+        cover = analysis.cover
+        if cover is not None:
+            cover.data = cover.data[:]
+        return cover
 
 
-def get_story(story_file):
+def get_story(story_file, use_mmap=False):
     """Extract a story from a story file, particularly a wrapped (blorbed)
     file.
 
     Args:
         story_file: the file path of a story file
+        use_mmap: memory-map the file rather than reading it into memory
+                  (default: False)
     Returns:
         The data of the (wrapped) story file
 
     """
-    story_data = _get_story_data(story_file)
-    if blorb.claim_story_file(story_data):
-        return blorb.get_story_file(story_data)
-    else:
-        return story_data
+    with analyze(story_file, use_mmap=use_mmap) as analysis:
+        return analysis.story[:]
 
 
 def verify_ifiction(ifiction_file):
@@ -265,7 +396,8 @@ def make_blorb(output_file, story_file, ifiction_file,
     """Bundle story file and ifiction into a blorb.
 
     Args:
-        output_file: the blorb file to write
+        output_file: the file path of the blorb file to write, or a file
+                     object open for writing
         story_file: the file path of a story file
         ifiction_file: the file path of an iFiction file
         coverart_file: the file path of a PNG or JPEG cover art file
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+#
+#       analysis.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module provides the StoryAnalysis class, which reads a story file
+once and lazily derives its format, IFIDs, metadata and cover art from
+that single read.
+
+"""
+
+
+import mmap
+import os
+import os.path
+from cStringIO import StringIO
+
+import ifiction
+import treatyofbabel
+from babelerrors import IFictionError
+from utils._hashfuncs import get_file_md5, get_md5
+from wrappers import blorb
+
+
+class StoryAnalysis(object):
+    """A lazily-populated analysis of a single story file.
+
+    The story data is read at most once and the story's handler is
+    deduced at most once.  Every derived field is computed the first time
+    it is requested and memoized for later requests.
+
+    When a story file is given by its path, its format and, for some
+    formats, its IFID are deduced from the first few bytes of the file;
+    the rest is only read if it is needed.
+
+    If the file is memory-mapped, the story and cover art data returned
+    are buffer objects that refer to the mapping rather than copies, and
+    they are only valid until the analysis is closed.  The object can be
+    used as a context manager to close it.
+
+    """
+    def __init__(self, story_input, story_name=None, use_mmap=False):
+        """Initialize the object.
+
+        Args:
+            story_input: the file path of a story file, a file object open
+                         for reading or a buffer (bytearray, buffer or
+                         memoryview) containing the story data
+            story_name: the file name used to guess the story's format from
+                        its extension when story_input is not a path
+                        (default: None)
+            use_mmap: memory-map the file instead of reading it, if
+                      story_input is a path (default: False)
+        Raises:
+            ValueError: if story_input is None or empty
+            TypeError: if story_input is none of the above
+
+        """
+        if story_input is None or story_input == "":
+            raise ValueError("No story file specified")
+        self._story_handle = None
+        self._story_map = None
+        self._header_reader = None
+        self._raw_data = None
+        self.use_mmap = use_mmap
+        if isinstance(story_input, basestring):
+            self.story_file = story_input
+        elif hasattr(story_input, "read"):
+            self.story_file = None
+            self._story_handle = story_input
+        elif isinstance(story_input, (bytearray, buffer)):
+            self.story_file = None
+            self._raw_data = str(story_input)
+        elif isinstance(story_input, memoryview):
+            self.story_file = None
+            self._raw_data = story_input.tobytes()
+        else:
+            raise TypeError("Expected a file path, file object or buffer")
+        if story_name is None and self._story_handle is not None:
+            story_name = getattr(self._story_handle, "name", None)
+        if story_name is None:
+            story_name = self.story_file
+        self.story_name = story_name
+        self._cache = {}
+        self._meta = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the file, if it is open, and release its memory map, if
+        any.
+
+        """
+        if self._header_reader is not None:
+            self._header_reader.close()
+            self._header_reader = None
+        # The blorb index refers to the data, which may be mapped
+        self._cache.pop("blorb_file", None)
+        if self._story_map is not None:
+            self._story_map.close()
+            self._story_map = None
+            self._raw_data = None
+
+    def _memoize(self, key, func):
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+
+    @property
+    def raw_data(self):
+        """The unvalidated contents of the file, read on first access."""
+        if self._raw_data is None:
+            if self._story_handle is not None:
+                self._raw_data = self._story_handle.read()
+            elif self._header_reader is not None:
+                self._raw_data = self._header_reader.read_all()
+                self._header_reader.close()
+                self._header_reader = None
+            else:
+                with open(self.story_file, 'rb') as story_handle:
+                    self._raw_data = self._read(story_handle)
+        return self._raw_data
+
+    def _read(self, story_handle):
+        # Empty files cannot be mapped, and there is no point in mapping
+        # files too small to be stories
+        if (self.use_mmap and
+                os.fstat(story_handle.fileno()).st_size >= 20):
+            self._story_map = mmap.mmap(story_handle.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            return self._story_map
+        return story_handle.read()
+
+    @property
+    def _reader(self):
+        """A _HeaderReader for the file, or None if it is not needed
+        because the data has been read already (or will be mapped).
+
+        """
+        if (self._raw_data is not None or self.story_file is None or
+                self.use_mmap):
+            return None
+        if self._header_reader is None:
+            self._header_reader = _HeaderReader(
+                open(self.story_file, 'rb'), treatyofbabel.HEADER_READ_LENGTH)
+        return self._header_reader
+
+    @property
+    def size(self):
+        """The size of the file in bytes."""
+        reader = self._reader
+        if reader is not None:
+            return reader.size
+        return len(self.raw_data)
+
+    @property
+    def md5(self):
+        """The md5 digest of the whole file, as upper-case hexadecimal
+        digits.  A file given by its path is hashed from disk in blocks if
+        it has not been read already.
+
+        """
+        return self._memoize("md5", self._get_md5)
+
+    def _get_md5(self):
+        reader = self._reader
+        if reader is not None:
+            return reader.get_md5()
+        return get_md5(self.raw_data)
+
+    @property
+    def story_data(self):
+        """The contents of the story file.
+
+        Raises:
+            ValueError: if the length of the data is unusually small
+
+        """
+        data = self.raw_data
+        # If the data read is less than 20 bytes (arbitrarily chosen), it
+        # probably doesn't contain a valid story file.
+        if len(data) < 20:
+            raise ValueError("Truncated story file")
+        return data
+
+    @property
+    def is_blorb(self):
+        """True if the story is wrapped in a blorb."""
+        return self._memoize("is_blorb", self._is_blorb)
+
+    def _is_blorb(self):
+        reader = self._reader
+        if reader is None:
+            return blorb.claim_story_file(self.story_data)
+        if reader.size < 20:
+            raise ValueError("Truncated story file")
+        return blorb.claim_story_file(reader.header)
+
+    @property
+    def _blorb_file(self):
+        """The BlorbFile of the story data, indexed on first access."""
+        return self._memoize("blorb_file", self._index_blorb)
+
+    @property
+    def blorb_file(self):
+        """The BlorbFile of the story, or None if it is not blorbed.  It
+        can be passed to the functions of the blorb module in place of
+        the story data.
+
+        """
+        if not self.is_blorb:
+            return None
+        return self._blorb_file
+
+    def _index_blorb(self):
+        return blorb.BlorbFile(self.story_data)
+
+    @property
+    def handler(self):
+        """The format handler of the (unwrapped) story file.
+
+        Raises:
+            BabelError: if the story is of an unknown format
+
+        """
+        return self._memoize("handler", self._deduce_handler)
+
+    def _deduce_handler(self):
+        if self.story_name:
+            basename = os.path.basename(self.story_name)
+            extension = os.path.splitext(basename)[1]
+        else:
+            extension = None
+        if not self.is_blorb:
+            reader = self._reader
+            if reader is not None:
+                handler = treatyofbabel._claim_header_handler(reader,
+                                                              extension)
+                if handler is not None:
+                    return handler
+        return treatyofbabel._claim_handler(self.story, extension)
+
+    @property
+    def story_format(self):
+        """The name of the format of the story, which could be blorbed."""
+        return self._memoize("story_format", self._deduce_format)
+
+    def _deduce_format(self):
+        if self.is_blorb:
+            story_format = self._blorb_file.get_story_format()
+            return "blorbed {0}".format(story_format)
+        return self.handler.get_format_name()
+
+    @property
+    def ifids(self):
+        """A list of IFIDs associated with the file, or None if the file is
+        a bogus iFiction file.
+
+        """
+        return self._memoize("ifids", self._get_ifids)
+
+    def _get_ifids(self):
+        if self._looks_like_xml():
+            ifids = []
+            try:
+                for story in ifiction.iter_stories(self._get_xml_source()):
+                    ifids.extend(story.identification["ifid_list"])
+            except IFictionError, err:
+                if err.value == "Document not IFiction":
+                    return None
+            else:
+                return ifids
+        if self.is_blorb:
+            try:
+                return self._blorb_file.get_story_file_ifid()
+            except:
+                return [self._blorb_file.get_embedded_ifid()]
+        handler = self.handler
+        reader = self._reader
+        if (reader is not None and
+                hasattr(handler, "get_story_header_ifid")):
+            ifid = handler.get_story_header_ifid(reader)
+            if ifid is not None:
+                return [ifid]
+        return [handler.get_story_file_ifid(self.story_data)]
+
+    def _looks_like_xml(self):
+        # Binary story files would fail on their first byte anyway
+        reader = self._reader
+        if reader is not None:
+            head = reader.header[:64].lstrip()
+        else:
+            head = self.raw_data[:64].lstrip()
+        return head.startswith("<") or head.startswith("\xef\xbb\xbf<")
+
+    def _get_xml_source(self):
+        # iFiction files given by path are parsed straight from the file,
+        # without reading them into memory
+        reader = self._reader
+        if reader is not None:
+            return self.story_file
+        if self._story_map is not None:
+            self._story_map.seek(0)
+            return self._story_map
+        return StringIO(self.raw_data)
+
+    @property
+    def meta(self):
+        """The untruncated iFiction metadata of the story, or None."""
+        return self.get_meta()
+
+    def get_meta(self, truncate=False):
+        """Get the available metadata for the story.
+
+        Args:
+            truncate: truncate the metadata fields to 240 characters (2400
+                      characters for the description) (default: False)
+        Returns:
+            An iFiction metadata file or None if the story's format does not
+            provide metadata
+
+        """
+        if truncate not in self._meta:
+            self._meta[truncate] = self._get_meta(truncate)
+        return self._meta[truncate]
+
+    def _get_meta(self, truncate):
+        if self.is_blorb:
+            return self._blorb_file.get_story_file_meta()
+        if self.handler.HAS_META:
+            return self.handler.get_story_file_meta(self.story_data, truncate)
+        return None
+
+    @property
+    def cover(self):
+        """A CoverImage object containing the cover art, or None."""
+        return self._memoize("cover", self._get_cover)
+
+    def _get_cover(self):
+        if self.is_blorb:
+            return self._blorb_file.get_story_file_cover()
+        if self.handler.HAS_COVER:
+            return self.handler.get_story_file_cover(self.story_data)
+        return None
+
+    @property
+    def story(self):
+        """The data of the story file, unwrapped if it is blorbed."""
+        return self._memoize("story", self._get_story)
+
+    def _get_story(self):
+        if self.is_blorb:
+            return self._blorb_file.get_story_file()
+        return self.story_data
+
+
+class _HeaderReader(object):
+    """Reads the start of a story file and other small parts of it on
+    demand, without reading the whole file.
+
+    """
+    def __init__(self, story_handle, header_length):
+        self._story_handle = story_handle
+        self.size = os.fstat(story_handle.fileno()).st_size
+        self.header = story_handle.read(header_length)
+
+    def read(self, offset, length):
+        """Read length bytes of the file from offset."""
+        if offset + length <= len(self.header):
+            return self.header[offset:offset + length]
+        self._story_handle.seek(offset)
+        return self._story_handle.read(length)
+
+    def read_all(self):
+        """Read the whole file."""
+        self._story_handle.seek(0)
+        return self._story_handle.read()
+
+    def get_md5(self):
+        """Get the md5 digest of the whole file, without keeping it in
+        memory.
+
+        """
+        return get_file_md5(self._story_handle)
+
+    def close(self):
+        self._story_handle.close()
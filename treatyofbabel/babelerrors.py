@@ -54,3 +54,12 @@ class BabelImgError(Exception):
 
     def __str__(self):
         return repr(self.value)
+
+
+class IFDBError(Exception):
+    """Raised when a request to IFDB fails."""
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
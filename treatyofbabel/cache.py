@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+#       cache.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module provides the AnalysisCache class, an on-disk cache of the
+results of analyzing story files, so that unchanged files need not be
+analyzed again.
+
+"""
+
+
+import json
+import os
+import os.path
+import sqlite3
+
+import treatyofbabel
+from scanner import ScanResult, _scan_file
+from utils._hashfuncs import get_file_md5
+
+# The version of the analyses stored in the cache.  Increment it whenever a
+# change to pyifbabel changes the results of analyzing a file, so that
+# results cached by older versions are discarded.
+CACHE_VERSION = 3
+
+
+class AnalysisCache(object):
+    """A persistent cache of story analyses, stored in an SQLite database.
+
+    Entries are found by the path, size, modification time and inode of
+    a file.  If those do not match, an entry for a file with the same
+    size and contents (by md5) is used instead, so renamed or touched
+    files are not analyzed again.  The least recently used entries are
+    evicted when the cache grows beyond its limits, and the whole cache
+    is discarded when the cache version, the pyifbabel version or its set
+    of format handlers changes.
+
+    Attributes:
+        hits: the number of lookups answered from the cache
+        misses: the number of lookups which required an analysis
+
+    """
+    def __init__(self, cache_file, max_entries=None, max_bytes=None):
+        """Initialize the object.
+
+        Args:
+            cache_file: the path of the database file, which is created if
+                        it does not exist
+            max_entries: the maximum number of entries kept (default: None,
+                         unlimited)
+            max_bytes: the maximum total size of the entries kept, in bytes
+                       (default: None, unlimited)
+
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(cache_file)
+        self._db.text_factory = str
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT);
+            CREATE TABLE IF NOT EXISTS analyses (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                inode INTEGER,
+                digest TEXT,
+                story_format TEXT,
+                ifids TEXT,
+                meta BLOB,
+                cover_format TEXT,
+                cover_width INTEGER,
+                cover_height INTEGER,
+                entry_size INTEGER,
+                last_used INTEGER);
+            CREATE INDEX IF NOT EXISTS analyses_size ON analyses (size);
+            """)
+        generation = _get_generation()
+        row = self._db.execute("SELECT value FROM info WHERE key = ?",
+                               ("generation",)).fetchone()
+        if row is None or row[0] != generation:
+            self._db.execute("DELETE FROM analyses")
+            self._db.execute("INSERT OR REPLACE INTO info VALUES (?, ?)",
+                             ("generation", generation))
+            self._db.commit()
+        self._clock = self._db.execute(
+            "SELECT MAX(last_used) FROM analyses").fetchone()[0] or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self._db.execute("DELETE FROM analyses")
+        self._db.commit()
+
+    def lookup(self, story_file):
+        """Get the analysis of a story file, analyzing it if it is not
+        cached.
+
+        Args:
+            story_file: the file path of a story file
+        Returns:
+            A ScanResult object (see treatyofbabel.scanner) or None if the
+            file could not be analyzed; failures are not cached
+
+        """
+        path = os.path.abspath(story_file)
+        stat = os.stat(path)
+        result, digest = self._find(path, stat)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        # The digest is taken from the analysis unless the file had to be
+        # hashed already to look for a copy of it in the cache
+        result, analysis_digest = _scan_file(path, digest is None)
+        if result.error is not None:
+            return None
+        self._store(path, stat, digest or analysis_digest, result)
+        return result
+
+    def _find(self, path, stat):
+        """Find the cached result of a file, returning it and the md5
+        digest of the file, if the file had to be hashed to find it.
+
+        """
+        row = self._db.execute(
+            "SELECT * FROM analyses WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[1:4] == (stat.st_size, stat.st_mtime,
+                                            stat.st_ino):
+            self._touch(path)
+            return _make_result(path, row), None
+        rows = self._db.execute(
+            "SELECT * FROM analyses WHERE size = ?",
+            (stat.st_size,)).fetchall()
+        if not rows:
+            return None, None
+        digest = _hash_file(path)
+        for row in rows:
+            if row[4] == digest:
+                result = _make_result(path, row)
+                self._store(path, stat, digest, result)
+                return result, digest
+        return None, digest
+
+    def _touch(self, path):
+        self._clock += 1
+        self._db.execute("UPDATE analyses SET last_used = ? WHERE path = ?",
+                         (self._clock, path))
+        self._db.commit()
+
+    def _store(self, path, stat, digest, result):
+        ifids = json.dumps(result.ifids)
+        meta = result.meta
+        entry_size = len(path) + len(result.story_format) + len(ifids)
+        if meta is not None:
+            entry_size += len(meta)
+            meta = sqlite3.Binary(meta)
+        self._clock += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO analyses VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, stat.st_ino, digest,
+             result.story_format, ifids, meta, result.cover_format,
+             result.cover_width, result.cover_height, entry_size,
+             self._clock))
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        if self.max_entries is not None:
+            self._db.execute(
+                "DELETE FROM analyses WHERE path IN (SELECT path FROM "
+                "analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+        if self.max_bytes is not None:
+            total = self._db.execute(
+                "SELECT SUM(entry_size) FROM analyses").fetchone()[0] or 0
+            rows = self._db.execute(
+                "SELECT path, entry_size FROM analyses "
+                "ORDER BY last_used").fetchall()
+            for path, entry_size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM analyses WHERE path = ?",
+                                 (path,))
+                total -= entry_size
+
+
+def _get_generation():
+    """Identify the versions of the cache, pyifbabel and its handlers,
+    which the cached results depend on.
+
+    """
+    handlers = [h.__name__ for h in treatyofbabel.HANDLERS]
+    return ":".join([str(CACHE_VERSION), treatyofbabel.PYIFBABEL_VERSION] +
+                    handlers)
+
+
+def _make_result(path, row):
+    (size, story_format, ifids, meta, cover_format, cover_width,
+     cover_height) = (row[1],) + row[5:11]
+    if meta is not None:
+        meta = str(meta)
+    return ScanResult(path, size, story_format, json.loads(ifids), meta,
+                      cover_format, cover_width, cover_height)
+
+
+def _hash_file(path):
+    with open(path, 'rb') as story_handle:
+        return get_file_md5(story_handle)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+#       catalog.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module provides the IFictionCatalog class, a collection of
+iFiction stories indexed by their IFIDs.
+
+"""
+
+
+from collections import OrderedDict
+
+import ifiction
+from babelerrors import IFictionError
+
+
+class IFictionCatalog(object):
+    """A collection of iFiction stories which can be looked up by any of
+    their IFIDs in constant time.
+
+    Stories are kept as ifiction.StoryRecord objects, in the order they
+    were added.  No two stories in a catalog may share an IFID.
+
+    """
+    def __init__(self, ifiction_source=None):
+        """Initialize the object.
+
+        Args:
+            ifiction_source: the path of an IFiction file or a file object
+                             open for reading to load the stories from
+                             (default: None)
+
+        """
+        self._stories = OrderedDict()
+        self._index = {}
+        self._next_key = 0
+        if ifiction_source is not None:
+            self.load(ifiction_source)
+
+    def __len__(self):
+        return len(self._stories)
+
+    def __iter__(self):
+        return self._stories.itervalues()
+
+    def __contains__(self, ifid):
+        return ifid in self._index
+
+    def __getitem__(self, ifid):
+        return self._stories[self._index[ifid]]
+
+    def get(self, ifid, default=None):
+        """Get the story with an IFID.
+
+        Args:
+            ifid: an IFID
+            default: the value returned if no story has the IFID (default:
+                     None)
+        Returns:
+            A StoryRecord or default
+
+        """
+        key = self._index.get(ifid)
+        if key is None:
+            return default
+        return self._stories[key]
+
+    def load(self, ifiction_source):
+        """Add all of the stories in an IFiction file, replacing stories
+        with the same IFIDs.
+
+        Args:
+            ifiction_source: the path of an IFiction file or a file object
+                             open for reading
+        Raises:
+            IFictionError if the file is not well-formed IFiction
+
+        """
+        for record in ifiction.iter_stories(ifiction_source):
+            self.replace(record)
+
+    def add(self, story):
+        """Add a story.
+
+        Args:
+            story: a StoryRecord or a story Node
+        Raises:
+            IFictionError if the story has no IFIDs or shares an IFID with
+            a story in the catalog
+
+        """
+        record = _get_record(story)
+        for ifid in record.identification["ifid_list"]:
+            if ifid in self._index:
+                raise IFictionError(
+                    "catalog: IFID {0} already present".format(ifid))
+        self._insert(record)
+
+    def replace(self, story):
+        """Add a story, removing any stories which share an IFID with it.
+
+        Args:
+            story: a StoryRecord or a story Node
+        Raises:
+            IFictionError if the story has no IFIDs
+
+        """
+        record = _get_record(story)
+        for ifid in record.identification["ifid_list"]:
+            if ifid in self._index:
+                self.remove(ifid)
+        self._insert(record)
+
+    def remove(self, ifid):
+        """Remove the story with an IFID, along with all of its other IFIDs.
+
+        Args:
+            ifid: an IFID
+        Raises:
+            KeyError if no story has the IFID
+
+        """
+        record = self._stories.pop(self._index[ifid])
+        for story_ifid in record.identification["ifid_list"]:
+            self._index.pop(story_ifid, None)
+
+    def _insert(self, record):
+        key = self._next_key
+        self._next_key += 1
+        self._stories[key] = record
+        for ifid in record.identification["ifid_list"]:
+            self._index[ifid] = key
+
+    def to_ifiction_dom(self):
+        """Build an IFiction DOM containing all of the stories.
+
+        Returns:
+            An xml.dom.minidom DOM object
+        Raises:
+            IFictionError if a story lacks data which IFiction requires
+
+        """
+        ifiction_dom = ifiction.create_ifiction_dom()
+        for record in self._stories.itervalues():
+            ifiction.add_story_record(ifiction_dom, record)
+        return ifiction_dom
+
+    def to_ifiction(self, indent="\t"):
+        """Create an IFiction XML document containing all of the stories.
+
+        Args:
+            indent: the character used to indent the XML (default: \\t)
+        Returns:
+            The document as a UTF-8 encoded string
+
+        """
+        return ifiction.format_ifiction(self._stories.itervalues(), indent)
+
+
+def _get_record(story):
+    if not isinstance(story, ifiction.StoryRecord):
+        story = ifiction.get_story_record(story)
+    if not story.identification["ifid_list"]:
+        raise IFictionError("identification: IFID required")
+    return story
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+#       enrich.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""This module implements enriching whole collections of story files
+with metadata from IFDB.  The files are analyzed in a pool of worker
+processes (see treatyofbabel.scanner) while the IFDB records of the
+stories already analyzed are fetched on a pool of threads, so that the
+local and the network work overlap.
+
+"""
+
+
+import Queue
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import ifdb
+import scanner
+from babelerrors import IFictionError, IFDBError
+from ifstory import IFStory
+
+
+# The number of IFDB responses kept for stories which turn up later with
+# an IFID already fetched
+MAX_FETCHED = 1000
+
+
+class EnrichResult(object):
+    """The outcome of enriching a single story file.
+
+    Attributes:
+        path: the path of the story file
+        story: an IFStory merging the story file's own metadata with IFDB's,
+               or None if the file could not be analyzed
+        found: True if IFDB had a record of the story
+        error: a description of what went wrong, or None
+
+    """
+    def __init__(self, path, story=None, found=False, error=None):
+        self.path = path
+        self.story = story
+        self.found = found
+        self.error = error
+
+
+class EnrichStats(object):
+    """Counts and timings of the stages of an enrichment, for tuning the
+    numbers of analysis workers and IFDB connections.
+
+    Attributes:
+        analyzed: the number of files analyzed
+        analysis_errors: the number of files which could not be analyzed
+        analysis_time: the time until the last analysis was done, in seconds
+        requests: the number of IFDB requests made, one per distinct IFID
+        duplicates: the number of stories whose IFID had already been
+                    requested
+        fetch_errors: the number of IFDB requests which failed
+        fetch_time: the time from the first IFDB request until the last one
+                    was done, in seconds
+        write_errors: the number of stories which could not be written as
+                      iFiction
+        elapsed: the time the whole enrichment took, in seconds
+
+    """
+    def __init__(self):
+        self.analyzed = 0
+        self.analysis_errors = 0
+        self.analysis_time = 0.0
+        self.requests = 0
+        self.duplicates = 0
+        self.fetch_errors = 0
+        self.fetch_time = 0.0
+        self.write_errors = 0
+        self.elapsed = 0.0
+
+    def report(self):
+        """Describe the throughput of each stage.
+
+        Returns:
+            A list of lines of text
+
+        """
+        return ["analysis: {0} files in {1:.1f} s ({2:.1f} files/s), "
+                "{3} errors".format(self.analyzed, self.analysis_time,
+                                    _rate(self.analyzed, self.analysis_time),
+                                    self.analysis_errors),
+                "IFDB: {0} requests in {1:.1f} s ({2:.1f} requests/s), "
+                "{3} duplicate IFIDs, {4} errors".format(
+                    self.requests, self.fetch_time,
+                    _rate(self.requests, self.fetch_time), self.duplicates,
+                    self.fetch_errors),
+                "total: {0} files in {1:.1f} s ({2:.1f} files/s), "
+                "{3} not written".format(
+                    self.analyzed, self.elapsed,
+                    _rate(self.analyzed, self.elapsed), self.write_errors)]
+
+
+def _rate(count, seconds):
+    if seconds <= 0:
+        return 0.0
+    return count / seconds
+
+
+def enrich(paths_or_directory, client=None, workers=None, max_pending=None,
+           stats=None, max_fetched=MAX_FETCHED):
+    """Analyze many story files and merge IFDB's metadata into theirs.
+
+    IFDB is asked for each distinct IFID once, however many story files
+    share it, as long as its response is among the max_fetched most recent
+    ones; a story whose IFID was fetched longer ago is requested again.
+
+    Args:
+        paths_or_directory: the path of a directory or file, or an iterable
+                            of such paths
+        client: the IFDBClient to fetch the records with; its
+                max_connections sets the number of concurrent requests
+                (default: None, a shared client)
+        workers: the number of analysis worker processes (default: None,
+                 one per CPU; see treatyofbabel.scanner.scan)
+        max_pending: the maximum number of files queued for analysis
+                     (default: None, four per worker)
+        stats: an EnrichStats object to update (default: None)
+        max_fetched: the number of IFDB responses kept for later stories
+                     with the same IFID (default: MAX_FETCHED)
+    Returns:
+        An iterator over EnrichResult objects, in order of completion
+
+    """
+    if client is None:
+        client = ifdb._get_default_client()
+    if stats is None:
+        stats = EnrichStats()
+    start = time.time()
+    fetch_start = None
+    done = Queue.Queue()
+    # The stories waiting for each IFID requested and the responses to
+    # the requests already done
+    waiting = {}
+    fetched = OrderedDict()
+    pool = ThreadPool(client.max_connections)
+    try:
+        for result in scanner.scan(paths_or_directory, workers, max_pending):
+            stats.analyzed += 1
+            stats.analysis_time = time.time() - start
+            if result.error is not None:
+                stats.analysis_errors += 1
+                yield EnrichResult(result.path, error=result.error)
+                continue
+            story = IFStory()
+            story.load_from_scan_result(result)
+            if not story.ifid_list:
+                yield EnrichResult(result.path, story)
+                continue
+            ifid = story.ifid_list[0]
+            if ifid in fetched:
+                stats.duplicates += 1
+                yield _merge(story, *fetched[ifid])
+            elif ifid in waiting:
+                stats.duplicates += 1
+                waiting[ifid].append(story)
+            else:
+                if fetch_start is None:
+                    fetch_start = time.time()
+                stats.requests += 1
+                waiting[ifid] = [story]
+                pool.apply_async(_fetch, (client, ifid, done))
+            while True:
+                try:
+                    response = done.get_nowait()
+                except Queue.Empty:
+                    break
+                for merged in _complete(response, waiting, fetched,
+                                        max_fetched, stats, fetch_start):
+                    yield merged
+        while waiting:
+            for merged in _complete(done.get(), waiting, fetched,
+                                    max_fetched, stats, fetch_start):
+                yield merged
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        stats.elapsed = time.time() - start
+
+
+def _fetch(client, ifid, done):
+    # Runs on the thread pool; always reports back, so that enrich never
+    # waits for a response which will not come
+    try:
+        done.put((ifid, client.get_ifiction(ifid), None))
+    except IFDBError, err:
+        done.put((ifid, None, err.value))
+    except Exception, err:
+        done.put((ifid, None, str(err)))
+
+
+def _complete(response, waiting, fetched, max_fetched, stats,
+              fetch_start):
+    ifid, ificstring, error = response
+    stats.fetch_time = time.time() - fetch_start
+    if error is not None:
+        stats.fetch_errors += 1
+    if max_fetched > 0:
+        if len(fetched) >= max_fetched:
+            fetched.popitem(last=False)
+        fetched[ifid] = (ificstring, error)
+    for story in waiting.pop(ifid):
+        yield _merge(story, ificstring, error)
+
+
+def _merge(story, ificstring, error):
+    result = EnrichResult(story.story_file, story, error=error)
+    if ificstring is None:
+        return result
+    # The story file is a better judge of its format and cover art
+    story_format = story.format
+    cover = story.cover
+    cover_info = (cover.img_format, cover.width, cover.height)
+    try:
+        story.load_from_ifdb_record(ificstring)
+    except IFictionError, err:
+        result.error = err.value
+        return result
+    result.found = True
+    if story_format:
+        story.format = story_format
+    if cover_info[0] is not None:
+        cover.img_format, cover.width, cover.height = cover_info
+    return result
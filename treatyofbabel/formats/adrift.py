@@ -21,8 +21,7 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from binascii import hexlify
-import md5
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "adrift"
@@ -30,6 +29,11 @@ FORMAT_EXT = [".taf"]
 HOME_PAGE = "http://www.adrift.org.uk"
 HAS_COVER = False
 HAS_META = False
+# "Version", as scrambled by _AdriftDecoder
+SIGNATURES = [(0, '<B?\xc9j\x87\xc2')]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -77,7 +81,7 @@ def get_story_file_ifid(file_buffer):
     ifid = ''.join([ifid, decoder.decode(file_buffer[10])])
     ifid = ''.join([ifid, decoder.decode(file_buffer[11])])
     ifid = ''.join([ifid, '-'])
-    ifid = ''.join([ifid,  hexlify(md5.new(file_buffer).digest()).upper()])
+    ifid = ''.join([ifid,  get_md5(file_buffer)])
     return ifid
 
 
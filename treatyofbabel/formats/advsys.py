@@ -20,8 +20,7 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
-from binascii import hexlify
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "advsys"
@@ -29,6 +28,11 @@ FORMAT_EXT = [".dat"]
 HOME_PAGE = "http://www.ifarchive.org/if-archive/programming/advsys/"
 HAS_COVER = False
 HAS_META = False
+# "ADVSYS", obfuscated as described in claim_story_file
+SIGNATURES = [(2, '\xa0\x9d\x8b\x8e\x88\x8e')]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -57,7 +61,8 @@ def claim_story_file(file_buffer):
         # since the Python NOT (~) operator works only on signed
         # (long) int values, producing negative values in this case,
         # we instead perform an XOR with 0xff.
-        head = ''.join([chr((ord(a)+30) ^ 0xff) for a in file_buffer[2:8]])
+        head = ''.join([chr(((ord(a)+30) & 0xff) ^ 0xff)
+                        for a in file_buffer[2:8]])
         if head == "ADVSYS":
             return True
     return False
@@ -72,5 +77,5 @@ def get_story_file_cover(file_buffer):
 
 
 def get_story_file_ifid(file_buffer):
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     return "ADVSYS-{0}".format(file_hash)
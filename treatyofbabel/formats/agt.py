@@ -31,6 +31,10 @@ HOME_PAGE = "http://www.ifarchive.org/indexes/if-archiveXprogrammingXagt"
 HAS_COVER = False
 HAS_META = False
 AGX_MAGIC = (0x58, 0xC7, 0xC1, 0x51)
+SIGNATURES = [(0, ''.join([chr(x) for x in AGX_MAGIC]))]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = 36
 
 
 def get_format_name():
@@ -53,10 +57,17 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    header = struct.unpack_from('<BBBB', file_buffer, 0)
-    if (len(file_buffer) < 36 or header != AGX_MAGIC):
+    return _claim_header(file_buffer, len(file_buffer))
+
+
+def claim_story_header(reader):
+    return _claim_header(reader.header, reader.size)
+
+
+def _claim_header(header, file_size):
+    if file_size < HEADER_READ_LENGTH:
         return False
-    return True
+    return struct.unpack_from('<BBBB', header, 0) == AGX_MAGIC
 
 
 def get_story_file_meta(file_buffer, truncate=False):
@@ -71,6 +82,19 @@ def get_story_file_ifid(file_buffer):
     length = read_int(file_buffer, 32, '<')
     if len(file_buffer) < length + 6:
         return None
-    game_version = read_short(file_buffer, length, '<')
-    game_sig = read_int(file_buffer, length + 2, '<')
+    return _format_ifid(file_buffer[length:length + 6])
+
+
+def get_story_header_ifid(reader):
+    # The game version and signature are stored at an offset given in
+    # the header
+    length = read_int(reader.header, 32, '<')
+    if reader.size < length + 6:
+        return None
+    return _format_ifid(reader.read(length, 6))
+
+
+def _format_ifid(version_data):
+    game_version = read_short(version_data, 0, '<')
+    game_sig = read_int(version_data, 2, '<')
     return 'AGT-{0:05d}-{1:08X}'.format(game_version, game_sig)
@@ -20,10 +20,9 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
-from binascii import hexlify
 
-from treatyofbabel.utils._binaryfuncs import read_long
+from treatyofbabel.utils._binaryfuncs import read_long, starts_with
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "alan"
@@ -31,6 +30,10 @@ FORMAT_EXT = [".acd", ".a3c", ".a3r"]
 HOME_PAGE = "http://www.alanif.se/"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = [(0, 'ALAN')]
+CLAIM_COST = 4
+HEURISTIC_CLAIM = True
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -56,7 +59,7 @@ def claim_story_file(file_buffer):
     crc = 0
     if len(file_buffer) < 160:
         return False
-    if not file_buffer.startswith('ALAN'):
+    if not starts_with(file_buffer, 'ALAN'):
         # Identify Alan 2.x
         bf = read_long(file_buffer, 4)
         if bf > len(file_buffer)/4:
@@ -90,5 +93,5 @@ def get_story_file_cover(file_buffer):
 
 
 def get_story_file_ifid(file_buffer):
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     return "ALAN-{0}".format(file_hash)
@@ -20,9 +20,8 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
-from binascii import hexlify
 from treatyofbabel.utils._binaryfuncs import read_short
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "executable"
@@ -41,6 +40,10 @@ EXETYPES = [("MZ", "MZ", 2),
             ("#! ", "SCRIPT", 3),
             (MACHOMAGIC, "MACHO", 4),
             ("APPL", "MAC", 4)]
+SIGNATURES = [(0, magic) for magic, name, length in EXETYPES]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -80,7 +83,7 @@ def get_story_file_ifid(file_buffer):
     magic = _deduce_magic(file_buffer)
     if magic is None:
         return None
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     return '-'.join([magic, file_hash])
 
 
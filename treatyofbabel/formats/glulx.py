@@ -23,7 +23,7 @@
 
 import re
 
-from treatyofbabel.utils._binaryfuncs import read_int, read_short
+from treatyofbabel.utils._binaryfuncs import read_int, read_short, starts_with
 
 
 FORMAT = "glulx"
@@ -31,6 +31,10 @@ FORMAT_EXT = [".ulx"]
 HOME_PAGE = "http://eblong.com/zarf/glulx"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = [(0, 'Glul')]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = 4
 INFORM_OFFSET = 36
 MMAP_SIZE_OFFSET = 12
 SERIAL_OFFSET = 54
@@ -60,7 +64,13 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    return len(file_buffer) >= 256 and file_buffer.startswith('Glul')
+    return len(file_buffer) >= 256 and starts_with(file_buffer, 'Glul')
+
+
+def claim_story_header(reader):
+    # The IFID may be a UUID anywhere in the file, so only the claim can
+    # be made from the header
+    return reader.size >= 256 and starts_with(reader.header, 'Glul')
 
 
 def get_story_file_meta(file_buffer, truncate=False):
@@ -31,6 +31,10 @@ FORMAT_EXT = [".hex"]
 HOME_PAGE = "http://www.generalcoffee.com"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = []
+CLAIM_COST = 2
+HEURISTIC_CLAIM = True
+HEADER_READ_LENGTH = 40
 
 
 def get_format_name():
@@ -53,17 +57,29 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    if file_buffer is None or len(file_buffer) < 40:
+    if file_buffer is None:
         return False
-    if ord(file_buffer[0]) < 34:
+    return _claim_header(file_buffer, len(file_buffer))
+
+
+def claim_story_header(reader):
+    # The IFID may be a UUID anywhere in the file, so only the claim can
+    # be made from the header
+    return _claim_header(reader.header, reader.size)
+
+
+def _claim_header(header, file_size):
+    if file_size < HEADER_READ_LENGTH:
+        return False
+    if ord(header[0]) < 34:
         scale = 4
     else:
         scale = 16
     for i in range(3, 11):
-        if ord(file_buffer[i]) < 32 or ord(file_buffer[i]) > 126:
+        if ord(header[i]) < 32 or ord(header[i]) > 126:
             return False
     for i in range(11, 24, 2):
-        if _read_hugo_addx(file_buffer, i) * scale > len(file_buffer):
+        if _read_hugo_addx(header, i) * scale > file_size:
             return False
     return True
 
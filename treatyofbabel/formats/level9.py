@@ -20,8 +20,11 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
-from binascii import hexlify
+import re
+import struct
+
+from treatyofbabel.utils._binaryfuncs import find_bytes
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "level9"
@@ -29,6 +32,10 @@ FORMAT_EXT = [".l9", ".sna"]
 HOME_PAGE = "http://www.if-legends.org/~l9memorial/html/home.html"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = []
+CLAIM_COST = 10
+HEURISTIC_CLAIM = True
+HEADER_READ_LENGTH = None
 L9_REGISTRY = [
     (0x3a31, 0xe5, "LEVEL9-001-1"),
     (0x8333, 0xb7, "LEVEL9-001-1"),
@@ -331,6 +338,21 @@ L9_REGISTRY = [
     (0x788d, 0x72, "LEVEL9-020"),
     (0x7cd7, 0x0e, "LEVEL9-020"),
     (0x5ebb, 0xf1, "LEVEL9-020")]
+# Recognition has to consider every offset of a file, and most files
+# handed to it are not Level 9 stories at all.  These patterns match the
+# bytes that each scan requires at a fixed distance from the offset
+# (given alongside), letting the regular expression engine do the
+# scanning; the remaining conditions are only checked at the offsets
+# found.
+V2_PATTERN = (re.compile(r'\x20\x00[\s\S]{4}\x00\x80'), 4)
+V3_PATTERN = (re.compile(r'\x00(?<=[\x40-\xdb][\s\S]{11}\x00)'), 13)
+V3_PHASE3_PATTERN = (re.compile(r'[\x2a\x2c]\x00\x00\x00'), 18)
+# A story is only claimed if it is recognized as one of the games in
+# L9_REGISTRY, which requires a version 1 marker or a game of one of their
+# lengths, found by the version 2 or 3 scans.  Files without any of these
+# are rejected by a limited search instead of the full scans.
+REGISTRY_LENGTHS = frozenset([story[0] for story in L9_REGISTRY])
+MIN_REGISTRY_LENGTH = min(REGISTRY_LENGTHS)
 
 
 def get_format_name():
@@ -354,6 +376,8 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
+    if not _may_be_registered(file_buffer):
+        return False
     (version, ifid) = _get_l9_version(file_buffer)
     if version > 0:
         if ifid is not None:
@@ -375,25 +399,57 @@ def get_story_file_ifid(file_buffer):
         return None
     if ifid is not None:
         return ifid
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     return 'LEVEL9-{0}-{1}'.format(version, file_hash)
 
 
+def _may_be_registered(file_buffer):
+    if find_bytes(file_buffer, 'ATTAC\xcb') >= 0:
+        return True
+    # The scans only accept games which fit in the file after the offset
+    # they are found at, so only the first part of the file is searched
+    extent = len(file_buffer)
+    for i in _find_offsets(V2_PATTERN, file_buffer):
+        if i >= extent - MIN_REGISTRY_LENGTH or i + 30 > extent:
+            break
+        if _read_l9_int(file_buffer, i + 28) in REGISTRY_LENGTHS:
+            return True
+    for i in _find_offsets(V3_PATTERN, file_buffer):
+        if i >= extent - 2 - 0x4000:
+            break
+        if _read_l9_int(file_buffer, i) in REGISTRY_LENGTHS:
+            return True
+    return False
+
+
 def _read_l9_int(file_buffer, i):
     return ord(file_buffer[i+1]) * 2**8 + ord(file_buffer[i])
 
 
+def _find_offsets(pattern, file_buffer):
+    """Iterate over the offsets, in increasing order, at which one of the
+    above patterns matches (overlapping matches included).
+
+    """
+    regex, distance = pattern
+    match = regex.search(file_buffer, distance)
+    while match is not None:
+        yield match.start() - distance
+        match = regex.search(file_buffer, match.start() + 1)
+
+
 def _v2_recognition(file_buffer):
-    for i in range(len(file_buffer) - 20):
-        if (_read_l9_int(file_buffer, i + 4) == 0x0020 and
-                _read_l9_int(file_buffer, i + 10) == 0x8000 and
-                _read_l9_int(file_buffer, i + 20) == _read_l9_int(file_buffer,
-                                                                  i + 22)):
+    extent = len(file_buffer)
+    for i in _find_offsets(V2_PATTERN, file_buffer):
+        if i >= extent - 20:
+            break
+        if i + 30 > extent:
+            continue
+        if _read_l9_int(file_buffer, i + 20) == _read_l9_int(file_buffer,
+                                                             i + 22):
             length = _read_l9_int(file_buffer, i + 28)
-            if length and length + i <= len(file_buffer):
-                c = 0
-                for j in range(length + 1):
-                    c += ord(file_buffer[i + j])
+            if length and length + i < extent:
+                c = sum(bytearray(file_buffer[i:i + length + 1]))
                 return (2, length, c % 256)
     return (0, None, None)
 
@@ -401,17 +457,13 @@ def _v2_recognition(file_buffer):
 def _v1_recognition(file_buffer):
     a = 0xff
     b = 0xff
-    i = 0
-    while i < len(file_buffer) - 20:
-        if file_buffer[i:i + 5] == 'ATTAC' and ord(file_buffer[i + 5]) == 0xcb:
-            a = ord(file_buffer[i + 6])
-            break
-        i += 1
-    while i < len(file_buffer) - 20:
-        if file_buffer[i:i + 4] == 'BUNC' and ord(file_buffer[i + 4]) == 0xc8:
+    limit = len(file_buffer) - 20
+    i = find_bytes(file_buffer, 'ATTAC\xcb')
+    if 0 <= i < limit:
+        a = ord(file_buffer[i + 6])
+        i = find_bytes(file_buffer, 'BUNC\xc8', i)
+        if 0 <= i < limit:
             b = ord(file_buffer[i + 5])
-            break
-        i += 1
     if a is 0xff and b is 0xff:
         return (0, None)
     if a == 0x14 and b == 0xff:
@@ -426,64 +478,57 @@ def _v1_recognition(file_buffer):
 
 
 def _v3_recognition_phase(phase, file_buffer):
-    ll = 0
+    if phase != 3:
+        length, c = _v3_scan(phase, file_buffer)
+    else:
+        length, c = _v3_phase3_scan(file_buffer)
+    if length is None:
+        return (0, None, None)
+    if length < 0x8500:
+        return (3, length, c)
+    else:
+        return (4, length, c)
+
+
+def _v3_scan(phase, file_buffer):
     extent = len(file_buffer)
-    for i in range(extent - 20):
-        if ll:
+    for i in _find_offsets(V3_PATTERN, file_buffer):
+        if i >= extent - 20:
             break
         length = _read_l9_int(file_buffer, i)
         end = length + i
-        if phase != 3:
-            if (end < (extent - 2) and
-                ((phase == 2 or
-                  ((ord(file_buffer[end - 1]) == 0 and
-                    ord(file_buffer[end - 2]) == 0) or
-                   (ord(file_buffer[end + 1]) == 0 and
-                    ord(file_buffer[end + 2]) == 0))) and
-                 length > 0x4000 and length <= 0xdb00)):
-                if length != 0 and ord(file_buffer[i + 13]) == 0:
-                    for j in range(i, i + 16, 2):
-                        i0 = _read_l9_int(file_buffer, j)
-                        i2 = _read_l9_int(file_buffer, j + 2)
-                        i4 = _read_l9_int(file_buffer, j + 4)
-                        if i0 + i2 == i4 and i0 + i2:
-                            ll += 1
-        else:
-            i2 = _read_l9_int(file_buffer, i + 2)
-            i4 = _read_l9_int(file_buffer, i + 4)
-            i6 = _read_l9_int(file_buffer, i + 6)
-            i8 = _read_l9_int(file_buffer, i + 8)
-            i10 = _read_l9_int(file_buffer, i + 10)
-            if (extent > 0x0fd0 and end <= (extent - 2) and
-                ((i2 + i4) == i6 and i2 != 0 and i4 != 0) and
-                ((i6 + i8) == i10 and
-                 (ord(file_buffer[i + 18]) == 0x2a or
-                  ord(file_buffer[i + 18]) == 0x2c) and
-                 ord(file_buffer[i + 19]) == 0 and
-                 ord(file_buffer[i + 20]) == 0 and
-                 ord(file_buffer[i + 21]) == 0)):
-                ll = 2
-        if ll > 1:
-            c = 0
-            if phase == 3:
-                ll = 1
-            else:
-                c = ord(file_buffer[end])
-                checksum = 0
-                for j in range(i, end+1):
-                    checksum += ord(file_buffer[j])
-                if not checksum % 256:
-                    ll = 1
-                else:
-                    ll = 0
-        else:
-            ll = 0
-    if ll != 0:
-        if length < 0x8500:
-            return (3, length, c)
-        else:
-            return (4, length, c)
-    return (0, None, None)
+        if length <= 0x4000 or length > 0xdb00 or end >= extent - 2:
+            continue
+        if (phase != 2 and not
+                ((ord(file_buffer[end - 1]) == 0 and
+                  ord(file_buffer[end - 2]) == 0) or
+                 (ord(file_buffer[end + 1]) == 0 and
+                  ord(file_buffer[end + 2]) == 0))):
+            continue
+        words = struct.unpack_from('<10H', file_buffer, i)
+        sums = 0
+        for j in range(8):
+            i0, i2, i4 = words[j:j + 3]
+            if i0 + i2 == i4 and i0 + i2:
+                sums += 1
+        if sums > 1:
+            checksum = sum(bytearray(file_buffer[i:end + 1]))
+            if not checksum % 256:
+                return (length, ord(file_buffer[end]))
+    return (None, None)
+
+
+def _v3_phase3_scan(file_buffer):
+    extent = len(file_buffer)
+    if extent <= 0x0fd0:
+        return (None, None)
+    for i in _find_offsets(V3_PHASE3_PATTERN, file_buffer):
+        length = _read_l9_int(file_buffer, i)
+        i2, i4, i6, i8, i10 = struct.unpack_from('<5H', file_buffer, i + 2)
+        if (length + i <= extent - 2 and
+                i2 + i4 == i6 and i2 != 0 and i4 != 0 and i6 + i8 == i10):
+            return (length, 0)
+    return (None, None)
 
 
 def _get_l9_ifid(length, c):
@@ -508,6 +553,6 @@ def _get_l9_version(file_buffer):
     ret, length, c = _v3_recognition_phase(2,  file_buffer)
     if ret > 0:
         ifid = _get_l9_ifid(length, c)
-        return ret
+        return (ret, ifid)
     ret, length, c = _v3_recognition_phase(3, file_buffer)
     return (ret, None)
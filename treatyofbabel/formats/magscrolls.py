@@ -20,8 +20,9 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
-from binascii import hexlify
+
+from treatyofbabel.utils._binaryfuncs import starts_with
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "magscrolls"
@@ -29,6 +30,10 @@ FORMAT_EXT = [".mag"]
 HOME_PAGE = "http://www.if-legends.org/~msmemorial/memorial.htm"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = [(0, 'MaSc')]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = 42
 MANIFEST = [
     {'gv': 0,
      'header': ''.join(['\000\000\000\000\000\000\000\000\000\000',
@@ -124,7 +129,15 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    if len(file_buffer) < 42 or not file_buffer.startswith('MaSc'):
+    return _claim_header(file_buffer, len(file_buffer))
+
+
+def claim_story_header(reader):
+    return _claim_header(reader.header, reader.size)
+
+
+def _claim_header(header, file_size):
+    if file_size < HEADER_READ_LENGTH or not starts_with(header, 'MaSc'):
         return False
     return True
 
@@ -138,11 +151,28 @@ def get_story_file_cover(file_buffer):
 
 
 def get_story_file_ifid(file_buffer):
-    if len(file_buffer) < 42:
+    if len(file_buffer) < HEADER_READ_LENGTH:
         return None
+    ifid = _get_manifest_ifid(file_buffer)
+    if ifid is not None:
+        return ifid
+    file_hash = get_md5(file_buffer)
+    return "MAGNETIC-{0}".format(file_hash)
+
+
+def get_story_header_ifid(reader):
+    if reader.size < HEADER_READ_LENGTH:
+        return None
+    ifid = _get_manifest_ifid(reader.header)
+    if ifid is not None:
+        return ifid
+    return "MAGNETIC-{0}".format(reader.get_md5())
+
+
+def _get_manifest_ifid(header):
+    game_version = ord(header[13])
     for story in MANIFEST:
-        if ((file_buffer[13] < 3 and story['gv'] == file_buffer[13]) or
-                (story['header'] == file_buffer[12:32])):
+        if ((game_version < 3 and story['gv'] == game_version) or
+                (story['header'] == header[12:32])):
             return story['ifid']
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
-    return "MAGNETIC-{0}".format(file_hash)
+    return None
@@ -20,14 +20,13 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import md5
 import xml.dom.minidom
 import zipfile
 from cStringIO import StringIO
-from binascii import hexlify
 
 from treatyofbabel import ifiction
 from treatyofbabel.babelerrors import BabelError
+from treatyofbabel.utils._hashfuncs import get_md5
 
 
 FORMAT = "quest"
@@ -35,6 +34,15 @@ FORMAT_EXT = [".quest"]
 HOME_PAGE = "http://www.textadventures.co.uk"
 HAS_COVER = False
 HAS_META = True
+SIGNATURES = [(0, 'PK\003\004')]
+CLAIM_COST = 3
+# A zip archive need not start with a local file header (there may be data
+# before it), so games without the signature are probed as well
+HEURISTIC_CLAIM = True
+# The end of central directory record of a zip archive is within this many
+# bytes of the end of the file
+ZIP_END_SEARCH = 22 + 65535
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -57,6 +65,8 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
+    if 'PK\005\006' not in file_buffer[-ZIP_END_SEARCH:]:
+        return False
     try:
         _extract_aslx(file_buffer)
     except:
@@ -72,23 +82,18 @@ def get_story_file_meta(file_buffer, truncate=False):
         raise BabelError("No game information found")
     aslx_game = aslx_games[0]
     gameinfo = ifiction.build_dict_from_node(aslx_game)
-    ifiction_dom = ifiction.create_ifiction_dom()
-    ifiction.add_comment(ifiction_dom,
-                         "Bibliographic data translated from Quest ASLX")
-    story_node = ifiction.add_story(ifiction_dom)
-    title = aslx_game.getAttribute("name")
-    ifid = gameinfo.get("gameid")
-    ifiction.add_identification(ifiction_dom, story_node, [ifid], FORMAT)
-    ifiction.add_bibliographic(
-        ifiction_dom,
-        story_node,
-        truncate,
-        title=title,
+    record = ifiction.StoryRecord()
+    record.identification["ifid_list"] = [gameinfo.get("gameid")]
+    record.identification["ifformat"] = FORMAT
+    record.bibliographic.update(
+        title=aslx_game.getAttribute("name"),
         author=gameinfo.get("author"),
         description=gameinfo.get("description"),
         genre=gameinfo.get("category")
         )
-    return ifiction_dom.toprettyxml(indent="  ", encoding="UTF-8")
+    return ifiction.format_ifiction(
+        [record], indent="  ", truncate=truncate,
+        comment="Bibliographic data translated from Quest ASLX")
 
 
 def get_story_file_cover(file_buffer):
@@ -105,13 +110,13 @@ def get_story_file_ifid(file_buffer):
     gameinfo = ifiction.build_dict_from_node(aslx_game)
     ifid = gameinfo.get("gameid")
     if ifid is None:
-        file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+        file_hash = get_md5(file_buffer)
         ifid = "QUEST-{0}".format(file_hash)
     return ifid
 
 
 def _extract_aslx(file_buffer):
-    filelike = StringIO(str(file_buffer))
+    filelike = StringIO(file_buffer[:])
     filezip = zipfile.ZipFile(filelike)
     aslx_handle = filezip.open("game.aslx")
     aslx = aslx_handle.read()
@@ -22,11 +22,11 @@
 
 
 import re
-import md5
 import os.path
-from binascii import hexlify
 
-from treatyofbabel.utils._binaryfuncs import read_int, read_short, read_byte
+from treatyofbabel.utils._binaryfuncs import BinaryReader
+from treatyofbabel.utils._binaryfuncs import get_view, starts_with
+from treatyofbabel.utils._hashfuncs import get_md5
 from treatyofbabel.utils._imgfuncs import CoverImage, get_jpeg_dim, get_png_dim
 from treatyofbabel import ifiction
 from treatyofbabel.babelerrors import BabelError
@@ -40,6 +40,10 @@ HAS_META = True
 T2_SIGNATURE = 'TADS2 bin\012\015\032'
 HTML_RES_ID = 'HTMLRES'
 EOF_RES_ID = '$EOF'
+SIGNATURES = [(0, T2_SIGNATURE)]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -62,7 +66,7 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    return file_buffer.startswith(T2_SIGNATURE)
+    return starts_with(file_buffer, T2_SIGNATURE)
 
 
 def get_story_file_meta(file_buffer, truncate=False):
@@ -81,18 +85,13 @@ def get_story_file_meta(file_buffer, truncate=False):
         authors, emails = _parse_authors(byline.strip("by "))
         if emails == "":
             emails = None
-    ifiction_dom = ifiction.create_ifiction_dom()
-    ifiction.add_comment(ifiction_dom,
-                         "Bibliographic data translated from TADS GameInfo")
-    story_node = ifiction.add_story(ifiction_dom)
+    record = ifiction.StoryRecord()
     ifid = gameinfo.get("ifid")
     if ifid is None:
-        ifid = get_story_file_ifid(file_buffer)
-    ifiction.add_identification(ifiction_dom, story_node, [ifid], FORMAT)
-    ifiction.add_bibliographic(
-        ifiction_dom,
-        story_node,
-        truncate,
+        ifid = _calc_ifid(file_buffer)
+    record.identification["ifid_list"] = [ifid]
+    record.identification["ifformat"] = FORMAT
+    record.bibliographic.update(
         title=gameinfo.get("name"),
         author=authors,
         headline=gameinfo.get("headline"),
@@ -104,29 +103,26 @@ def get_story_file_meta(file_buffer, truncate=False):
         language=gameinfo.get("language"),
         firstpublished=gameinfo.get("firstpublished")
         )
-    url = gameinfo.get("url")
-    if emails is not None or url is not None:
-        ifiction.add_contact(ifiction_dom, story_node,
-                              url=gameinfo.get("url"), email=emails)
+    record.contact.update(url=gameinfo.get("url"), email=emails)
     cover = get_story_file_cover(file_buffer)
     if cover is not None:
-        ifiction.add_cover(ifiction_dom, story_node, cover.img_format,
-                           cover.width, cover.height, cover.description)
-    ifiction.add_format_info(
-        ifiction_dom,
-        story_node,
-        "tads",
+        record.cover.update(format=cover.img_format, height=cover.height,
+                            width=cover.width, description=cover.description)
+    record.format_info = dict(
         version=gameinfo.get("version"),
         releasedate=gameinfo.get("releasedate"),
         presentationprofile=gameinfo.get("presentationprofile"),
         byline=gameinfo.get("byline")
         )
-    return ifiction_dom.toprettyxml(indent="  ", encoding="UTF-8")
+    return ifiction.format_ifiction(
+        [record], indent="  ", truncate=truncate,
+        comment="Bibliographic data translated from TADS GameInfo")
 
 
 def get_story_file_cover(file_buffer):
+    directory = _get_resource_directory(file_buffer)
     for resc_name in ['CoverArt.jpg', 'CoverArt.png']:
-        cover_resc = _find_resource(file_buffer, resc_name)
+        cover_resc = _find_resource(file_buffer, resc_name, directory)
         if cover_resc:
             ext = os.path.splitext(resc_name)[1].strip('.')
             if ext == 'jpg':
@@ -152,8 +148,23 @@ def get_story_file_ifid(file_buffer):
     return ifid
 
 
+def iter_resources(file_buffer):
+    """Iterate over the multimedia resources embedded in a game file, in
+    the order they are stored, scanning the file once.
+
+    Args:
+        file_buffer: the data of a game file
+    Returns:
+        An iterator over (name, size, data) tuples, where data is a buffer
+        object referring to the resource's data in file_buffer
+
+    """
+    for rsc_name, rsc_offset, rsc_size in _iter_resource_index(file_buffer):
+        yield (rsc_name, rsc_size, get_view(file_buffer, rsc_offset, rsc_size))
+
+
 def _calc_ifid(file_buffer):
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     ifid = "TADS2-{0}".format(file_hash)
     return ifid
 
@@ -163,7 +174,7 @@ def _get_gameinfo(file_buffer):
     if rsc is not None:
         #rsc = rsc.decode('utf-8')
         gameinfo = {}
-        for line in rsc.split('\n'):
+        for line in rsc[:].split('\n'):
             line = line.strip()
             if not line.startswith('#'):
                 parts = line.split(':', 1)
@@ -182,42 +193,55 @@ def _cleanup_info(value):
     return cleaned
 
 
-def _find_resource(file_buffer, name):
-    name = name.lower()
+def _find_resource(file_buffer, name, directory=None):
+    if directory is None:
+        directory = _get_resource_directory(file_buffer)
+    resource = directory.get(name.lower())
+    if resource is None:
+        return None
+    rsc_offset, rsc_size = resource
+    return get_view(file_buffer, rsc_offset, rsc_size)
+
 
+def _get_resource_directory(file_buffer):
+    """Get the resources of a game file as a dictionary mapping their
+    lower-case names to their offsets and sizes, scanning the file once.
+    If several resources have the same name, the first one is used.
+
+    """
+    directory = {}
+    for rsc_name, rsc_offset, rsc_size in _iter_resource_index(file_buffer):
+        directory.setdefault(rsc_name.lower(), (rsc_offset, rsc_size))
+    return directory
+
+
+def _iter_resource_index(file_buffer):
     # Skip past TADS2 header (13 bytes signature, 7 bytes version, 2 bytes
     # flags, 26 bytes timestamp
-    p = 13 + 7 + 2 + 26
-    while p < len(file_buffer):
-        type_length = read_byte(file_buffer, p, '<')
-        next_section = read_int(file_buffer, p + 1 + type_length, '<')
-        type = file_buffer[p + 1:p + 1 + type_length]
+    reader = BinaryReader(file_buffer, 13 + 7 + 2 + 26, '<')
+    while reader.remaining() > 0:
+        section_start = reader.offset
+        type = reader.read_bytes(reader.read_byte())
+        next_section = reader.read_int()
         if type == HTML_RES_ID:
-            # Skip past the section block header
-            p = p + 12
-            number_entries = read_int(file_buffer, p, '<')
+            number_entries = reader.read_int()
             # Skip the first index entry
-            p = p + 8
-            # Scan index entries
-            found_offset = None
-            found_length = None
+            reader.skip(4)
+            # Scan index entries; the offsets are relative to the end of
+            # the index
+            entries = []
             for x in range(0, number_entries):
-                rsc_offset = read_int(file_buffer, p, '<')
-                rsc_size = read_int(file_buffer, p + 4, '<')
-                name_len = read_short(file_buffer, p + 8, '<')
-                p = p + 10
-                rsc_name = file_buffer[p:p + name_len]
-                if name_len == len(name) and rsc_name.lower() == name:
-                    found_offset = rsc_offset
-                    found_length = rsc_size
-                p = p + name_len
-            if found_offset is not None:
-                return file_buffer[p + found_offset:p + found_offset +
-                                   found_length]
+                rsc_offset, rsc_size, name_len = reader.unpack("IIH")
+                entries.append((reader.read_bytes(name_len), rsc_offset,
+                                rsc_size))
+            data_start = reader.offset
+            for rsc_name, rsc_offset, rsc_size in entries:
+                yield (rsc_name, data_start + rsc_offset, rsc_size)
         elif type == EOF_RES_ID:
-            return None
-        p = next_section
-    return None
+            return
+        if next_section <= section_start:
+            return
+        reader.seek(next_section)
 
 
 def _parse_authors(author_str):
@@ -22,11 +22,12 @@
 
 
 import re
-import md5
 import os.path
-from binascii import hexlify
+import string
 
-from treatyofbabel.utils._binaryfuncs import read_int, read_short, read_byte
+from treatyofbabel.utils._binaryfuncs import BinaryReader
+from treatyofbabel.utils._binaryfuncs import get_view, starts_with
+from treatyofbabel.utils._hashfuncs import get_md5
 from treatyofbabel.utils._imgfuncs import CoverImage, get_jpeg_dim, get_png_dim
 from treatyofbabel import ifiction
 from treatyofbabel.babelerrors import BabelError
@@ -40,6 +41,13 @@ HAS_META = True
 T3_SIGNATURE = 'T3-image\015\012\032'
 HTML_RES_ID = 'HTMLRES'
 EOF_RES_ID = '$EOF'
+# Resource names are stored with each byte XORed with 0xFF
+NAME_TABLE = string.maketrans(''.join(chr(i) for i in range(256)),
+                              ''.join(chr(i ^ 0xFF) for i in range(256)))
+SIGNATURES = [(0, T3_SIGNATURE)]
+CLAIM_COST = 1
+HEURISTIC_CLAIM = False
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -62,7 +70,7 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    return file_buffer.startswith(T3_SIGNATURE)
+    return starts_with(file_buffer, T3_SIGNATURE)
 
 
 def get_story_file_meta(file_buffer, truncate=False):
@@ -81,18 +89,13 @@ def get_story_file_meta(file_buffer, truncate=False):
         authors, emails = _parse_authors(byline.strip("by "))
         if emails == "":
             emails = None
-    ifiction_dom = ifiction.create_ifiction_dom()
-    ifiction.add_comment(ifiction_dom, 
-                         "Bibliographic data translated from TADS GameInfo")
-    story_node = ifiction.add_story(ifiction_dom)
+    record = ifiction.StoryRecord()
     ifid = gameinfo.get("ifid")
     if ifid is None:
-        ifid = get_story_file_ifid(file_buffer)
-    ifiction.add_identification(ifiction_dom, story_node, [ifid], FORMAT)
-    ifiction.add_bibliographic(
-        ifiction_dom,
-        story_node,
-        truncate,
+        ifid = _calc_ifid(file_buffer)
+    record.identification["ifid_list"] = [ifid]
+    record.identification["ifformat"] = FORMAT
+    record.bibliographic.update(
         title=gameinfo.get("name"),
         author=authors,
         headline=gameinfo.get("headline"),
@@ -104,29 +107,26 @@ def get_story_file_meta(file_buffer, truncate=False):
         language=gameinfo.get("language"),
         firstpublished=gameinfo.get("firstpublished")
         )
-    url = gameinfo.get("url")
-    if emails is not None or url is not None:
-        ifiction.add_contact(ifiction_dom, story_node,
-                              url=gameinfo.get("url"), email=emails)
+    record.contact.update(url=gameinfo.get("url"), email=emails)
     cover = get_story_file_cover(file_buffer)
     if cover is not None:
-        ifiction.add_cover(ifiction_dom, story_node, cover.img_format,
-                           cover.width, cover.height, cover.description)
-    ifiction.add_format_info(
-        ifiction_dom,
-        story_node,
-        "tads",
+        record.cover.update(format=cover.img_format, height=cover.height,
+                            width=cover.width, description=cover.description)
+    record.format_info = dict(
         version=gameinfo.get("version"),
         releasedate=gameinfo.get("releasedate"),
         presentationprofile=gameinfo.get("presentationprofile"),
         byline=gameinfo.get("byline")
         )
-    return ifiction_dom.toprettyxml(indent="  ", encoding="UTF-8")
+    return ifiction.format_ifiction(
+        [record], indent="  ", truncate=truncate,
+        comment="Bibliographic data translated from TADS GameInfo")
 
 
 def get_story_file_cover(file_buffer):
+    directory = _get_resource_directory(file_buffer)
     for resc_name in ['CoverArt.jpg', 'CoverArt.png']:
-        cover_resc = _find_resource(file_buffer, resc_name)
+        cover_resc = _find_resource(file_buffer, resc_name, directory)
         if cover_resc:
             ext = os.path.splitext(resc_name)[1].strip('.')
             if ext == 'jpg':
@@ -152,46 +152,69 @@ def get_story_file_ifid(file_buffer):
     return ifid
 
 
+def iter_resources(file_buffer):
+    """Iterate over the multimedia resources embedded in a game file, in
+    the order they are stored, scanning the file once.
+
+    Args:
+        file_buffer: the data of a game file
+    Returns:
+        An iterator over (name, size, data) tuples, where data is a buffer
+        object referring to the resource's data in file_buffer
+
+    """
+    for rsc_name, rsc_offset, rsc_size in _iter_resource_index(file_buffer):
+        yield (rsc_name, rsc_size, get_view(file_buffer, rsc_offset, rsc_size))
+
+
 def _calc_ifid(file_buffer):
-    file_hash = hexlify(md5.new(file_buffer).digest()).upper()
+    file_hash = get_md5(file_buffer)
     ifid = "TADS3-{0}".format(file_hash)
     return ifid
 
 
-def _find_resource(file_buffer, name):
-    name = name.lower()
-    rsc_name_len = len(name)
+def _find_resource(file_buffer, name, directory=None):
+    if directory is None:
+        directory = _get_resource_directory(file_buffer)
+    resource = directory.get(name.lower())
+    if resource is None:
+        return None
+    rsc_offset, rsc_size = resource
+    return get_view(file_buffer, rsc_offset, rsc_size)
+
 
+def _get_resource_directory(file_buffer):
+    """Get the resources of a game file as a dictionary mapping their
+    lower-case names to their offsets and sizes, scanning the file once.
+    If several resources have the same name, the first one is used.
+
+    """
+    directory = {}
+    for rsc_name, rsc_offset, rsc_size in _iter_resource_index(file_buffer):
+        directory.setdefault(rsc_name.lower(), (rsc_offset, rsc_size))
+    return directory
+
+
+def _iter_resource_index(file_buffer):
     # Skip past TADS3 header (11 bytes signature, 2 bytes version, 32 bytes
     # reserved, 24 bytes timestamp
-    p = 11 + 2 + 32 + 24
-    while p < len(file_buffer):
-        rsc_type = file_buffer[p:p + 4]
-        block_size = read_int(file_buffer, p + 4, '<')
+    reader = BinaryReader(file_buffer, 11 + 2 + 32 + 24, '<')
+    while reader.remaining() >= 10:
+        # Block header: type, size and flags
+        rsc_type, block_size, flags = reader.unpack("4sIH")
         if rsc_type == 'MRES':
-            # Skip past the section block header
-            p = p + 10
-            block_start = p
-            number_entries = read_short(file_buffer, p, '<')
-            p = p + 2
+            block_start = reader.offset
+            number_entries = reader.read_short()
             # Scan index entries
             for x in range(number_entries):
-                rsc_offset = read_int(file_buffer, p, '<')
-                rsc_size = read_int(file_buffer, p + 4, '<')
-                name_len = read_byte(file_buffer, p + 8, '<')
-                rsc_name = ''
-                for xored_char in file_buffer[p + 9:p + 9 + rsc_name_len]:
-                    rsc_name = rsc_name + chr(ord(xored_char) ^ 0xFF)
-                if name_len == rsc_name_len and rsc_name.lower() == name:
-                    return file_buffer[block_start + rsc_offset:
-                                       block_start + rsc_offset + rsc_size]
-                p = p + 9 + name_len
-            p = block_start + block_size
-        elif rsc_type == 'EOF':
-            return None
+                rsc_offset, rsc_size, name_len = reader.unpack("IIB")
+                rsc_name = reader.read_bytes(name_len).translate(NAME_TABLE)
+                yield (rsc_name, block_start + rsc_offset, rsc_size)
+            reader.seek(block_start + block_size)
+        elif rsc_type == 'EOF ':
+            return
         else:
-            p = p + 10 + block_size
-    return None
+            reader.skip(block_size)
 
 
 def _get_gameinfo(file_buffer):
@@ -199,7 +222,7 @@ def _get_gameinfo(file_buffer):
     if rsc is not None:
         #rsc = rsc.decode('utf-8')
         gameinfo = {}
-        for line in rsc.split('\n'):
+        for line in rsc[:].split('\n'):
             line = line.strip()
             if not line.startswith('#'):
                 parts = line.split(':', 1)
@@ -20,14 +20,19 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
-import md5
-from binascii import hexlify
+
+from treatyofbabel.utils._binaryfuncs import find_bytes
+from treatyofbabel.utils._hashfuncs import get_md5
 
 FORMAT = "twine"
 FORMAT_EXT = [".html", ".htm"]
 HOME_PAGE = "http://www.twinery.org"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = []
+CLAIM_COST = 3
+HEURISTIC_CLAIM = True
+HEADER_READ_LENGTH = None
 
 
 def get_format_name():
@@ -50,7 +55,7 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    return "tw-story" in file_buffer
+    return find_bytes(file_buffer, "tw-story") >= 0
 
 
 def get_story_file_meta(file_buffer, truncate=False):
@@ -64,5 +69,5 @@ def get_story_file_cover(file_buffer):
 def get_story_file_ifid(file_buffer):
     m = re.search(r'ifid="([A-Za-z0-9-]+)"', file_buffer)
     if m is None:
-        return hexlify(md5.new(file_buffer).digest()).upper()
+        return get_md5(file_buffer)
     return m.group(1)
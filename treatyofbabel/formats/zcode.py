@@ -23,13 +23,19 @@
 
 from binascii import hexlify
 
+from treatyofbabel.utils._binaryfuncs import find_bytes
+
 
 FORMAT = "zcode"
 FORMAT_EXT = [".z{0}".format(v) for v in range(3, 9)]
 HOME_PAGE = "http://www.inform-fiction.org"
 HAS_COVER = False
 HAS_META = False
+SIGNATURES = []
+CLAIM_COST = 2
+HEURISTIC_CLAIM = True
 HEADER_LENGTH = 0x3C
+HEADER_READ_LENGTH = HEADER_LENGTH
 STORY_START = 0x40
 RELEASE_NUMBER_OFFSET = 0x02
 SERIAL_OFFSET = 0x12
@@ -45,7 +51,7 @@ def get_format_name():
 
 def get_story_file_extension(file_buffer):
     if claim_story_file(file_buffer):
-        version = file_buffer[0]
+        version = ord(file_buffer[0])
         return ".z{0}".format(version)
     else:
         return None
@@ -60,14 +66,22 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    if (len(file_buffer) < HEADER_LENGTH or
-            ord(file_buffer[0]) < 1 or
-            ord(file_buffer[0]) > 8):
+    return _claim_header(file_buffer, len(file_buffer))
+
+
+def claim_story_header(reader):
+    return _claim_header(reader.header, reader.size)
+
+
+def _claim_header(header, file_size):
+    if (file_size < HEADER_LENGTH or
+            ord(header[0]) < 1 or
+            ord(header[0]) > 8):
         return False
     else:
         for i in range(4, 15, 2):
-            j = _read_zint(file_buffer, i)
-            if j > len(file_buffer) or j < STORY_START:
+            j = _read_zint(header, i)
+            if j > file_size or j < STORY_START:
                 return False
         return True
 
@@ -83,21 +97,38 @@ def get_story_file_cover(file_buffer):
 def get_story_file_ifid(file_buffer):
     if len(file_buffer) < 0x1D:
         return None
-    serial_number = file_buffer[SERIAL_OFFSET:SERIAL_OFFSET + SERIAL_LENGTH]
-    release_number = _read_zint(file_buffer, RELEASE_NUMBER_OFFSET)
-    checksum = file_buffer[CHECKSUM_OFFSET:CHECKSUM_OFFSET + CHECKSUM_LENGTH]
-    checksum = hexlify(checksum).upper()
-    v0 = serial_number[0]
-    v1 = serial_number[1]
-    is_vintage = (v0 == '8' or v0 == '9' or (v0 == '0' and v1 >= '0'
-                                             and v1 <= '5'))
-    if not is_vintage:
-        uuid_start = file_buffer.find(UUID_HEADER)
+    if not _is_vintage(file_buffer):
+        uuid_start = find_bytes(file_buffer, UUID_HEADER)
         if (uuid_start >= 0 and
                 len(file_buffer) > uuid_start + len(UUID_HEADER)):
-            uuid_end = file_buffer.find('/', uuid_start + len(UUID_HEADER))
+            uuid_end = find_bytes(file_buffer, '/',
+                                 uuid_start + len(UUID_HEADER))
             if uuid_end >= 0:
                 return file_buffer[uuid_start + len(UUID_HEADER):uuid_end]
+    return _get_header_ifid(file_buffer)
+
+
+def get_story_header_ifid(reader):
+    # Only vintage stories are known not to carry a UUID elsewhere in
+    # the file
+    header = reader.header
+    if len(header) < 0x1D or not _is_vintage(header):
+        return None
+    return _get_header_ifid(header)
+
+
+def _is_vintage(header):
+    v0 = header[SERIAL_OFFSET]
+    v1 = header[SERIAL_OFFSET + 1]
+    return (v0 == '8' or v0 == '9' or (v0 == '0' and v1 >= '0'
+                                       and v1 <= '5'))
+
+
+def _get_header_ifid(header):
+    serial_number = header[SERIAL_OFFSET:SERIAL_OFFSET + SERIAL_LENGTH]
+    release_number = _read_zint(header, RELEASE_NUMBER_OFFSET)
+    checksum = header[CHECKSUM_OFFSET:CHECKSUM_OFFSET + CHECKSUM_LENGTH]
+    checksum = hexlify(checksum).upper()
     ifid = ''.join(['ZCODE-', str(release_number), '-', serial_number])
     if serial_number[0] != '8' and serial_number != '000000':
         ifid = ''.join([ifid, '-', checksum])
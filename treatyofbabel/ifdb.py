@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+#
+#       ifdb.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""This module provides the IFDBClient class, which fetches iFiction
+records and cover art from IFDB (the Interactive Fiction Database) over
+pooled, persistent HTTP connections, many stories at a time, and the
+IFDBCache class, an on-disk cache of its responses.
+
+"""
+
+
+import httplib
+import socket
+import sqlite3
+import threading
+import time
+import urllib
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+from babelerrors import BabelError, IFDBError
+
+
+IFDB_URL = "http://ifdb.tads.org/"
+USER_AGENT = "pyifbabel"
+# Cached responses expire after a week
+CACHE_TTL = 7 * 24 * 60 * 60
+# Responses which may succeed if the request is repeated later
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+REDIRECT_STATUSES = frozenset([301, 302, 303, 307, 308])
+MAX_REDIRECTS = 5
+
+
+class IFDBCache(object):
+    """A persistent cache of IFDB responses, stored in an SQLite database.
+
+    Entries expire a given time after they were fetched.  Expired entries
+    are evicted when the cache is opened and are never returned.  A cache
+    may be shared by the threads of an IFDBClient.
+
+    """
+    def __init__(self, cache_file, ttl=CACHE_TTL):
+        """Initialize the object.
+
+        Args:
+            cache_file: the path of the database file, which is created if
+                        it does not exist
+            ttl: the time in seconds after which entries expire (default:
+                 CACHE_TTL)
+
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_file, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                data BLOB,
+                fetched REAL);
+            CREATE INDEX IF NOT EXISTS responses_fetched
+                ON responses (fetched);
+            """)
+        self.evict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, url):
+        """Get the cached response for a URL.
+
+        Args:
+            url: the URL requested
+        Returns:
+            The body of the response or None if it is not cached or has
+            expired
+
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, fetched FROM responses WHERE url = ?",
+                (url,)).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        return str(row[0])
+
+    def put(self, url, data):
+        """Cache the response for a URL.
+
+        Args:
+            url: the URL requested
+            data: the body of the response
+
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (url, sqlite3.Binary(data), time.time()))
+            self._db.commit()
+
+    def evict(self):
+        """Remove the expired entries from the cache."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE fetched < ?",
+                             (time.time() - self.ttl,))
+            self._db.commit()
+
+
+class IFDBClient(object):
+    """A client for IFDB's public API.
+
+    Connections are kept open between requests and reused, up to
+    max_connections requests are in flight at once, and requests which
+    fail because of network errors or server trouble are retried with
+    exponential backoff.  The client is safe to use from several threads.
+
+    """
+    def __init__(self, base_url=IFDB_URL, max_connections=4, timeout=30,
+                 retries=3, backoff=1.0, cache=None):
+        """Initialize the object.
+
+        Args:
+            base_url: the URL of the IFDB server (default: IFDB_URL)
+            max_connections: the maximum number of requests in flight at
+                             once (default: 4)
+            timeout: the timeout of each request in seconds (default: 30)
+            retries: the number of times a failed request is retried
+                     (default: 3)
+            backoff: the delay before the first retry in seconds, which is
+                     doubled for every further retry (default: 1.0)
+            cache: an IFDBCache for the responses (default: None)
+
+        """
+        if not base_url.endswith("/"):
+            base_url += "/"
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the idle connections."""
+        with self._pools_lock:
+            for pool in self._pools.values():
+                for connection in pool:
+                    connection.close()
+            self._pools.clear()
+
+    def get_ifiction_url(self, ifid=None, tuid=None):
+        """Get the URL of the iFiction record of a story.
+
+        Args:
+            ifid: the IFID of the story (default: None)
+            tuid: the IFDB TUID of the story, used instead of the IFID if
+                  given (default: None)
+        Returns:
+            The URL
+        Raises:
+            BabelError: if neither an IFID nor a TUID is given
+
+        """
+        if tuid is not None:
+            query = "id=" + urllib.quote(tuid, safe="")
+        elif ifid is not None:
+            query = "ifid=" + urllib.quote(ifid, safe="")
+        else:
+            raise BabelError("No IFID or TUID set")
+        return self.base_url + "viewgame?ifiction&" + query
+
+    def get_ifiction(self, ifid=None, tuid=None):
+        """Fetch the iFiction record of a story.
+
+        Args:
+            ifid: the IFID of the story (default: None)
+            tuid: the IFDB TUID of the story, used instead of the IFID if
+                  given (default: None)
+        Returns:
+            The iFiction document or None if IFDB does not know the story
+        Raises:
+            BabelError: if neither an IFID nor a TUID is given
+            IFDBError: if the request fails
+
+        """
+        return self.fetch(self.get_ifiction_url(ifid, tuid))
+
+    def lookup(self, ifids=None, tuids=None):
+        """Fetch the iFiction records of many stories concurrently.
+
+        Args:
+            ifids: a list of IFIDs (default: None)
+            tuids: a list of IFDB TUIDs (default: None)
+        Returns:
+            An iterator over (IFID or TUID, iFiction document, error)
+            tuples, in order of completion; the document is None if IFDB
+            does not know the story or the request failed, in which case
+            error describes the failure
+
+        """
+        keys = ([(ifid, None) for ifid in ifids or []] +
+                [(None, tuid) for tuid in tuids or []])
+        if not keys:
+            return
+        pool = ThreadPool(min(self.max_connections, len(keys)))
+        try:
+            for result in pool.imap_unordered(self._lookup_one, keys):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _lookup_one(self, key):
+        ifid, tuid = key
+        try:
+            return (tuid or ifid, self.get_ifiction(ifid, tuid), None)
+        except IFDBError, err:
+            return (tuid or ifid, None, err.value)
+
+    def fetch(self, url):
+        """Fetch a URL, from the cache if possible.
+
+        Args:
+            url: an http or https URL
+        Returns:
+            The body of the response or None if the server responded with
+            404 Not Found
+        Raises:
+            IFDBError: if the request fails
+
+        """
+        if self.cache is not None:
+            data = self.cache.get(url)
+            if data is not None:
+                return data
+        data = self._fetch(url)
+        if data is not None and self.cache is not None:
+            self.cache.put(url, data)
+        return data
+
+    def _fetch(self, url):
+        attempt = 0
+        redirects = 0
+        while True:
+            try:
+                status, location, data = self._request(url)
+            except (httplib.HTTPException, socket.error), err:
+                status, location, data = None, None, str(err)
+            if status == 200:
+                return data
+            elif status == 404:
+                return None
+            elif status in REDIRECT_STATUSES and location:
+                redirects += 1
+                if redirects > MAX_REDIRECTS:
+                    raise IFDBError("Too many redirects")
+                url = urlparse.urljoin(url, location)
+                continue
+            elif status is not None and status not in RETRY_STATUSES:
+                raise IFDBError("HTTP error {0}".format(status))
+            if attempt >= self.retries:
+                if status is not None:
+                    raise IFDBError("HTTP error {0}".format(status))
+                raise IFDBError(data)
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def _request(self, url):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise IFDBError("Unsupported URL")
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        with self._slots:
+            while True:
+                connection, reused = self._get_connection(key)
+                try:
+                    connection.request("GET", path,
+                                       headers={"User-Agent": USER_AGENT})
+                    response = connection.getresponse()
+                    data = response.read()
+                except (httplib.HTTPException, socket.error):
+                    connection.close()
+                    # The server may have closed an idle connection
+                    if reused:
+                        continue
+                    raise
+                break
+        if response.will_close:
+            connection.close()
+        else:
+            self._release_connection(key, connection)
+        return (response.status, response.getheader("location"), data)
+
+    def _get_connection(self, key):
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool:
+                return (pool.pop(), True)
+        scheme, netloc = key
+        if scheme == "https":
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        return (connection_class(netloc, timeout=self.timeout), False)
+
+    def _release_connection(self, key, connection):
+        with self._pools_lock:
+            self._pools.setdefault(key, []).append(connection)
+
+
+# The client used by IFStory when none is given, so that its connections
+# are reused from one story to the next
+_default_client = None
+
+
+def _get_default_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = IFDBClient()
+    return _default_client
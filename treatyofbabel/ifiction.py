@@ -30,6 +30,8 @@ Python XML parsing library.
 
 
 import xml.dom.minidom
+from cStringIO import StringIO
+from xml.etree.cElementTree import iterparse
 from xml.parsers.expat import ExpatError
 
 from babelerrors import IFictionError
@@ -50,6 +52,33 @@ TOP_LEVELS = ["identification", "bibliographic", "resources", "contact",
               "adrift", "releases", "colophon", "annotation"]
 
 
+IFICTION_NS = "http://babel.ifarchive.org/protocol/iFiction/"
+
+
+class StoryRecord(object):
+    """The data of a single story from an IFiction file, without an XML
+    tree behind it.
+
+    The attributes hold the same values that the get_* functions return
+    for a story Node, and those functions accept a StoryRecord in place
+    of a story Node.
+
+    """
+    def __init__(self):
+        self.identification = {"ifid_list": [], "ifformat": None,
+                               "bafn": None}
+        self.bibliographic = dict((attr, None) for attr in BIBLIO_ATTR)
+        self.resources = []
+        self.contact = {"url": None, "email": None}
+        self.cover = {"format": None, "height": None, "width": None,
+                      "description": None}
+        self.format_info = {}
+        self.releases = []
+        self.colophon = {"generator": None, "generatorversion": None,
+                         "originated": None}
+        self.annotation = {}
+
+
 def build_dict_from_node(xml_node):
     """Build a Python dict object from an XML node.
 
@@ -203,6 +232,445 @@ def get_ifiction_dom(ifiction):
     return doc
 
 
+def iter_stories(ifiction_source):
+    """Iterate over the stories in an IFiction file without building a
+    DOM for the whole file.
+
+    The file is parsed incrementally and each story element is discarded
+    as soon as its record has been built, so only one story is held in
+    memory at a time.  HTML markup in text fields is kept as text.
+
+    Args:
+        ifiction_source: the path of an IFiction file or a file object
+                         open for reading
+    Returns:
+        An iterator over StoryRecord objects
+    Raises:
+        IFictionError if the file is not well-formed XML or not IFiction
+
+    """
+    depth = 0
+    root = None
+    try:
+        for event, elem in iterparse(ifiction_source,
+                                     events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                    if elem.tag != "{{{0}}}ifindex".format(IFICTION_NS):
+                        raise IFictionError("Document not IFiction")
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and _local_name(elem.tag) == "story":
+                yield _build_story_record(elem)
+                root.clear()
+    except SyntaxError:
+        raise IFictionError("Malformed XML document")
+
+
+def get_story_record(story_node):
+    """Build a StoryRecord from a story Node.
+
+    Args:
+        story_node: a story Node
+    Returns:
+        A StoryRecord object
+
+    """
+    record = StoryRecord()
+    record.identification = get_identification(story_node)
+    record.bibliographic = get_bibliographic(story_node)
+    record.resources = get_resources(story_node)
+    record.contact = get_contact(story_node)
+    record.cover = get_cover(story_node)
+    record.format_info = get_format_info(story_node)
+    record.releases = get_releases(story_node)
+    record.colophon = get_colophon(story_node)
+    record.annotation = get_annotation(story_node)
+    return record
+
+
+def add_story_record(ifiction_dom, record):
+    """Add a story Node built from a StoryRecord to a DOM.
+
+    Args:
+        ifiction_dom: an xml.dom Document
+        record: a StoryRecord
+    Returns:
+        The story Node
+    Raises:
+        IFictionError if the record lacks data which IFiction requires
+
+    """
+    story_node = add_story(ifiction_dom)
+    ident = record.identification
+    add_identification(ifiction_dom, story_node, ident["ifid_list"],
+                       ident["ifformat"], ident["bafn"])
+    biblio = dict((key, value) for key, value in
+                  record.bibliographic.items() if value is not None)
+    add_bibliographic(ifiction_dom, story_node, **biblio)
+    for resource in record.resources:
+        add_resource(ifiction_dom, story_node, resource["leafname"],
+                     resource["description"])
+    contact = record.contact
+    if contact["url"] is not None or contact["email"] is not None:
+        add_contact(ifiction_dom, story_node, contact["url"],
+                    contact["email"])
+    cover = record.cover
+    if cover["format"] is not None:
+        add_cover(ifiction_dom, story_node, cover["format"], cover["height"],
+                  cover["width"], cover["description"])
+    if record.format_info:
+        ifformat = ident["ifformat"]
+        if ifformat in ["tads2", "tads3"]:
+            ifformat = "tads"
+        add_format_info(ifiction_dom, story_node, ifformat,
+                        **record.format_info)
+    for release, attached in record.releases:
+        add_release(ifiction_dom, story_node, release["releasedate"],
+                    release["version"], release["compiler"],
+                    release["compilerversion"], attached)
+    colophon = record.colophon
+    if colophon["generator"] is not None:
+        add_colophon(ifiction_dom, story_node, colophon["generator"],
+                     colophon["originated"], colophon["generatorversion"])
+    for section_name, info in record.annotation.items():
+        if isinstance(info, dict) and info:
+            add_annotation(ifiction_dom, story_node, section_name, info)
+    return story_node
+
+
+def write_ifiction(out_file, stories, indent="\t", truncate=False,
+                   comment=None, on_error=None):
+    """Write an IFiction XML document straight to a file, without building
+    a DOM.
+
+    The output has the same layout as that of toprettyxml(indent=indent,
+    encoding="UTF-8") on a DOM built with add_comment and
+    add_story_record, but so that it does not depend on dict order, the
+    bibliographic fields are written in BIBLIO_ATTR order and the
+    format-specific and annotation fields are sorted by name.
+
+    Args:
+        out_file: a file object open for writing
+        stories: an iterable of StoryRecord objects, story Nodes or IFStory
+                 objects
+        indent: the string used to indent the XML (default: \t)
+        truncate: truncate the bibliographic data to 240 characters (2400
+                  characters for the description) (default: False)
+        comment: a comment to add before the stories (default: None)
+        on_error: a function called with each story which cannot be
+                  written and its IFictionError; the story is left out and
+                  the rest are written (default: None, raise the error)
+    Raises:
+        IFictionError if a story lacks data which IFiction requires and
+        on_error is None
+
+    """
+    write = out_file.write
+    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<ifindex version="1.0" xmlns="{0}"'.format(IFICTION_NS))
+    empty = True
+    if comment is not None:
+        write(">\n{0}<!--{1}-->\n".format(indent, _encode(comment)))
+        empty = False
+    for story in stories:
+        try:
+            if hasattr(story, "to_story_record"):
+                record = story.to_story_record()
+            elif not isinstance(story, StoryRecord):
+                record = get_story_record(story)
+            else:
+                record = story
+            elements = _get_story_elements(record, truncate)
+        except IFictionError, err:
+            if on_error is None:
+                raise
+            on_error(story, err)
+            continue
+        if empty:
+            write(">\n")
+            empty = False
+        _write_element(write, "story", elements, indent, indent)
+    if empty:
+        write("/>\n")
+    else:
+        write("</ifindex>\n")
+
+
+def format_ifiction(stories, indent="\t", truncate=False, comment=None):
+    """Create an IFiction XML document with write_ifiction.
+
+    Returns:
+        The document as a UTF-8 encoded string
+
+    """
+    out_file = StringIO()
+    write_ifiction(out_file, stories, indent, truncate, comment)
+    return out_file.getvalue()
+
+
+def _encode(text):
+    if isinstance(text, unicode):
+        return text.encode("utf-8")
+    if not isinstance(text, str):
+        return str(text)
+    return text
+
+
+def _write_element(write, name, value, prefix, indent):
+    name = _encode(name)
+    if not isinstance(value, list):
+        value = _encode(value).replace("&", "&amp;").replace(
+            "<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+        write("{0}<{1}>{2}</{1}>\n".format(prefix, name, value))
+    elif not value:
+        write("{0}<{1}/>\n".format(prefix, name))
+    else:
+        write("{0}<{1}>\n".format(prefix, name))
+        child_prefix = prefix + indent
+        for child_name, child_value in value:
+            _write_element(write, child_name, child_value, child_prefix,
+                           indent)
+        write("{0}</{1}>\n".format(prefix, name))
+
+
+def _is_empty(value):
+    return value is None or value == ""
+
+
+def _get_dict_elements(node_dict):
+    # Mirrors build_node_from_dict, with the keys sorted
+    elements = []
+    for key, value in sorted(node_dict.items()):
+        key = key.lower()
+        if _is_empty(value):
+            continue
+        if isinstance(value, list):
+            for val in value:
+                if isinstance(val, dict):
+                    val = _get_dict_elements(val)
+                elements.append((key, val))
+        elif isinstance(value, dict):
+            if value:
+                elements.append((key, _get_dict_elements(value)))
+            else:
+                elements.append((key, ""))
+        else:
+            elements.append((key, value))
+    return elements
+
+
+def _get_story_elements(record, truncate):
+    # Builds the same tree as add_story_record, as nested lists of
+    # (name, text or list of children) pairs
+    ident = record.identification
+    ifid_list = ident["ifid_list"]
+    if not ifid_list or all(_is_empty(ifid) for ifid in ifid_list):
+        raise IFictionError("identification: IFID required")
+    ifformat = ident["ifformat"]
+    if _is_empty(ifformat):
+        raise IFictionError("identification: format required")
+    if ifformat not in IF_FORMATS:
+        raise IFictionError("identification: invalid format")
+    ident_elements = [("ifid", ifid) for ifid in ifid_list]
+    ident_elements.append(("format", ifformat))
+    if not _is_empty(ident["bafn"]):
+        ident_elements.append(("bafn", ident["bafn"]))
+    biblio = record.bibliographic
+    if _is_empty(biblio.get("author")):
+        raise IFictionError("bibliographic: author required")
+    if _is_empty(biblio.get("title")):
+        raise IFictionError("bibliographic: title required")
+    biblio_elements = []
+    for key in BIBLIO_ATTR:
+        value = biblio.get(key)
+        if _is_empty(value):
+            continue
+        if truncate:
+            if key == "description" and len(value) > 2400:
+                value = value[:2401]
+            elif len(value) > 240:
+                value = value[:241]
+        biblio_elements.append((key, value))
+    elements = [("identification", ident_elements),
+                ("bibliographic", biblio_elements)]
+    if record.resources:
+        elements.append(("resources", [
+            ("auxiliary", [("leafname", resource["leafname"]),
+                           ("description", resource["description"])])
+            for resource in record.resources]))
+    contact_elements = [(key, record.contact[key]) for key in ["url", "email"]
+                        if not _is_empty(record.contact[key])]
+    if contact_elements:
+        elements.append(("contact", contact_elements))
+    cover = record.cover
+    if cover["format"]:
+        _check_cover(cover["format"], cover["height"], cover["width"])
+        cover_elements = [("format", cover["format"]),
+                          ("height", cover["height"]),
+                          ("width", cover["width"])]
+        if cover["description"] is not None:
+            cover_elements.append(("description", cover["description"]))
+        elements.append(("cover", cover_elements))
+    if record.format_info:
+        if ifformat in ["tads2", "tads3"]:
+            ifformat = "tads"
+        elements.append((ifformat, _get_dict_elements(record.format_info)))
+    if record.releases:
+        release_sections = []
+        sections = {}
+        for release, attached in record.releases:
+            if _is_empty(release["releasedate"]):
+                raise IFictionError("releases: release date is required")
+            section = "attached" if attached else "history"
+            if section not in sections:
+                sections[section] = []
+                release_sections.append((section, sections[section]))
+            release_elements = [("releasedate", release["releasedate"])]
+            for key in ["version", "compiler", "compilerversion"]:
+                if not _is_empty(release.get(key)):
+                    release_elements.append((key, release[key]))
+            sections[section].append(("release", release_elements))
+        elements.append(("releases", release_sections))
+    colophon = record.colophon
+    if colophon["generator"] is not None:
+        if (_is_empty(colophon["generator"]) or
+                _is_empty(colophon["originated"])):
+            raise IFictionError("colophon: generator and originated are "
+                                "required")
+        colophon_elements = [("generator", colophon["generator"])]
+        if not _is_empty(colophon["generatorversion"]):
+            colophon_elements.append(("generatorversion",
+                                      colophon["generatorversion"]))
+        colophon_elements.append(("originated", colophon["originated"]))
+        elements.append(("colophon", colophon_elements))
+    annotation_elements = [
+        (section_name, _get_dict_elements(info)) for section_name, info in
+        sorted(record.annotation.items()) if isinstance(info, dict) and info]
+    if annotation_elements:
+        elements.append(("annotation", annotation_elements))
+    return elements
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find_children(elem, name):
+    return [child for child in elem if _local_name(child.tag) == name]
+
+
+def _find_child(elem, name):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _get_markup(elem):
+    parts = [elem.text or ""]
+    for child in elem:
+        name = _local_name(child.tag)
+        inner = _get_markup(child)
+        if inner:
+            parts.append("<{0}>{1}</{0}>".format(name, inner))
+        else:
+            parts.append("<{0}/>".format(name))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _get_text(elem):
+    if elem is None:
+        return None
+    text = _get_markup(elem).strip()
+    if text == "":
+        return None
+    return text
+
+
+def _get_child_texts(elem, info):
+    for child in elem:
+        name = _local_name(child.tag)
+        if name in info:
+            info[name] = _get_text(child)
+
+
+def _build_dict_from_element(elem):
+    if len(elem) == 0:
+        return _get_text(elem)
+    elem_dict = {}
+    for child in elem:
+        name = _local_name(child.tag).lower()
+        value = _build_dict_from_element(child)
+        if value is None:
+            continue
+        if name not in elem_dict:
+            elem_dict[name] = value
+        elif isinstance(elem_dict[name], list):
+            elem_dict[name].append(value)
+        else:
+            elem_dict[name] = [elem_dict[name], value]
+    return elem_dict
+
+
+def _build_story_record(story_elem):
+    record = StoryRecord()
+    ident = _find_child(story_elem, "identification")
+    if ident is not None:
+        record.identification["ifid_list"] = [
+            _get_text(ifid) for ifid in _find_children(ident, "ifid")]
+        record.identification["ifformat"] = _get_text(
+            _find_child(ident, "format"))
+        record.identification["bafn"] = _get_text(_find_child(ident, "bafn"))
+    biblio = _find_child(story_elem, "bibliographic")
+    if biblio is not None:
+        _get_child_texts(biblio, record.bibliographic)
+    resources = _find_child(story_elem, "resources")
+    if resources is not None:
+        for aux in _find_children(resources, "auxiliary"):
+            record.resources.append(
+                {"leafname": _get_text(_find_child(aux, "leafname")),
+                 "description": _get_text(_find_child(aux, "description"))})
+    contact = _find_child(story_elem, "contact")
+    if contact is not None:
+        _get_child_texts(contact, record.contact)
+    cover = _find_child(story_elem, "cover")
+    if cover is not None:
+        _get_child_texts(cover, record.cover)
+    ifformat = record.identification["ifformat"]
+    if ifformat is not None:
+        format_info = _find_child(story_elem, ifformat)
+        if format_info is not None and len(format_info) > 0:
+            record.format_info = _build_dict_from_element(format_info)
+    releases = _find_child(story_elem, "releases")
+    if releases is not None:
+        for section, attached in [("attached", True), ("history", False)]:
+            section_elem = _find_child(releases, section)
+            if section_elem is None:
+                continue
+            release_elems = _find_children(section_elem, "release")
+            if attached:
+                release_elems = release_elems[:1]
+            for release_elem in release_elems:
+                release = {"releasedate": None, "version": None,
+                           "compiler": None, "compilerversion": None}
+                for child in release_elem:
+                    release[_local_name(child.tag)] = _get_text(child)
+                record.releases.append((release, attached))
+    colophon = _find_child(story_elem, "colophon")
+    if colophon is not None:
+        _get_child_texts(colophon, record.colophon)
+    annotation = _find_child(story_elem, "annotation")
+    if annotation is not None:
+        for section in annotation:
+            record.annotation[_local_name(section.tag)] = \
+                _build_dict_from_element(section)
+    return record
+
+
 def add_comment(ifiction_dom, comment):
     """Add a comment to an IFiction DOM.
 
@@ -263,7 +731,7 @@ def get_story(ifiction_dom, ifid):
     for story_node in story_node_list:
         ident_list = story_node.getElementsByTagName("identification")
         if len(ident_list) > 0:
-            ifid_node_list = story_node.getelementsByTagName("ifid")
+            ifid_node_list = story_node.getElementsByTagName("ifid")
             ifid_list = [node.firstChild.nodeValue.strip() for node in
                          ifid_node_list]
             if ifid in ifid_list:
@@ -338,11 +806,13 @@ def get_identification(story_node):
     """Return a nested dict object containing story identification data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.identification
     info = {"ifid_list": None, "ifformat": None, "bafn": None}
     ident = story_node.getElementsByTagName("identification")[0]
     ifid_tag_list = ident.getElementsByTagName("ifid")
@@ -421,11 +891,13 @@ def get_bibliographic(story_node):
     """Return a nested dict object containing story bibliographic data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.bibliographic
     info = dict(zip(BIBLIO_ATTR, [None for x in range(len(BIBLIO_ATTR))]))
     biblio = story_node.getElementsByTagName("bibliographic")[0]
     for node in biblio.childNodes:
@@ -485,15 +957,17 @@ def get_resources(story_node):
     """Return a nested dict object containing story resource data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.resources
     res_list = []
     resources = story_node.getElementsByTagName("resources")
     if len(resources) > 0:
-        aux_list = resources.getElementsByTagName("auxiliary")
+        aux_list = resources[0].getElementsByTagName("auxiliary")
         for aux in aux_list:
             resource = {"leafname": None, "description": None}
             leaf_list = aux.getElementsByTagName("leafname")
@@ -504,6 +978,7 @@ def get_resources(story_node):
             if len(desc_list) > 0:
                 desc = desc_list[0].firstChild.nodeValue.strip()
                 resource["description"] = desc
+            res_list.append(resource)
     return res_list
 
 
@@ -550,11 +1025,13 @@ def get_contact(story_node):
     """Return a nested dict object containing story contact data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.contact
     contact = {"url": None, "email": None}
     contact_nodes = story_node.getElementsByTagName("contact")
     if len(contact_nodes) > 0:
@@ -594,24 +1071,7 @@ def add_cover(ifiction_dom, story_node, img_format, height, width,
         of Babel
 
     """
-    if img_format is None or img_format == "":
-        raise IFictionError("cover: image format required")
-    if img_format not in ["jpg", "png", "gif"]:
-        raise IFictionError("cover: invalid image format")
-    if height is None or height == "":
-        raise IFictionError("cover: image height required")
-    try:
-        if int(height) <= 0:
-            raise IFictionError("cover: height must be a positive integer")
-    except:
-        raise IFictionError("cover: height must be a positive integer")
-    if width is None or width == "":
-        raise IFictionError("cover: image width required")
-    try:
-        if int(width) <= 0:
-            raise IFictionError("cover: width must be a positive integer")
-    except:
-        raise IFictionError("cover: width must be a positive integer")
+    _check_cover(img_format, height, width)
     if len(story_node.getElementsByTagName("cover")) != 0:
         raise IFictionError("cover: cover section already exists")
     cov = ifiction_dom.createElement("cover")
@@ -635,15 +1095,38 @@ def add_cover(ifiction_dom, story_node, img_format, height, width,
         descr_tag.appendChild(descr_text)
 
 
+def _check_cover(img_format, height, width):
+    if img_format is None or img_format == "":
+        raise IFictionError("cover: image format required")
+    if img_format not in ["jpg", "png", "gif"]:
+        raise IFictionError("cover: invalid image format")
+    if height is None or height == "":
+        raise IFictionError("cover: image height required")
+    try:
+        if int(height) <= 0:
+            raise IFictionError("cover: height must be a positive integer")
+    except:
+        raise IFictionError("cover: height must be a positive integer")
+    if width is None or width == "":
+        raise IFictionError("cover: image width required")
+    try:
+        if int(width) <= 0:
+            raise IFictionError("cover: width must be a positive integer")
+    except:
+        raise IFictionError("cover: width must be a positive integer")
+
+
 def get_cover(story_node):
     """Return a nested dict object containing story cover art data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.cover
     cover = {"format": None, "height": None, "width": None,
              "description": None}
     cover_nodes = story_node.getElementsByTagName("cover")
@@ -708,11 +1191,13 @@ def get_format_info(story_node):
     """Return a nested dict object containing story format-specific data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.format_info
     info = {}
     ident = story_node.getElementsByTagName("identification")[0]
     format_nodes = ident.getElementsByTagName("format")
@@ -803,11 +1288,13 @@ def get_releases(story_node):
     """Return a nested dict object containing story release data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.releases
     releases = []
     releases_nodes = story_node.getElementsByTagName("releases")
     if len(releases_nodes) == 0:
@@ -890,11 +1377,13 @@ def get_colophon(story_node):
     """Return a nested dict object containing story colophon data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.colophon
     colophon = {"generator": None, "generatorversion": None,
                 "originated": None}
     colophon_nodes = story_node.getElementsByTagName("colophon")
@@ -949,11 +1438,13 @@ def get_annotation(story_node):
     """Return a nested dict object containing story annotation data.
 
     Args:
-        story_node: a story Node
+        story_node: a story Node or a StoryRecord
     Returns:
         A dict object with node names as keys and node text as values
 
     """
+    if isinstance(story_node, StoryRecord):
+        return story_node.annotation
     annotations = {}
     annot_nodes = story_node.getElementsByTagName("annotation")
     if len(annot_nodes) > 0:
@@ -29,14 +29,12 @@ extra functions for retrieving bibliographical data from online sources.
 
 
 import os.path
-from urllib2 import urlopen
 import time
 
 import ifiction
 import treatyofbabel
-from utils._imgfuncs import CoverImage, get_png_dim, get_jpeg_dim, get_gif_dim, deduce_img_format
-from babelerrors import IFictionError, BabelError
-from treatyofbabel import PYIFBABEL_VERSION
+from utils._imgfuncs import CoverImage, probe_img
+from babelerrors import IFictionError, BabelError, BabelImgError
 
 
 class StrictDict(dict):
@@ -69,8 +67,8 @@ class IFStory(object):
 
         Args:
             story_file: the story file
-            ific_story_node: an IFiction Node containing the story's
-                             bibliographical data
+            ific_story_node: an IFiction Node or ifiction.StoryRecord
+                             containing the story's bibliographical data
 
         """
         self.story_file = story_file
@@ -186,8 +184,8 @@ class IFStory(object):
         for resource in self.resources:
             ifiction.add_resource(ifiction_dom, story_node, resource[0], resource[1])
         if self.contacts["url"] != u"" or self.contacts["email"] != u"":
-            ifiction.add_contacts(ifiction_dom, story_node,
-                                  self.contacts["url"], self.contacts["email"])
+            ifiction.add_contact(ifiction_dom, story_node,
+                                 self.contacts["url"], self.contacts["email"])
         if self.cover.img_format:
             ifiction.add_cover(ifiction_dom, story_node, self.cover.img_format,
                                self.cover.height, self.cover.width,
@@ -203,10 +201,7 @@ class IFStory(object):
                                  rel_dict["compiler"],
                                  rel_dict["compilerversion"],
                                  release[1])
-        if not self.colophon["generator"]:
-            self.colophon["generator"] = u"pyifbabel"
-            self.colophon["generatorversion"] = PYIFBABEL_VERSION
-            self.colophon["originated"] = unicode(time.strftime("%x"))
+        self._set_default_colophon()
         ifiction.add_colophon(ifiction_dom, story_node,
                               self.colophon["generator"],
                               self.colophon["originated"],
@@ -215,6 +210,39 @@ class IFStory(object):
             ifiction.add_annotation(ifiction_dom, story_node, sect, info)
         return story_node
 
+    def _set_default_colophon(self):
+        if not self.colophon["generator"]:
+            self.colophon["generator"] = u"pyifbabel"
+            self.colophon["generatorversion"] = (
+                treatyofbabel.PYIFBABEL_VERSION)
+            self.colophon["originated"] = unicode(time.strftime("%x"))
+
+    def to_story_record(self):
+        """Create an ifiction.StoryRecord from the object.
+
+        Returns:
+            A StoryRecord
+
+        """
+        self._set_default_colophon()
+        record = ifiction.StoryRecord()
+        record.identification = {"ifid_list": list(self.ifid_list),
+                                 "ifformat": self.format, "bafn": self.bafn}
+        record.bibliographic = dict(self.bibliographic)
+        record.resources = [{"leafname": filename, "description": description}
+                            for filename, description in self.resources]
+        record.contact = dict(self.contacts)
+        record.cover = {"format": self.cover.img_format,
+                        "height": self.cover.height,
+                        "width": self.cover.width,
+                        "description": self.cover.description}
+        record.format_info = dict(self.format_info)
+        record.releases = [(dict(release), attached)
+                           for release, attached in self.releases]
+        record.colophon = dict(self.colophon)
+        record.annotation = dict(self.annotation)
+        return record
+
     def to_ifiction_story_node(self, ifiction_dom, truncate=False):
         """Create an IFiction story Node from the object.
 
@@ -236,18 +264,28 @@ class IFStory(object):
             truncate: truncate text to 240 characters or 2400 characters for
                       the description (default: False)
         Returns:
-            A DOM object
+            The document as a UTF-8 encoded string
 
         """
-        doc = ifiction.create_ifiction_dom()
-        story_node = self._build_ifiction(doc, truncate)
-        return doc.toprettyxml(indent=indent, encoding="UTF-8")
+        return ifiction.format_ifiction([self], indent, truncate)
+
+    def write_ifiction(self, out_file, indent="\t", truncate=False):
+        """Write an IFiction XML document for the object to a file.
+
+        Args:
+            out_file: a file object open for writing
+            indent: the character used to indent the XML (default: \\t)
+            truncate: truncate text to 240 characters or 2400 characters for
+                      the description (default: False)
+
+        """
+        ifiction.write_ifiction(out_file, [self], indent, truncate)
 
     def load_from_ifiction(self, story_node):
         """Load bibliographical data from an IFiction story Node.
 
         Args:
-            story_node: an IFiction story Node
+            story_node: an IFiction story Node or ifiction.StoryRecord
 
         """
         ident = ifiction.get_identification(story_node)
@@ -264,9 +302,12 @@ class IFStory(object):
             if value is None:
                 value = ""
             self.bibliographic[key] = value
-        self.resources = ifiction.get_resources(story_node)
-        contacts = ifiction.get_contacts(story_node)
+        self.resources = [(resource["leafname"], resource["description"])
+                          for resource in ifiction.get_resources(story_node)]
+        contacts = ifiction.get_contact(story_node)
         for key, value in contacts.items():
+            if value is None:
+                value = ""
             self.contacts[key] = value
         cover = ifiction.get_cover(story_node)
         self.cover.img_format = cover.get("format")
@@ -277,10 +318,12 @@ class IFStory(object):
         self.releases = ifiction.get_releases(story_node)
         colophon = ifiction.get_colophon(story_node)
         for key, val in colophon.items():
+            if val is None:
+                val = ""
             self.colophon[key] = val
         self.annotation.update(ifiction.get_annotation(story_node))
 
-    def load_from_story_file(self, story_file=None):
+    def load_from_story_file(self, story_file=None, cache=None):
         """Load bibliographical data from a story file.
 
         If no story file is specified, the file name stored in self.story_file
@@ -288,25 +331,64 @@ class IFStory(object):
 
         Args:
             story_file: the name of the story file to use (default: None)
+            cache: an AnalysisCache to consult (default: None)
 
         """
         if story_file is not None:
             self.story_file = story_file
         if self.story_file is None:
             return
-        self.format = treatyofbabel.deduce_format(self.story_file)
-        for ifid in treatyofbabel.get_ifids(self.story_file):
+        result = None
+        if cache is not None:
+            result = cache.lookup(self.story_file)
+        if result is not None:
+            story_format, ifids, meta = (result.story_format, result.ifids,
+                                         result.meta)
+            cover = None
+            if result.cover_format is not None:
+                cover = treatyofbabel.get_cover(self.story_file)
+        else:
+            with treatyofbabel.analyze(self.story_file) as analysis:
+                story_format = analysis.story_format
+                ifids = analysis.ifids
+                meta = analysis.meta
+                cover = analysis.cover
+        self.format = story_format
+        for ifid in ifids:
             if ifid not in self.ifid_list:
                 self.ifid_list.append(ifid)
-        meta = treatyofbabel.get_meta(self.story_file)
         if meta is not None:
             meta_dom = ifiction.get_ifiction_dom(meta)
             self.load_from_ifiction(meta_dom)
-        cover = treatyofbabel.get_cover(self.story_file)
         if cover is not None:
             self.cover = cover
 
-    def load_from_ifdb(self, ifid=None, tuid=None, fetch_cover=False):
+    def load_from_scan_result(self, result):
+        """Load bibliographical data from the analysis of a story file
+        made by a scan.
+
+        The cover art's format and dimensions are loaded, but not its data,
+        which scans do not keep.
+
+        Args:
+            result: a ScanResult (see treatyofbabel.scanner)
+
+        """
+        self.story_file = result.path
+        # iFiction gives the format of the story, blorbed or not
+        self.format = result.story_format.rpartition(" ")[2]
+        for ifid in result.ifids or []:
+            if ifid not in self.ifid_list:
+                self.ifid_list.append(ifid)
+        if result.meta is not None:
+            meta_dom = ifiction.get_ifiction_dom(result.meta)
+            self.load_from_ifiction(meta_dom)
+        if result.cover_format is not None:
+            self.cover = CoverImage(None, result.cover_format,
+                                    result.cover_width, result.cover_height)
+
+    def load_from_ifdb(self, ifid=None, tuid=None, fetch_cover=False,
+                       client=None):
         """Load bibliographical data from IFDB (http://ifdb.tads.org)
 
         Args:
@@ -315,6 +397,12 @@ class IFStory(object):
             tuid: the TUID to search for (default: None; try to use the TUID
                   stored in the object's annotation data)
             fetch_cover: fetch the cover art, if available (default: False)
+            client: the IFDBClient to fetch the data with (default: None, a
+                    client shared by all IFStory objects)
+        Raises:
+            BabelError: if no IFID or TUID is known
+            IFictionError: if IFDB does not return a story
+            IFDBError: if the request fails
 
         """
         if ifid is None and len(self.ifid_list) > 0:
@@ -327,14 +415,29 @@ class IFStory(object):
         # Access the IFDB public API
         if ifid is None and tuid is None:
             raise BabelError("No IFID or TUID set")
-        if tuid is not None:
-            url = ''.join(['http://ifdb.tads.org/viewgame?ifiction&id=',
-                           tuid])
-        else:
-            url = ''.join(['http://ifdb.tads.org/viewgame?ifiction&ifid=',
-                           ifid])
-        ific = urlopen(url)
-        ificstring = ific.read()
+        if client is None:
+            import ifdb
+            client = ifdb._get_default_client()
+        ificstring = client.get_ifiction(ifid, tuid)
+        if ificstring is None:
+            raise IFictionError("Story not found on IFDB")
+        self.load_from_ifdb_record(ificstring)
+        if fetch_cover:
+            self.load_cover_from_ifdb(client)
+        return
+
+    def load_from_ifdb_record(self, ificstring):
+        """Load bibliographical data from an iFiction document fetched from
+        IFDB.
+
+        IFDB's own data about the story is kept in the "ifdb" annotation.
+
+        Args:
+            ificstring: the iFiction document
+        Raises:
+            IFictionError: if the document does not contain a story
+
+        """
         try:
             ificdom = ifiction.get_ifiction_dom(ificstring)
         except IFictionError:
@@ -346,11 +449,18 @@ class IFStory(object):
         ificstory = ificstories[0]
         ifiction.move_extra_to_annotation(ificdom, ificstory, ["ifdb"])
         self.load_from_ifiction(ificstory)
-        if fetch_cover:
-            self.load_cover_from_ifdb()
-        return
 
-    def load_cover_from_ifdb(self):
+    def load_cover_from_ifdb(self, client=None):
+        """Load the cover art of the story from IFDB, if the story's
+        IFDB annotation gives its URL.
+
+        Args:
+            client: the IFDBClient to fetch the image with (default: None, a
+                    client shared by all IFStory objects)
+        Raises:
+            IFDBError: if the request fails
+
+        """
         ifdb_annot = self.annotation.get("ifdb")
         if ifdb_annot is None:
             return
@@ -360,19 +470,19 @@ class IFStory(object):
         cover_url = cover.get("url")
         if cover_url is None:
             return
-        cover_file = urlopen(cover_url)
-        cover_data = cover_file.read()
+        if client is None:
+            import ifdb
+            client = ifdb._get_default_client()
+        cover_data = client.fetch(cover_url)
         if cover_data is None:
             return
-        fmt = deduce_img_format(cover_data)
-        if fmt is None:
+        try:
+            probe = probe_img(cover_data)
+        except BabelImgError:
             return
-        if fmt == "jpeg":
-            width, height = get_jpeg_dim(cover_data)
-        elif fmt == "png":
-            width, height = get_png_dim(cover_data)
-        else:
-            width, height = get_gif_dim(cover_data)
+        if probe is None:
+            return
+        fmt, width, height = probe
         self.cover.data = cover_data
         self.cover.img_format = fmt
         self.cover.width = width
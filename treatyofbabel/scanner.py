@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+#       scanner.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module implements scanning of whole collections of story files.
+Files are analyzed in a pool of worker processes, since most of the
+format handlers are CPU-bound pure Python, and results are yielded as
+soon as each file is done.
+
+"""
+
+
+import os
+import multiprocessing
+import threading
+
+import treatyofbabel
+from babelerrors import BabelError, IFictionError
+
+
+class ScanResult(object):
+    """The outcome of analyzing a single file during a scan.
+
+    Cover art data is not kept, only its format and dimensions, so that
+    results stay small enough to be passed between processes cheaply.
+
+    """
+    def __init__(self, path, size=None, story_format=None, ifids=None,
+                 meta=None, cover_format=None, cover_width=None,
+                 cover_height=None, error=None):
+        self.path = path
+        self.size = size
+        self.story_format = story_format
+        self.ifids = ifids
+        self.meta = meta
+        self.cover_format = cover_format
+        self.cover_width = cover_width
+        self.cover_height = cover_height
+        self.error = error
+
+
+class _BoundedFeed(object):
+    """An iterator over paths which blocks once a given number of paths
+    have been handed out but not yet released, keeping the amount of
+    queued work and unconsumed results bounded.
+
+    """
+    def __init__(self, paths, bound):
+        self._paths = iter(paths)
+        self._slots = threading.Semaphore(bound)
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        self._slots.acquire()
+        if self._closed:
+            raise StopIteration
+        return next(self._paths)
+
+    def release(self):
+        self._slots.release()
+
+    def close(self):
+        self._closed = True
+        self._slots.release()
+
+
+def iter_story_paths(paths_or_directory):
+    """Iterate over the files in a directory tree or a list of paths.
+
+    Args:
+        paths_or_directory: the path of a directory or file, or an iterable
+                            of such paths
+    Returns:
+        An iterator over file paths; directories are walked recursively in
+        sorted order
+
+    """
+    if isinstance(paths_or_directory, basestring):
+        paths_or_directory = [paths_or_directory]
+    for path in paths_or_directory:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                yield os.path.join(dir_path, file_name)
+
+
+def scan_file(path):
+    """Analyze a single file for a scan.
+
+    Args:
+        path: the file path of a story file
+    Returns:
+        A ScanResult object; errors are recorded in it rather than raised
+
+    """
+    return _scan_file(path)[0]
+
+
+def _scan_file(path, with_digest=False):
+    """Analyze a single file, returning its ScanResult and, if with_digest
+    is true and the analysis succeeded, the md5 digest of the file.
+
+    """
+    result = ScanResult(path)
+    digest = None
+    try:
+        with treatyofbabel.analyze(path, use_mmap=True) as analysis:
+            result.size = analysis.size
+            result.story_format = analysis.story_format
+            result.ifids = analysis.ifids
+            result.meta = analysis.meta
+            cover = analysis.cover
+            if cover is not None:
+                result.cover_format = cover.img_format
+                result.cover_width = cover.width
+                result.cover_height = cover.height
+            if with_digest:
+                digest = analysis.md5
+    except (BabelError, IFictionError), err:
+        result.error = err.value
+    except Exception, err:
+        result.error = str(err)
+    return result, digest
+
+
+def scan(paths_or_directory, workers=None, max_pending=None):
+    """Analyze many story files in parallel.
+
+    Args:
+        paths_or_directory: the path of a directory or file, or an iterable
+                            of such paths
+        workers: the number of worker processes; 1 analyzes the files in
+                 the calling process (default: None, one per CPU)
+        max_pending: the maximum number of files queued or analyzed but not
+                     yet consumed (default: None, four per worker)
+    Returns:
+        An iterator over ScanResult objects, in order of completion
+
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    paths = iter_story_paths(paths_or_directory)
+    if workers <= 1:
+        return (scan_file(path) for path in paths)
+    if max_pending is None:
+        max_pending = 4 * workers
+    return _scan_parallel(paths, workers, max_pending)
+
+
+def _scan_parallel(paths, workers, max_pending):
+    feed = _BoundedFeed(paths, max_pending)
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(scan_file, feed):
+            feed.release()
+            yield result
+        pool.close()
+    finally:
+        feed.close()
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,553 @@
+# -*- coding: utf-8 -*-
+#
+#       server.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""This module implements a long-running analysis service, so that
+programs which analyze many story files one at a time need not start
+Python and import pyifbabel for each of them.
+
+An AnalysisServer listens on a Unix domain socket or a TCP port on a
+loopback address (IPv4 or IPv6) and answers requests from AnalysisClient
+objects, whose methods mirror the query functions of the treatyofbabel
+module.  Each message, in either
+direction, is a UTF-8 encoded JSON object preceded by its length as a
+4-byte big-endian integer.  Requests have an "op" ("analyze", "format",
+"ifids", "meta", "cover" or "stats") and either the "path" of a story
+file on the server's file system or its base64-encoded "data" (with an
+optional file "name").  Responses have "ok" and either "result" or
+"error" and the "type" of the error.  A connection may carry any number
+of requests, which are answered in order.
+
+Since a request may name any file the server can read, and the server
+does not authenticate its clients, it only listens on the local host.
+
+"""
+
+
+import base64
+import collections
+import json
+import multiprocessing
+import os
+import socket
+import SocketServer
+import stat
+import struct
+import threading
+import time
+
+import treatyofbabel
+from babelerrors import BabelError, IFictionError
+from utils._imgfuncs import CoverImage
+
+
+OPS = ["analyze", "format", "ifids", "meta", "cover", "stats"]
+# Messages longer than this are refused, rather than read into memory
+MAX_MESSAGE_SIZE = 1 << 26
+# The latency statistics cover this many of the most recent requests
+LATENCY_WINDOW = 1000
+# The errors which the client raises as they were raised on the server
+ERROR_TYPES = {"BabelError": BabelError, "IFictionError": IFictionError,
+               "ValueError": ValueError, "IOError": IOError}
+
+
+class RequestStats(object):
+    """Counts of the requests an AnalysisServer has answered and their
+    latencies.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counts = dict((op, 0) for op in OPS)
+        self._errors = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, op, latency, error=False):
+        """Record a request.
+
+        Args:
+            op: the operation requested
+            latency: the time taken to answer it, in seconds
+            error: True if it failed (default: False)
+
+        """
+        with self._lock:
+            if op in self._counts:
+                self._counts[op] += 1
+            if error:
+                self._errors += 1
+            self._latencies.append(latency)
+
+    def get_summary(self):
+        """Summarize the statistics.
+
+        Returns:
+            A dict of the number of requests per operation ("requests"),
+            the number of failed requests ("errors"), the server's uptime
+            in seconds ("uptime") and the mean, median, 90th and 99th
+            percentiles and maximum of the latencies of the latest
+            LATENCY_WINDOW requests, in seconds ("latency")
+
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            summary = {"requests": dict(self._counts),
+                       "errors": self._errors,
+                       "uptime": time.time() - self._started}
+        if latencies:
+            summary["latency"] = {
+                "mean": sum(latencies) / len(latencies),
+                "p50": _percentile(latencies, 50),
+                "p90": _percentile(latencies, 90),
+                "p99": _percentile(latencies, 99),
+                "max": latencies[-1]}
+        else:
+            summary["latency"] = None
+        return summary
+
+
+def _percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class _RequestHandler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        server = self.server.analysis_server
+        server._add_connection(self.request)
+        try:
+            self._answer(server)
+        finally:
+            server._remove_connection(self.request)
+
+    def _answer(self, server):
+        while True:
+            try:
+                request = _recv_message(self.request)
+            except (ValueError, socket.error):
+                return
+            if request is None:
+                return
+            response = server.handle_request(request)
+            try:
+                _send_message(self.request, response)
+            except ValueError, err:
+                # Such as metadata which is not UTF-8; nothing has been
+                # sent yet, so the client is told instead
+                response = {"ok": False, "type": "BabelError",
+                            "error": "Cannot encode response: {0}".format(
+                                err)}
+                try:
+                    _send_message(self.request, response)
+                except socket.error:
+                    return
+            except socket.error:
+                return
+
+
+class _UnixServer(SocketServer.ThreadingMixIn,
+                  SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+class AnalysisServer(object):
+    """A server answering analysis requests over a socket.
+
+    Every client connection is served by its own thread, while the story
+    files are analyzed in a pool of worker processes, as by
+    treatyofbabel.scanner.scan, so that concurrent clients are analyzed
+    in parallel.
+
+    Attributes:
+        address: the address the server listens on
+        stats: a RequestStats object
+
+    """
+    def __init__(self, address, workers=None):
+        """Initialize the object and start listening.
+
+        Args:
+            address: the path of a Unix domain socket, which is replaced if
+                     it exists already, or a (host, port) tuple, where host
+                     must be a loopback address; port 0 picks a free port
+            workers: the number of worker processes; 1 analyzes the files in
+                     the connections' threads (default: None, one per CPU)
+        Raises:
+            ValueError: if host is not a loopback address
+
+        """
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        if isinstance(address, basestring):
+            _remove_socket(address)
+            self._server = _UnixServer(address, _RequestHandler)
+        else:
+            if _get_loopback_family(address[0]) == socket.AF_INET6:
+                self._server = _TCP6Server(address, _RequestHandler)
+            else:
+                self._server = _TCPServer(address, _RequestHandler)
+        self._server.analysis_server = self
+        self.address = self._server.server_address
+        self.stats = RequestStats()
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self._pool = None
+        if workers > 1:
+            self._pool = multiprocessing.Pool(workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def serve_forever(self):
+        """Answer requests until shutdown is called."""
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serve_forever, from another thread."""
+        self._server.shutdown()
+
+    def close(self):
+        """Stop listening, close the open connections and stop the worker
+        processes.
+
+        """
+        self._server.server_close()
+        with self._connections_lock:
+            for sock in self._connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        if isinstance(self.address, basestring):
+            _remove_socket(self.address)
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _add_connection(self, sock):
+        with self._connections_lock:
+            self._connections.add(sock)
+
+    def _remove_connection(self, sock):
+        with self._connections_lock:
+            self._connections.discard(sock)
+
+    def handle_request(self, request):
+        """Answer a request.
+
+        Args:
+            request: a request dict, as described above
+        Returns:
+            A response dict
+
+        """
+        start = time.time()
+        op = request.get("op") if isinstance(request, dict) else None
+        if op == "stats":
+            response = {"ok": True, "result": self.stats.get_summary()}
+        elif self._pool is not None:
+            response = self._pool.apply(_run_request, (request,))
+        else:
+            response = _run_request(request)
+        self.stats.add(op, time.time() - start, not response["ok"])
+        return response
+
+
+def _get_loopback_family(host):
+    """Get the address family to listen on a host with, preferring IPv4,
+    if the host only resolves to loopback addresses.
+
+    Raises:
+        ValueError: if it does not, or does not resolve at all
+
+    """
+    # An empty host would listen on every interface
+    families = set()
+    try:
+        infos = socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+    except socket.error:
+        infos = []
+    for family, _, _, _, sockaddr in infos:
+        if ((family == socket.AF_INET and sockaddr[0].startswith("127.")) or
+                (family == socket.AF_INET6 and sockaddr[0] == "::1")):
+            families.add(family)
+        else:
+            families = set()
+            break
+    if not host or not families:
+        raise ValueError("Not a loopback address: {0!r}".format(host))
+    if socket.AF_INET in families:
+        return socket.AF_INET
+    return socket.AF_INET6
+
+
+def _remove_socket(path):
+    # Only a socket left behind by an earlier server may be replaced
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return
+    if stat.S_ISSOCK(mode):
+        os.remove(path)
+
+
+def _run_request(request):
+    # Runs in a worker process, so errors are returned rather than raised
+    try:
+        return {"ok": True, "result": _run_op(request)}
+    except Exception, err:
+        if isinstance(err, (BabelError, IFictionError)):
+            message = err.value
+        else:
+            message = str(err)
+        return {"ok": False, "error": message, "type": type(err).__name__}
+
+
+def _run_op(request):
+    if not isinstance(request, dict) or request.get("op") not in OPS:
+        raise ValueError("Unknown operation")
+    op = request["op"]
+    if "data" in request:
+        story_input = bytearray(base64.b64decode(request["data"]))
+        story_name = request.get("name")
+        use_mmap = False
+    elif isinstance(request.get("path"), basestring):
+        story_input = request["path"]
+        story_name = None
+        use_mmap = True
+    else:
+        raise ValueError("No story file specified")
+    with treatyofbabel.analyze(story_input, story_name,
+                               use_mmap) as analysis:
+        if op == "format":
+            return analysis.story_format
+        elif op == "ifids":
+            return analysis.ifids
+        elif op == "meta":
+            return analysis.get_meta(request.get("truncate", False))
+        cover = analysis.cover
+        if cover is not None:
+            cover_info = {"format": cover.img_format, "width": cover.width,
+                          "height": cover.height,
+                          "description": cover.description}
+        else:
+            cover_info = None
+        if op == "cover":
+            if cover_info is not None:
+                cover_info["data"] = base64.b64encode(str(cover.data))
+            return cover_info
+        return {"size": analysis.size, "format": analysis.story_format,
+                "ifids": analysis.ifids, "cover": cover_info}
+
+
+def _send_message(sock, message):
+    data = json.dumps(message)
+    sock.sendall(struct.pack(">I", len(data)) + data)
+
+
+def _recv_message(sock):
+    # Returns None if the connection is closed between messages
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    length = struct.unpack(">I", header)[0]
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError("Message too long")
+    data = _recv_exactly(sock, length)
+    if data is None:
+        raise ValueError("Truncated message")
+    return json.loads(data)
+
+
+def _recv_exactly(sock, length):
+    chunks = []
+    while length > 0:
+        chunk = sock.recv(min(length, 1 << 16))
+        if not chunk:
+            if chunks:
+                raise ValueError("Truncated message")
+            return None
+        chunks.append(chunk)
+        length -= len(chunk)
+    return "".join(chunks)
+
+
+class AnalysisClient(object):
+    """A client of an AnalysisServer.
+
+    Its methods take the same arguments and return the same values as the
+    treatyofbabel functions of the same names, and raise the same errors.
+    Story files may be given by path, in which case the server reads them
+    itself, or as file objects or buffers, whose data is sent to the
+    server.  The client is safe to use from several threads, although
+    their requests take turns on its one connection.
+
+    """
+    def __init__(self, address, timeout=None):
+        """Initialize the object.
+
+        Args:
+            address: the path of the server's Unix domain socket or its
+                     (host, port) tuple
+            timeout: the timeout of each request in seconds (default: None,
+                     no timeout)
+
+        """
+        self.address = address
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the connection to the server."""
+        with self._lock:
+            self._disconnect()
+
+    def _connect(self):
+        if not isinstance(self.address, basestring):
+            # An IPv6 server address also has a flow label and scope ID
+            self._sock = socket.create_connection(self.address[:2],
+                                                  self.timeout)
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _call(self, op, story_input=None, story_name=None, **kwargs):
+        request = dict(kwargs, op=op)
+        if isinstance(story_input, basestring):
+            request["path"] = os.path.abspath(story_input)
+        elif story_input is not None:
+            if hasattr(story_input, "read"):
+                if story_name is None:
+                    story_name = getattr(story_input, "name", None)
+                data = story_input.read()
+            else:
+                data = str(story_input)
+            request["data"] = base64.b64encode(data)
+            if story_name is not None:
+                request["name"] = story_name
+        with self._lock:
+            # A connection kept from an earlier request may have been
+            # closed by a restarted server; try once more on a new one
+            for retry in (self._sock is not None, False):
+                if self._sock is None:
+                    self._connect()
+                try:
+                    _send_message(self._sock, request)
+                    response = _recv_message(self._sock)
+                except (ValueError, socket.error):
+                    self._disconnect()
+                    if retry:
+                        continue
+                    raise
+                if response is not None:
+                    break
+                self._disconnect()
+                if not retry:
+                    raise BabelError("Connection closed by server")
+        if not response["ok"]:
+            error_type = ERROR_TYPES.get(response.get("type"), BabelError)
+            raise error_type(response["error"])
+        return response["result"]
+
+    def analyze(self, story_input, story_name=None):
+        """Get a summary of the analysis of a story file.
+
+        Args:
+            story_input: the file path of a story file, a file object open
+                         for reading or a buffer containing the story data
+            story_name: the file name used to guess the story's format from
+                        its extension when story_input is not a path
+                        (default: None)
+        Returns:
+            A dict of the file's "size", "format", "ifids" and "cover" (a
+            dict of the cover art's "format", "width", "height" and
+            "description", or None)
+
+        """
+        return self._call("analyze", story_input, story_name)
+
+    def deduce_format(self, story_file):
+        """Deduce the format of a story file."""
+        return _encode(self._call("format", story_file))
+
+    def get_ifids(self, story_file):
+        """Get the IFIDs associated with a story file."""
+        ifids = self._call("ifids", story_file)
+        if ifids is None:
+            return None
+        return [_encode(ifid) for ifid in ifids]
+
+    def get_meta(self, story_file, truncate=False):
+        """Get the iFiction metadata of a story file, or None."""
+        return _encode(self._call("meta", story_file, truncate=truncate))
+
+    def get_cover(self, story_file):
+        """Get the cover art of a story file as a CoverImage, or None."""
+        cover = self._call("cover", story_file)
+        if cover is None:
+            return None
+        return CoverImage(base64.b64decode(cover["data"]),
+                          _encode(cover["format"]), cover["width"],
+                          cover["height"], cover["description"])
+
+    def get_stats(self):
+        """Get the server's RequestStats summary."""
+        return self._call("stats")
+
+
+def _encode(value):
+    # JSON strings come back as unicode, where the library returns str
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
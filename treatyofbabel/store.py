@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+#       store.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module provides the IFictionStore class, which keeps iFiction
+stories in an SQLite database so that large catalogs can be updated,
+searched and exported without parsing or rewriting a whole iFiction
+file.
+
+"""
+
+
+import json
+import sqlite3
+
+import ifiction
+from babelerrors import IFictionError
+
+
+class IFictionStore(object):
+    """A persistent collection of iFiction stories, stored in an SQLite
+    database.
+
+    Stories are kept as the values returned by the ifiction.get_*
+    functions and are indexed by IFID, title, author and format.  As in an
+    IFictionCatalog, no two stories may share an IFID; storing a story
+    replaces any stories with which it shares one.
+
+    """
+    def __init__(self, store_file):
+        """Initialize the object.
+
+        Args:
+            store_file: the path of the database file, which is created if
+                        it does not exist
+
+        """
+        self._db = sqlite3.connect(store_file)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                author TEXT,
+                format TEXT,
+                record TEXT);
+            CREATE TABLE IF NOT EXISTS ifids (
+                ifid TEXT PRIMARY KEY,
+                story_id INTEGER);
+            CREATE INDEX IF NOT EXISTS stories_title ON stories (title);
+            CREATE INDEX IF NOT EXISTS stories_author ON stories (author);
+            CREATE INDEX IF NOT EXISTS stories_format ON stories (format);
+            CREATE INDEX IF NOT EXISTS ifids_story ON ifids (story_id);
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def __contains__(self, ifid):
+        return self._find_story_id(ifid) is not None
+
+    def get(self, ifid):
+        """Get the story with an IFID.
+
+        Args:
+            ifid: an IFID
+        Returns:
+            A StoryRecord or None if no story has the IFID
+
+        """
+        row = self._db.execute(
+            "SELECT record FROM stories JOIN ifids ON stories.id = "
+            "ifids.story_id WHERE ifid = ?", (ifid,)).fetchone()
+        if row is None:
+            return None
+        return _load_record(row[0])
+
+    def find(self, title=None, author=None, ifformat=None):
+        """Find the stories matching all of the given fields exactly.
+
+        Args:
+            title: the story's title (default: None, any title)
+            author: the story's author (default: None, any author)
+            ifformat: the story's format (default: None, any format)
+        Returns:
+            An iterator over StoryRecord objects, in the order they were
+            stored
+
+        """
+        conditions = []
+        values = []
+        for column, value in [("title", title), ("author", author),
+                              ("format", ifformat)]:
+            if value is not None:
+                conditions.append("{0} = ?".format(column))
+                values.append(value)
+        query = "SELECT record FROM stories"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
+        for row in self._db.execute(query, values):
+            yield _load_record(row[0])
+
+    def put(self, story):
+        """Store a story, replacing any stories which share an IFID with it.
+
+        Args:
+            story: a StoryRecord or a story Node
+        Raises:
+            IFictionError if the story has no IFIDs
+
+        """
+        self._put(story)
+        self._db.commit()
+
+    def remove(self, ifid):
+        """Remove the story with an IFID, along with all of its other IFIDs.
+
+        Args:
+            ifid: an IFID
+        Raises:
+            KeyError if no story has the IFID
+
+        """
+        story_id = self._find_story_id(ifid)
+        if story_id is None:
+            raise KeyError(ifid)
+        self._delete(story_id)
+        self._db.commit()
+
+    def import_ifiction(self, ifiction_source):
+        """Store all of the stories in an IFiction file, in a single
+        transaction.  The file is parsed one story at a time.
+
+        Args:
+            ifiction_source: the path of an IFiction file or a file object
+                             open for reading
+        Returns:
+            The number of stories imported
+        Raises:
+            IFictionError if the file is not well-formed IFiction; nothing
+            is imported in that case
+
+        """
+        count = 0
+        try:
+            for record in ifiction.iter_stories(ifiction_source):
+                self._put(record)
+                count += 1
+        except:
+            self._db.rollback()
+            raise
+        self._db.commit()
+        return count
+
+    def to_ifiction(self, stories=None, indent="\t"):
+        """Create an IFiction XML document from stored stories.
+
+        Args:
+            stories: an iterable of StoryRecord objects, such as the result
+                     of find() (default: None, all stories)
+            indent: the character used to indent the XML (default: \\t)
+        Returns:
+            The document as a UTF-8 encoded string
+        Raises:
+            IFictionError if a story lacks data which IFiction requires
+
+        """
+        if stories is None:
+            stories = self.find()
+        return ifiction.format_ifiction(stories, indent)
+
+    def _find_story_id(self, ifid):
+        row = self._db.execute("SELECT story_id FROM ifids WHERE ifid = ?",
+                               (ifid,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _put(self, story):
+        if not isinstance(story, ifiction.StoryRecord):
+            story = ifiction.get_story_record(story)
+        ifid_list = story.identification["ifid_list"]
+        if not ifid_list:
+            raise IFictionError("identification: IFID required")
+        for ifid in ifid_list:
+            story_id = self._find_story_id(ifid)
+            if story_id is not None:
+                self._delete(story_id)
+        cursor = self._db.execute(
+            "INSERT INTO stories (title, author, format, record) "
+            "VALUES (?, ?, ?, ?)",
+            (story.bibliographic.get("title"),
+             story.bibliographic.get("author"),
+             story.identification["ifformat"], json.dumps(vars(story))))
+        self._db.executemany("INSERT INTO ifids VALUES (?, ?)",
+                             [(ifid, cursor.lastrowid)
+                              for ifid in set(ifid_list)])
+
+    def _delete(self, story_id):
+        self._db.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+        self._db.execute("DELETE FROM ifids WHERE story_id = ?", (story_id,))
+
+
+def _load_record(data):
+    record = ifiction.StoryRecord()
+    for key, value in json.loads(data).items():
+        setattr(record, key, value)
+    # JSON has no tuples
+    record.releases = [tuple(release) for release in record.releases]
+    return record
@@ -21,29 +21,146 @@
 #       along with Grotesque.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import re
 import struct
 
 
+# Precompiled unpackers for each byte order, so that the read_* functions
+# need not build and look up a format string on every call
+_ENDIAN_CHARS = "@=<>!"
+_INT_READERS = dict((endian_char, struct.Struct(endian_char + "I").unpack_from)
+                    for endian_char in _ENDIAN_CHARS)
+_SHORT_READERS = dict((endian_char,
+                       struct.Struct(endian_char + "H").unpack_from)
+                      for endian_char in _ENDIAN_CHARS)
+_LONG_READERS = dict((endian_char, struct.Struct(endian_char + "L").unpack_from)
+                     for endian_char in _ENDIAN_CHARS)
+_BYTE_READER = struct.Struct("B").unpack_from
+_structs = {}
+
+
 def read_int(file_buffer, offset, endian_char='>'):
-    return struct.unpack_from('{0}I'.format(endian_char),
-                              file_buffer, offset)[0]
+    return _INT_READERS[endian_char](file_buffer, offset)[0]
 
 
 def read_short(file_buffer, offset, endian_char='>'):
-    return struct.unpack_from('{0}H'.format(endian_char),
-                              file_buffer, offset)[0]
+    return _SHORT_READERS[endian_char](file_buffer, offset)[0]
 
 
 def read_byte(file_buffer, offset, endian_char='>'):
-    return struct.unpack_from('{0}B'.format(endian_char),
-                              file_buffer, offset)[0]
+    return _BYTE_READER(file_buffer, offset)[0]
 
 
 def read_long(file_buffer, offset, endian_char='>'):
-    return struct.unpack_from('{0}L'.format(endian_char),
-                              file_buffer, offset)[0]
+    return _LONG_READERS[endian_char](file_buffer, offset)[0]
 
 
 def read_char(file_buffer, offset, endian_char='>'):
-    return struct.unpack_from('{0}B'.format(endian_char),
-                              file_buffer, offset)[0]
+    return _BYTE_READER(file_buffer, offset)[0]
+
+
+def get_struct(fmt):
+    """Get a compiled struct.Struct for a format, compiling each format
+    only once.
+
+    """
+    compiled = _structs.get(fmt)
+    if compiled is None:
+        compiled = _structs[fmt] = struct.Struct(fmt)
+    return compiled
+
+
+class BinaryReader(object):
+    """A cursor over a str, buffer or mmap object which reads integers and
+    bytes from it, advancing past them.
+
+    Attributes:
+        file_buffer: the data being read
+        offset: the position of the next read
+        endian_char: the byte order of the integers read, as a struct
+                     format character
+
+    """
+    def __init__(self, file_buffer, offset=0, endian_char='>'):
+        self.file_buffer = file_buffer
+        self.offset = offset
+        self.endian_char = endian_char
+        self._read_int = _INT_READERS[endian_char]
+        self._read_short = _SHORT_READERS[endian_char]
+
+    def __len__(self):
+        return len(self.file_buffer)
+
+    def seek(self, offset):
+        self.offset = offset
+
+    def skip(self, count):
+        self.offset += count
+
+    def remaining(self):
+        return len(self.file_buffer) - self.offset
+
+    def read_int(self):
+        value = self._read_int(self.file_buffer, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def read_short(self):
+        value = self._read_short(self.file_buffer, self.offset)[0]
+        self.offset += 2
+        return value
+
+    def read_byte(self):
+        value = _BYTE_READER(self.file_buffer, self.offset)[0]
+        self.offset += 1
+        return value
+
+    def read_bytes(self, length):
+        """Read length bytes as a str."""
+        data = self.file_buffer[self.offset:self.offset + length]
+        self.offset += length
+        return data
+
+    def read_ints(self, count):
+        """Read count integers at once, as a tuple."""
+        return self.unpack("{0}I".format(count))
+
+    def read_shorts(self, count):
+        """Read count short integers at once, as a tuple."""
+        return self.unpack("{0}H".format(count))
+
+    def unpack(self, fmt):
+        """Read the values described by a struct format, without a byte
+        order character, in the reader's byte order.
+
+        Returns:
+            A tuple of values
+
+        """
+        compiled = get_struct(self.endian_char + fmt)
+        values = compiled.unpack_from(self.file_buffer, self.offset)
+        self.offset += compiled.size
+        return values
+
+
+# The functions below let handlers work on str, mmap and buffer objects
+# alike.  Python 2's memoryview cannot wrap an mmap, so zero-copy slices
+# are buffer objects, which lack the str search methods.
+
+def starts_with(file_buffer, prefix, offset=0):
+    return file_buffer[offset:offset + len(prefix)] == prefix
+
+
+def find_bytes(file_buffer, sub, start=0):
+    if hasattr(file_buffer, "find"):
+        return file_buffer.find(sub, start)
+    match = re.compile(re.escape(sub)).search(file_buffer, start)
+    if match is None:
+        return -1
+    return match.start()
+
+
+def get_view(file_buffer, offset, length=None):
+    if length is None:
+        return buffer(file_buffer, offset)
+    return buffer(file_buffer, offset, length)
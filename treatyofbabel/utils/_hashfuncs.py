@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+#       _hashfuncs.py
+#
+#       Copyright © 2026 Brandon Invergo <brandon@invergo.net>
+#
+#       This file is part of pyifbabel.
+#
+#       pyifbabel is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation, either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       pyifbabel is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+
+from treatyofbabel.utils._binaryfuncs import get_view
+
+
+HASH_BLOCK_SIZE = 1 << 16
+
+
+def get_md5(file_buffer):
+    """Get the md5 digest of a buffer, hashing it in blocks so that no
+    copy of a memory-mapped file is made.
+
+    Args:
+        file_buffer: a str, buffer or mmap object
+    Returns:
+        The digest as a string of upper-case hexadecimal digits
+
+    """
+    file_hash = hashlib.md5()
+    for offset in xrange(0, len(file_buffer), HASH_BLOCK_SIZE):
+        file_hash.update(get_view(file_buffer, offset, HASH_BLOCK_SIZE))
+    return file_hash.hexdigest().upper()
+
+
+def get_file_md5(story_handle):
+    """Get the md5 digest of a whole file, reading it in blocks.
+
+    Args:
+        story_handle: a file object open for reading in binary mode; it is
+                      read from its start
+    Returns:
+        The digest as a string of upper-case hexadecimal digits
+
+    """
+    file_hash = hashlib.md5()
+    story_handle.seek(0)
+    block = story_handle.read(HASH_BLOCK_SIZE)
+    while block:
+        file_hash.update(block)
+        block = story_handle.read(HASH_BLOCK_SIZE)
+    return file_hash.hexdigest().upper()
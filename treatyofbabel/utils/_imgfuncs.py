@@ -20,10 +20,21 @@
 #       along with pyifbabel.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from _binaryfuncs import read_char, read_long, read_short
+import struct
+
 from treatyofbabel.babelerrors import BabelImgError
 
 
+# The number of bytes read at a time when probing an image in a file
+PROBE_BLOCK_SIZE = 512
+# Start Of Frame markers, baseline, progressive, lossless or arithmetic
+# coded; 0xC4, 0xC8 and 0xCC are other markers in the same range
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - frozenset([0xC4, 0xC8,
+                                                            0xCC])
+# Markers which stand alone, without a segment length
+JPEG_STANDALONE_MARKERS = frozenset([0x01] + range(0xD0, 0xD8))
+
+
 class CoverImage(object):
     def __init__(self, data=None, img_format=None, width=None,
                  height=None, description=None):
@@ -34,132 +45,195 @@ class CoverImage(object):
         self.description = description
 
 
-def get_jpeg_dim(img):
-    if read_char(img, 0) != 0xff or read_char(img, 1) != 0xD8:
-        raise BabelImgError("Data does not contain a JPEG image")
-    dp = 2
-    ep = len(img)
+class _ImageReader(object):
+    """Reads parts of an image from a buffer or a seekable file object,
+    reading files a block at a time so that only the blocks holding the
+    image's headers are read.
+
+    """
+    def __init__(self, img):
+        self._img = img
+        self._is_file = hasattr(img, "read")
+        if self._is_file:
+            self._start = img.tell()
+        self._block_offset = 0
+        self._block = ""
+
+    def read(self, offset, length):
+        if not self._is_file:
+            data = str(self._img[offset:offset + length])
+        else:
+            block_start = offset - self._block_offset
+            if (block_start < 0 or
+                    block_start + length > len(self._block)):
+                self._img.seek(self._start + offset)
+                self._block = self._img.read(max(length, PROBE_BLOCK_SIZE))
+                self._block_offset = offset
+                block_start = 0
+            data = self._block[block_start:block_start + length]
+        if len(data) < length:
+            raise BabelImgError("Truncated image")
+        return data
+
+    def close(self):
+        """Restore the position of a file object."""
+        if self._is_file:
+            self._img.seek(self._start)
+
+
+def _get_jpeg_dim(reader):
+    p = 2
     while True:
-        if dp > ep:
+        # Segments should follow each other directly, but skip any junk
+        # between them
+        while reader.read(p, 1) != "\xff":
+            p += 1
+        p += 1
+        marker = ord(reader.read(p, 1))
+        while marker == 0xFF:
+            p += 1
+            marker = ord(reader.read(p, 1))
+        p += 1
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xD8 or marker == 0xD9 or marker == 0xDA:
+            # Another Start Of Image (a corrupt image or an embedded one),
+            # End Of Image or Start Of Scan before any frame header
             raise BabelImgError("Invalid JPEG image")
-        t1 = read_char(img, dp)
-        dp += 1
-        while t1 != 0xff:
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            t1 = read_char(img, dp)
-            dp += 1
-        t1 = read_char(img, dp)
-        dp += 1
-        while t1 == 0xff:
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            t1 = read_char(img, dp)
-            dp += 1
-        if t1 & 0xF0 == 0xC0 and not (t1 == 0xC4 or t1 == 0xC8 or t1 == 0xCC):
-            dp += 3
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            h = read_char(img, dp) * 2**8
-            dp += 1
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            h = h | read_char(img, dp)
-            dp += 1
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            w = read_char(img, dp) * 2**8
-            dp += 1
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            w = w | read_char(img, dp)
+        if marker in JPEG_SOF_MARKERS:
+            # Segment length and sample precision precede the dimensions
+            h, w = struct.unpack(">HH", reader.read(p + 3, 4))
             return (w, h)
-        elif t1 == 0xD8 or t1 == 0xD9:
-            break
-        else:
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            l = read_char(img, dp) * 2**8
-            dp += 1
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-            l = l | read_char(img, dp)
-            l -= 2
-            dp += l
-            if dp > ep:
-                raise BabelImgError("Invalid JPEG image")
-    raise BabelImgError("Invalid JPEG image")
+        p += struct.unpack(">H", reader.read(p, 2))[0]
+
+
+def _get_png_dim(reader):
+    header = reader.read(12, 12)
+    if header[:4] != "IHDR":
+        raise BabelImgError("Invalid PNG image")
+    return struct.unpack(">II", header[4:])
+
+
+def _get_gif_dim(reader):
+    # The size of the logical screen, which all of the images in the file
+    # are drawn on
+    return struct.unpack("<HH", reader.read(6, 4))
+
+
+def _get_webp_dim(reader):
+    # The first chunk of the RIFF file determines the kind of WebP image
+    chunk_type = reader.read(12, 4)
+    if chunk_type == "VP8 ":
+        # Lossy: a VP8 key frame, whose start code follows the frame tag
+        header = reader.read(23, 7)
+        if header[:3] != "\x9d\x01\x2a":
+            raise BabelImgError("Invalid WebP image")
+        w, h = struct.unpack("<HH", header[3:])
+        return (w & 0x3FFF, h & 0x3FFF)
+    elif chunk_type == "VP8L":
+        # Lossless: 14 bits each of width - 1 and height - 1
+        header = reader.read(20, 5)
+        if header[0] != "\x2f":
+            raise BabelImgError("Invalid WebP image")
+        bits = struct.unpack("<I", header[1:])[0]
+        return ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    elif chunk_type == "VP8X":
+        # Extended: 24 bits each of canvas width - 1 and height - 1
+        header = reader.read(24, 6)
+        w = struct.unpack("<I", header[:3] + "\0")[0]
+        h = struct.unpack("<I", header[3:] + "\0")[0]
+        return (w + 1, h + 1)
+    raise BabelImgError("Invalid WebP image")
+
+
+_DIM_READERS = {"jpeg": _get_jpeg_dim, "png": _get_png_dim,
+                "gif": _get_gif_dim, "webp": _get_webp_dim}
+
+
+def probe_img(img):
+    """Get the format and dimensions of an image, reading only its
+    headers.
+
+    Args:
+        img: the image: a buffer or a seekable file object, whose position
+             is left unchanged
+    Returns:
+        A (format, width, height) tuple, where format is "jpeg", "png",
+        "gif" or "webp", or None if the format is not recognized
+    Raises:
+        BabelImgError: if the image is truncated or broken
+
+    """
+    reader = _ImageReader(img)
+    try:
+        try:
+            img_format = sniff_img_format(reader.read(0, 12))
+        except BabelImgError:
+            return None
+        if img_format is None:
+            return None
+        width, height = _DIM_READERS[img_format](reader)
+    finally:
+        reader.close()
+    return (img_format, width, height)
+
+
+def _get_dim(img, img_format):
+    reader = _ImageReader(img)
+    try:
+        if sniff_img_format(reader.read(0, 12)) != img_format:
+            raise BabelImgError(
+                "Data does not contain a {0} image".format(img_format.upper()))
+        return _DIM_READERS[img_format](reader)
+    finally:
+        reader.close()
+
+
+def get_jpeg_dim(img):
+    return _get_dim(img, "jpeg")
 
 
 def get_png_dim(img):
-    if (len(img) < 33):
-        raise BabelImgError("Data does not contain a PNG image")
-    header1 = [read_char(img, x) for x in range(8)]
-    header2 = [read_char(img, 12+x) for x in range(4)]
-    if ((header1 != [137, 80, 78, 71, 13, 10, 26, 10] or
-         header2 != [ord(c) for c in ['I', 'H', 'D', 'R']])):
-        raise BabelImgError("Data does not contain a PNG image")
-    w = read_long(img, 16)
-    h = read_long(img, 20)
-    return (w, h)
+    return _get_dim(img, "png")
 
 
 def get_gif_dim(img):
-    # Look for the "GIF" magic number
-    header = [read_char(img, x) for x in range(3)]
-    if header != [ord(c) for c in ['G', 'I', 'F']]:
-        raise BabelImgError("Data does not contain a GIF image")
-    header_len = 6
-    logscreen_len = 7
-    packed_field = read_char(img, header_len+4, '<')
-    # The first bit of the packed field determines if there is a
-    # Global Color Table
-    global_color_tbl = packed_field & 0b10000000 == 0b10000000
-    if global_color_tbl:
-        # The last three bits determine the size of the GCT.
-        # According to
-        # http://giflib.sourceforge.net/whatsinagif/bits_and_bytes.html
-        # This should be determined by the color resolution in bits
-        # 2-4, however that doesn't seem to work.  This does
-        gct_size = packed_field & 0b00000111
-        # The Global Color Table uses 2^(N+1) bytes per color (RGB),
-        # so 3*2^(N+1) bytes long
-        gct_len = 3 * (2 ** (gct_size + 1))
-    else:
-        gct_len = 0
-    # Check for a Graphics Control Extension block
-    gce_offset = header_len + logscreen_len + gct_len
-    gce_block = read_char(img, gce_offset, '<') == 0x21
-    if gce_block:
-        gce_len = 8
-    else:
-        gce_len = 0
-    # Image Descriptior block
-    img_descr_offset = gce_offset + gce_len
-    if read_char(img, img_descr_offset, '<') != 0x2C:
-        raise BabelImgError("Invalid GIF image")
-    w = read_short(img, img_descr_offset+5, '<')
-    h = read_short(img, img_descr_offset+7, '<')
-    return (w, h)
+    return _get_dim(img, "gif")
 
 
-def deduce_img_format(img):
-    try:
-        get_jpeg_dim(img)
-    except BabelImgError:
-        pass
-    else:
+def get_webp_dim(img):
+    return _get_dim(img, "webp")
+
+
+def sniff_img_format(header):
+    """Guess the format of an image from its first few bytes.
+
+    Unlike deduce_img_format, this does not check that the rest of the
+    image can be parsed.
+
+    Args:
+        header: at least the first 12 bytes of the image
+    Returns:
+        "jpeg", "png", "gif", "webp" or None if the format is not
+        recognized
+
+    """
+    if header[:2] == "\xff\xd8":
         return "jpeg"
-    try:
-        get_png_dim(img)
-    except BabelImgError:
-        pass
-    else:
+    elif header[:8] == "\x89PNG\r\n\x1a\n":
         return "png"
-    try:
-        get_gif_dim(img)
-    except BabelImgError:
-        pass
-    else:
+    elif header[:3] == "GIF":
         return "gif"
+    elif header[:4] == "RIFF" and header[8:12] == "WEBP":
+        return "webp"
     return None
+
+
+def deduce_img_format(img):
+    try:
+        result = probe_img(img)
+    except BabelImgError:
+        return None
+    if result is None:
+        return None
+    return result[0]
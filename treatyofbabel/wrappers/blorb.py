@@ -22,10 +22,12 @@
 
 
 from ctypes import create_string_buffer
+import importlib
 import os
 import struct
 
-from treatyofbabel.utils._binaryfuncs import read_int
+from treatyofbabel.utils._binaryfuncs import BinaryReader
+from treatyofbabel.utils._binaryfuncs import read_int, get_view, starts_with
 from treatyofbabel.utils._imgfuncs import CoverImage, get_jpeg_dim, get_png_dim
 from treatyofbabel.utils._imgfuncs import deduce_img_format
 from treatyofbabel import ifiction
@@ -34,6 +36,483 @@ from treatyofbabel.babelerrors import BabelError
 FORMAT = "blorb"
 FORMAT_EXT = [".blorb", ".blb", ".zblorb", ".zlb", ".gblorb", ".glb"]
 HOME_PAGE = "http://eblong.com/zarf/blorb"
+TREATY_REGISTRY = {"ZCOD": "zcode", "GLUL": "glulx", "TAD2": "tads2",
+                   "TAD3": "tads3", "HUGO": "hugo", "ALAN": "alan",
+                   "ADRI": "adrift", "LEVE": "level9", "AGT ": "agt",
+                   "MAGS": "magscrolls", "ADVS": "advsys",
+                   "EXEC": "executable"}
+STORY_CHUNK_TYPES = dict([(story_format, chunk_type) for
+                          chunk_type, story_format in
+                          TREATY_REGISTRY.items()])
+PICTURE_CHUNK_TYPES = {"png": "PNG ", "jpeg": "JPEG"}
+SOUND_CHUNK_TYPES = {"aiff": "FORM", "ogg": "OGGV", "mod": "MOD "}
+# Resources of these types are IFF chunks themselves and are stored
+# as they are
+RAW_CHUNK_TYPES = ["FORM"]
+RESOURCE_EXTENSIONS = {"PNG ": ".png", "JPEG": ".jpg", "FORM": ".aiff",
+                       "OGGV": ".ogg", "MOD ": ".mod", "TEXT": ".txt",
+                       "BINA": ".bin"}
+COPY_BLOCK_SIZE = 1 << 16
+
+
+class BlorbFile(object):
+    """A blorb file, with its chunks, resource index and resource
+    descriptions indexed once, when the object is created.
+
+    """
+    def __init__(self, file_buffer):
+        """Initialize the object.
+
+        Args:
+            file_buffer: a buffer containing the blorb file data
+
+        """
+        self.file_buffer = file_buffer
+        # chunk ID -> (data offset, data length) of its first chunk
+        self.chunks = {}
+        # (usage, number) -> offset of the resource's chunk
+        self.resources = {}
+        self.resource_list = []
+        # (usage, number) -> description text
+        self.descriptions = {}
+        self._index_chunks()
+        self._index_resources()
+        self._index_descriptions()
+
+    def _index_chunks(self):
+        file_buffer = self.file_buffer
+        i = 12
+        while i < len(file_buffer) - 8:
+            length = read_int(file_buffer, i + 4)
+            self.chunks.setdefault(file_buffer[i:i + 4], (i + 8, length))
+            if length % 2 != 0:
+                length = length + 1
+            i = i + length + 8
+
+    def _index_resources(self):
+        file_buffer = self.file_buffer
+        r, length = self.get_chunk("RIdx")
+        if r is None:
+            return
+        reader = BinaryReader(file_buffer, r)
+        ridx_len = reader.read_int()
+        for i in range(ridx_len):
+            if reader.remaining() < 12:
+                break
+            usage, number, start = reader.unpack("4sII")
+            resource = (usage, number)
+            if resource not in self.resources:
+                self.resources[resource] = start
+                self.resource_list.append(resource)
+
+    def _index_descriptions(self):
+        file_buffer = self.file_buffer
+        r, length = self.get_chunk("RDes")
+        if r is None:
+            return
+        rdes_len = read_int(file_buffer, r)
+        b = r + 4
+        for i in range(rdes_len):
+            if b + 12 > len(file_buffer):
+                break
+            res_usage = file_buffer[b:b+4]
+            res_num = read_int(file_buffer, b+4)
+            res_len = read_int(file_buffer, b+8)
+            text_start = b + 12
+            self.descriptions.setdefault(
+                (res_usage, res_num),
+                file_buffer[text_start:text_start+res_len])
+            b += 12 + res_len
+
+    def get_chunk(self, chunk_id):
+        """Get the position of the first chunk of a type.
+
+        Args:
+            chunk_id: the four-character chunk type
+        Returns:
+            A tuple of the offset and length of the chunk's data, or
+            (None, None) if there is no such chunk
+
+        """
+        return self.chunks.get(chunk_id, (None, None))
+
+    def get_resource(self, resource, n):
+        """Get the position of a resource.
+
+        Args:
+            resource: the resource usage (e.g. "Pict" or "Exec")
+            n: the resource number
+        Returns:
+            A tuple of the offset and length of the resource's data, or
+            (None, None) if there is no such resource
+
+        """
+        start = self.resources.get((resource, n))
+        if start is None:
+            return (None, None)
+        return (start + 8, read_int(self.file_buffer, start + 4))
+
+    def get_resource_description(self, resource, n):
+        """Get the textual description of a resource, or None."""
+        return self.descriptions.get((resource, n))
+
+    def get_story_file_extension(self):
+        story_format = self.get_story_format()
+        if story_format == "zcode":
+            return FORMAT_EXT[2]
+        elif story_format == "glulx":
+            return FORMAT_EXT[4]
+        else:
+            return FORMAT_EXT[0]
+
+    def get_story_file_meta(self, truncate=False):
+        index, length = self.get_chunk("IFmd")
+        if index is None:
+            return None
+        return self.file_buffer[index:index + length]
+
+    def get_story_file_cover(self):
+        file_buffer = self.file_buffer
+        i, length = self.get_chunk("Fspc")
+        if length < 4:
+            return None
+        i = read_int(file_buffer, i)
+        pict_i, pict_len = self.get_resource("Pict", i)
+        if pict_i is None:
+            return None
+        description = self.get_resource_description("Pict", i)
+        cover_data = get_view(file_buffer, pict_i, pict_len)
+        cover_format = file_buffer[pict_i - 8:pict_i - 4]
+        if cover_format[:3] == "PNG":
+            ext = "png"
+            (width, height) = get_png_dim(cover_data)
+        elif cover_format == "JPEG":
+            ext = "jpg"
+            (width, height) = get_jpeg_dim(cover_data)
+        else:
+            raise BabelError("Unsupported image format")
+        cover = CoverImage(cover_data, ext, width, height, description)
+        return cover
+
+    def get_story_file_ifid(self):
+        meta = self.get_story_file_meta()
+        if meta is None:
+            return [self.get_embedded_ifid()]
+        story_dom = ifiction.get_ifiction_dom(meta)
+        story = ifiction.get_all_stories(story_dom)[0]
+        ident = ifiction.get_identification(story)
+        ifid_list = ident.get("ifid_list")
+        if ifid_list is None or len(ifid_list) == 0:
+            return [self.get_embedded_ifid()]
+        return ifid_list
+
+    def get_story_file(self):
+        index, length = self.get_resource("Exec", 0)
+        if index is None:
+            return None
+        return get_view(self.file_buffer, index, length)
+
+    def get_story_format(self):
+        for story_format in TREATY_REGISTRY:
+            if story_format in self.chunks:
+                return TREATY_REGISTRY.get(story_format)
+        return None
+
+    def get_resources(self):
+        """Get the resources in the resource index, as a list of (usage,
+        number) tuples in the order of the index.
+
+        """
+        return list(self.resource_list)
+
+    def iter_resources(self):
+        """Iterate over the resources in the resource index, in its order,
+        without copying their data.
+
+        Returns:
+            An iterator over (usage, number, chunk type, offset, length,
+            data) tuples, where data is a buffer object referring to the
+            resource's data in the blorb.  Resources which are IFF chunks
+            themselves (AIFF sounds) include their chunk header.
+
+        """
+        file_buffer = self.file_buffer
+        for usage, number in self.resource_list:
+            start = self.resources[(usage, number)]
+            if start + 8 > len(file_buffer):
+                continue
+            chunk_type = file_buffer[start:start + 4]
+            offset = start + 8
+            length = read_int(file_buffer, start + 4)
+            if chunk_type in RAW_CHUNK_TYPES:
+                offset = start
+                length += 8
+            yield (usage, number, chunk_type, offset, length,
+                   get_view(file_buffer, offset, length))
+
+    def get_embedded_ifid(self):
+        """Get the IFID of the story file contained in the blorb."""
+        story_format = self.get_story_format()
+        if story_format is None:
+            raise BabelError("Unknown story format")
+        handler = _get_handler(story_format)
+        return handler.get_story_file_ifid(self.get_story_file())
+
+
+class BlorbBuilder(object):
+    """Assembles a blorb from any number of resources.
+
+    Resources can be given as file paths, buffers (bytearray, buffer or
+    memoryview objects) or file objects.  Their
+    sizes are determined when they are added, all chunk offsets are
+    computed before anything is written, and the resources are then
+    copied to the output in a single pass, in blocks, so the output need
+    not be seekable.  A file object is read from its current position, so
+    it must not be read from elsewhere until the blorb is written.
+
+    """
+    def __init__(self):
+        self._resources = []
+        self._resource_keys = set()
+        self._descriptions = []
+        self._frontispiece = None
+        self._release = None
+        self._metadata = None
+
+    def add_story(self, source, story_format, number=0):
+        """Add an executable (story file) resource.
+
+        Args:
+            source: the story file: a path, buffer or file object
+            story_format: the format of the story
+            number: the resource number (default: 0)
+        Raises:
+            BabelError: if the story format is not supported
+
+        """
+        chunk_type = STORY_CHUNK_TYPES.get(story_format)
+        if chunk_type is None:
+            raise BabelError("Unsupported story format")
+        self._add_resource("Exec", number, chunk_type, source)
+
+    def add_picture(self, source, number, description=None,
+                    img_format=None):
+        """Add a picture resource.
+
+        Args:
+            source: the PNG or JPEG image: a path, buffer or file object
+            number: the resource number
+            description: a textual description of the picture, for
+                         players who cannot see it (default: None)
+            img_format: "png" or "jpeg" (default: None, deduced from the
+                        image's headers)
+        Raises:
+            BabelError: if the image format is not supported
+
+        """
+        if img_format is None:
+            img_format = _deduce_img_format(source)
+        chunk_type = PICTURE_CHUNK_TYPES.get(img_format)
+        if chunk_type is None:
+            raise BabelError("Unsupported or broken image format")
+        self._add_resource("Pict", number, chunk_type, source, description)
+
+    def add_sound(self, source, number, description=None,
+                  sound_format=None):
+        """Add a sound resource.
+
+        Args:
+            source: the sound: a path, buffer or file object
+            number: the resource number
+            description: a textual description of the sound, for players
+                         who cannot hear it (default: None)
+            sound_format: "aiff", "ogg" or "mod" (default: None, sniffed
+                          from the sound; MOD files cannot be sniffed)
+        Raises:
+            BabelError: if the sound format is not supported
+
+        """
+        if sound_format is None:
+            header = _peek(source, 12)
+            if header[:4] == "FORM" and header[8:12] == "AIFF":
+                sound_format = "aiff"
+            elif header[:4] == "OggS":
+                sound_format = "ogg"
+        chunk_type = SOUND_CHUNK_TYPES.get(sound_format)
+        if chunk_type is None:
+            raise BabelError("Unsupported sound format")
+        self._add_resource("Snd ", number, chunk_type, source, description)
+
+    def add_data(self, source, number, data_type):
+        """Add a data resource.
+
+        Args:
+            source: the data: a path, buffer or file object
+            number: the resource number
+            data_type: the four-character chunk type (e.g. "TEXT" or
+                       "BINA")
+
+        """
+        self._add_resource("Data", number, data_type, source)
+
+    def set_frontispiece(self, number):
+        """Set the number of the picture resource used as cover art."""
+        self._frontispiece = number
+
+    def set_release(self, number):
+        """Set the release number of the game."""
+        self._release = number
+
+    def set_metadata(self, source):
+        """Set the iFiction metadata: a path, buffer or file object."""
+        self._metadata = (source, _get_size(source))
+
+    def _add_resource(self, usage, number, chunk_type, source,
+                      description=None):
+        if len(chunk_type) != 4:
+            raise BabelError("Invalid chunk type")
+        if (usage, number) in self._resource_keys:
+            raise BabelError("Duplicate resource")
+        length = _get_size(source)
+        self._resource_keys.add((usage, number))
+        self._resources.append((usage, number, chunk_type, source, length))
+        if description is not None:
+            if isinstance(description, unicode):
+                description = description.encode("utf-8")
+            self._descriptions.append((usage, number, description))
+
+    def _plan(self):
+        """Lay out the chunks of the blorb.
+
+        Returns:
+            A list of (chunk type, source, length) tuples; a chunk type of
+            None means the source is written without a chunk header
+
+        """
+        chunks = [None]
+        if self._descriptions:
+            entries = [struct.pack(">I", len(self._descriptions))]
+            for usage, number, text in self._descriptions:
+                entries.append(struct.pack(">4sII", usage, number, len(text)))
+                entries.append(text)
+            chunks.append(_data_chunk("RDes", "".join(entries)))
+        if self._frontispiece is not None:
+            chunks.append(_data_chunk("Fspc",
+                                      struct.pack(">I", self._frontispiece)))
+        if self._release is not None:
+            chunks.append(_data_chunk("RelN",
+                                      struct.pack(">H", self._release)))
+        if self._metadata is not None:
+            chunks.append(("IFmd",) + self._metadata)
+        # The resource index comes first, so the resources' offsets follow
+        # from its size
+        ridx_len = 4 + 12 * len(self._resources)
+        offset = 12 + 8 + ridx_len + ridx_len % 2
+        offset += sum([_chunk_size(chunk) for chunk in chunks[1:]])
+        index = [struct.pack(">I", len(self._resources))]
+        for usage, number, chunk_type, source, length in self._resources:
+            index.append(struct.pack(">4sII", usage, number, offset))
+            if chunk_type in RAW_CHUNK_TYPES:
+                # The resource is a complete IFF chunk already
+                chunk = (None, source, length)
+            else:
+                chunk = (chunk_type, source, length)
+            chunks.append(chunk)
+            offset += _chunk_size(chunk)
+        chunks[0] = _data_chunk("RIdx", "".join(index))
+        return chunks
+
+    def write(self, out_file):
+        """Write the blorb.
+
+        Args:
+            out_file: the file path of the blorb file to write, or a file
+                      object open for writing
+        Raises:
+            BabelError: if a resource is shorter than it was when it was
+                        added
+
+        """
+        chunks = self._plan()
+        total_len = 4 + sum([_chunk_size(chunk) for chunk in chunks])
+        if hasattr(out_file, "write"):
+            self._write(out_file, total_len, chunks)
+        else:
+            with open(out_file, 'wb') as h:
+                self._write(h, total_len, chunks)
+
+    def _write(self, handle, total_len, chunks):
+        handle.write(struct.pack(">4sI4s", "FORM", total_len, "IFRS"))
+        for chunk_type, source, length in chunks:
+            if chunk_type is not None:
+                handle.write(struct.pack(">4sI", chunk_type, length))
+            _copy_source(source, handle, length)
+            if length % 2:
+                handle.write("\0")
+
+
+def _data_chunk(chunk_type, data):
+    return (chunk_type, buffer(data), len(data))
+
+
+def _chunk_size(chunk):
+    chunk_type, source, length = chunk
+    if chunk_type is not None:
+        length += 8
+    return length + length % 2
+
+
+def _get_size(source):
+    if isinstance(source, basestring):
+        return os.path.getsize(source)
+    elif hasattr(source, "read"):
+        try:
+            return os.fstat(source.fileno()).st_size - source.tell()
+        except (AttributeError, IOError, OSError):
+            position = source.tell()
+            source.seek(0, os.SEEK_END)
+            size = source.tell() - position
+            source.seek(position)
+            return size
+    return len(source)
+
+
+def _peek(source, length):
+    if isinstance(source, basestring):
+        with open(source, 'rb') as h:
+            return h.read(length)
+    elif hasattr(source, "read"):
+        position = source.tell()
+        header = source.read(length)
+        source.seek(position)
+        return header
+    return str(bytearray(source[:length]))
+
+
+def _deduce_img_format(source):
+    if isinstance(source, basestring):
+        with open(source, 'rb') as h:
+            return deduce_img_format(h)
+    return deduce_img_format(source)
+
+
+def _copy_source(source, handle, length):
+    if isinstance(source, basestring):
+        with open(source, 'rb') as h:
+            _copy_file(h, handle, length)
+    elif hasattr(source, "read"):
+        _copy_file(source, handle, length)
+    else:
+        handle.write(source)
+
+
+def _copy_file(source_handle, handle, length):
+    while length > 0:
+        block = source_handle.read(min(length, COPY_BLOCK_SIZE))
+        if not block:
+            raise BabelError("Resource shorter than expected")
+        handle.write(block)
+        length -= len(block)
 
 
 def get_format_name():
@@ -41,14 +520,10 @@ def get_format_name():
 
 
 def get_story_file_extension(file_buffer):
+    if isinstance(file_buffer, BlorbFile):
+        return file_buffer.get_story_file_extension()
     if claim_story_file(file_buffer):
-        story_format = get_story_format(file_buffer)
-        if story_format == "zcode":
-            return FORMAT_EXT[2]
-        elif story_format == "glulx":
-            return FORMAT_EXT[4]
-        else:
-            return FORMAT_EXT[0]
+        return BlorbFile(file_buffer).get_story_file_extension()
     return None
 
 
@@ -61,255 +536,115 @@ def get_file_extensions():
 
 
 def claim_story_file(file_buffer):
-    if len(file_buffer) < 16 or not file_buffer.startswith("FORM") \
+    if len(file_buffer) < 16 or not starts_with(file_buffer, "FORM") \
             or file_buffer[8:12] != "IFRS":
         return False
     return True
 
 
 def get_story_file_meta(file_buffer, truncate=False):
-    index, length = _get_chunk(file_buffer, "IFmd")
-    if index is None:
-        return None
-    return file_buffer[index:index + length]
+    return _get_blorb_file(file_buffer).get_story_file_meta(truncate)
 
 
 def get_story_file_cover(file_buffer):
-    i, length = _get_chunk(file_buffer, "Fspc")
-    if length < 4:
-        return None
-    i = read_int(file_buffer, i)
-    pict_i, pict_len = _get_resource(file_buffer, "Pict", i)
-    if pict_i is None:
-        return None
-    description = _get_resource_description(file_buffer, "Pict", i)
-    cover_data = file_buffer[pict_i:pict_i + pict_len]
-    cover_format = file_buffer[pict_i - 8:pict_i - 4]
-    if cover_format[:3] == "PNG":
-        ext = "png"
-        (width, height) = get_png_dim(cover_data)
-    elif cover_format == "JPEG":
-        ext = "jpg"
-        (width, height) = get_jpeg_dim(cover_data)
-    else:
-        raise BabelError("Unsupported image format")
-    cover = CoverImage(cover_data, ext, width, height, description)
-    return cover
+    return _get_blorb_file(file_buffer).get_story_file_cover()
 
 
 def get_story_file_ifid(file_buffer):
-    meta = get_story_file_meta(file_buffer)
-    if meta is None:
-        return [_get_embedded_ifid(file_buffer)]
-    story_dom = ifiction.get_ifiction_dom(meta)
-    story = ifiction.get_all_stories(story_dom)[0]
-    ident = ifiction.get_identification(story)
-    ifid_list = ident.get("ifid_list")
-    if ifid_list is None or len(ifid_list) == 0:
-        return [_get_embedded_ifid(file_buffer)]
-    return ifid_list
+    return _get_blorb_file(file_buffer).get_story_file_ifid()
 
 
 def get_story_file(file_buffer):
-    index, length = _get_resource(file_buffer, "Exec", 0)
-    if index is None:
-        return None
-    return file_buffer[index:index + length]
+    return _get_blorb_file(file_buffer).get_story_file()
 
 
 def get_story_format(file_buffer):
-    treaty_registry = {"ZCOD": "zcode", "GLUL": "glulx", "TAD2": "tads2",
-                       "TAD3": "tads3", "HUGO": "hugo", "ALAN": "alan",
-                       "ADRI": "adrift", "LEVE": "level9", "AGT": "agt",
-                       "MAGS": "magscrolls", "ADVS": "advsys",
-                       "EXEC": "executable"}
-    for story_format in treaty_registry:
-        index, length = _get_chunk(file_buffer, story_format)
-        if index is not None:
-            return treaty_registry.get(story_format)
-    return None
+    return _get_blorb_file(file_buffer).get_story_format()
+
+
+def iter_resources(file_buffer):
+    return _get_blorb_file(file_buffer).iter_resources()
+
+
+def get_resource_extension(chunk_type, data):
+    """Get a file name extension for a resource.
+
+    Args:
+        chunk_type: the resource's chunk type
+        data: the resource's data
+    Returns:
+        The extension, including the leading dot
+
+    """
+    story_format = TREATY_REGISTRY.get(chunk_type)
+    if story_format is not None:
+        handler = _get_handler(story_format)
+        ext = handler.get_story_file_extension(data)
+        if ext is None:
+            ext = handler.get_file_extensions()[0]
+        return ext
+    return RESOURCE_EXTENSIONS.get(chunk_type, ".bin")
 
 
 def create(out_file, story_file, story_format, ifiction_file=None,
            coverart_file=None):
-    treaty_registry = {"zcode": "ZCOD", "glulx": "GLUL", "tads2": "TAD2",
-                       "tads3": "TAD3", "hugo": "HUGO", "alan": "ALAN",
-                       "adrift": "ADRI", "level9": "LEVE", "agt": "AGT",
-                       "magscrolls": "MAGS", "advsys": "ADVS",
-                       "executable": "EXEC"}
-    story_len = os.path.getsize(story_file)
-    frmt = treaty_registry.get(story_format)
-    if frmt is None:
-        raise BabelError("Unsupported story format")
+    """Bundle a story file, and optionally iFiction metadata and cover
+    art, into a blorb.
+
+    The files are copied into the blorb in blocks, so they are never read
+    into memory whole and the output need not be seekable.  See
+    BlorbBuilder for blorbs with more resources.
+
+    Args:
+        out_file: the file path of the blorb file to write, or a file
+                  object open for writing
+        story_file: the file path of the story file
+        story_format: the format of the story
+        ifiction_file: the file path of an iFiction file (default: None)
+        coverart_file: the file path of a PNG or JPEG cover art file
+                       (default: None)
+    Raises:
+        BabelError: if the story or image format is not supported
+
+    """
+    builder = BlorbBuilder()
+    builder.add_story(story_file, story_format)
     if coverart_file is not None:
-        cover_len = os.path.getsize(coverart_file)
-        ridx_num = 2
-        with open(coverart_file) as h:
-            image_data = h.read()
-            cover_frmt = deduce_img_format(image_data)
-        if cover_frmt is None:
-            raise BabelError("Unsupported or broken image format")
-        elif cover_frmt == "png":
-            cover_frmt = "PNG "
-        else:
-            cover_frmt = "JPEG"
-    else:
-        cover_len = 0
-        ridx_num = 1
-    # RIdx: 4 byte resource count + 12 bytes per resource descriptor
-    ridx_len = 4 + ridx_num * 12
-    # Insert the story file after 12 byte FORM header, 12 byte RIdx
-    # header, and all 12 byte resource descriptors
-    story_start = 24 + ridx_num * 12
-    # The total length (in the FORM header chunk) is: 4 byte IFRS identifier
-    total_len = 4
-    #   + 8 byte RIdx header + RIdx length
-    total_len += 8 + ridx_len
-    #   + 8 byte EXEC header + story file length [+ pad byte]
-    total_len += 8 + story_len + (story_len % 2)
+        builder.add_picture(coverart_file, 1)
+        builder.set_frontispiece(1)
     if ifiction_file is not None:
-        if_len = os.path.getsize(ifiction_file)
-        if_chunk = (("4c", "IFmd"), ("L", if_len), ("file", ifiction_file))
-        # Total length increased by:
-        #   + 8 byte IFmd header + ifiction length [+ pad byte]
-        total_len += 8 + if_len + (if_len % 2)
-    if coverart_file is not None:
-        # Insert the cover file after the story and the 8 byte JPEG/PNG header
-        cover_start = story_start + story_len + 8
-        # The cover_chunk RIdx entry has already been counted in the
-        # total_len above (via ridx_len)
-        cover_chunk = (("4c", "Pict"), ("L", 1), ("L", cover_start))
-        cover_file_chunk = (("4c", cover_frmt), ("L", cover_len),
-                            ("file", coverart_file))
-        fspc_chunk = (("4c", "Fspc"), ("L", 4), ("L", 1))
-        # Total length increased by:
-        #     + 8 byte PNG/JPEG header + image length [+ pad byte]
-        total_len += 8 + cover_len + (cover_len % 2)
-        #     + 12 byte Fspc headerp
-        total_len += 12
-    else:
-        cover_chunk = None
-        cover_file_chunk = None
-        fspc_chunk = None
-    chunks = [(("4c", "FORM"), ("L", total_len), ("4c", "IFRS")),
-              (("4c", "RIdx"), ("L", ridx_len), ("L", ridx_num)),
-              (("4c", "Exec"), ("L", 0), ("L", story_start)),
-              cover_chunk,
-              (("4c", frmt), ("L", story_len), ("file", story_file)),
-              cover_file_chunk,
-              fspc_chunk,
-              if_chunk]
-    with open(out_file, 'wb') as h:
-        for chunk in chunks:
-            _write_chunk(h, chunk)
-
-
-def _write_chunk(handle, chunk):
-    if chunk is None or not chunk:
-        return
-    for fmt, data in chunk:
-        if fmt == "file":
-            with open(data, 'rb') as h:
-                data_bytes = h.read()
-        elif fmt == "4c":
-            data_bytes = struct.pack(">{0}".format(fmt), data[0],
-                                     data[1], data[2], data[3])
-        else:
-            data_bytes = struct.pack(">{0}".format(fmt), data)
-        handle.write(data_bytes)
-        if len(data_bytes) % 2:
-            handle.write(struct.pack(">c", '\0'))
+        builder.set_metadata(ifiction_file)
+    builder.write(out_file)
+
+
+def _get_blorb_file(file_buffer):
+    # The module functions accept a BlorbFile in place of the blorb data,
+    # so that callers which already hold one do not index the file again
+    if isinstance(file_buffer, BlorbFile):
+        return file_buffer
+    return BlorbFile(file_buffer)
+
+
+def _get_handler(story_format):
+    return importlib.import_module(
+        "treatyofbabel.formats.{0}".format(story_format))
 
 
 def _get_embedded_ifid(file_buffer):
-    story_file = get_story_file(file_buffer)
-    story_format = get_story_format(file_buffer)
-    if story_format == "zcode":
-        from treatyofbabel.formats import zcode as handler
-    elif story_format == "glulx":
-        from treatyofbabel.formats import glulx as handler
-    elif story_format == "tads2":
-        from treatyofbabel.formats import tads2 as handler
-    elif story_format == "tads3":
-        from treatyofbabel.formats import tads3 as handler
-    elif story_format == "hugo":
-        from treatyofbabel.formats import tads3 as handler
-    elif story_format == "alan":
-        from treatyofbabel.formats import tads3 as handler
-    elif story_format == "adrift":
-        from treatyofbabel.formats import tads3 as handler
-    elif story_format == "level9":
-        from treatyofbabel.formats import level9 as handler
-    elif story_format == "agt":
-        from treatyofbabel.formats import agt as handler
-    elif story_format == "magscrolls":
-        from treatyofbabel.formats import magscrolls as handler
-    elif story_format == "advsys":
-        from treatyofbabel.formats import advsys as handler
-    elif story_format == "executable":
-        from treatyofbabel.formats import executable as handler
-    else:
-        raise BabelError("Unknown story format")
-    return handler.get_story_file_ifid(story_file)
+    return _get_blorb_file(file_buffer).get_embedded_ifid()
 
 
 def _get_chunk(file_buffer, chunk_id):
-    i = 12
-    while i < len(file_buffer) - 8:
-        length = read_int(file_buffer, i + 4)
-        if file_buffer[i:i + 4] == chunk_id:
-            if length > file_buffer:
-                return (None, None)
-            return (i + 8, length)
-        if length % 2 != 0:
-            length = length + 1
-        i = i + length + 8
-    return (None, None)
+    return _get_blorb_file(file_buffer).get_chunk(chunk_id)
 
 
 def _get_resource(file_buffer, resource, n):
-    r, length = _get_chunk(file_buffer, "RIdx")
-    if r is None:
-        return (None, None)
-    ridx = file_buffer[r+4:]
-    ridx_len = read_int(file_buffer, r)
-    for i in range(ridx_len):
-        if (ridx[i * 12:i * 12 + 4] == resource and
-                read_int(ridx, i * 12 + 4) == n):
-            j = i
-            i = read_int(ridx, j * 12 + 8)
-            begin = i + 8
-            out_len = read_int(file_buffer, i + 4)
-            return (begin, out_len)
-    return (None, None)
+    return _get_blorb_file(file_buffer).get_resource(resource, n)
 
 
 def _get_resources(file_buffer):
-    index, length = _get_chunk("RIdx")
-    number_resources = read_int(index, 0)
-    result = []
-    for i in xrange(0, number_resources):
-        rsc_name = index[4 + i * 12:8 + i * 12]
-        rsc_number = read_int(index, 8 + i * 12)
-        result.append((rsc_name, rsc_number))
-    return result
+    return _get_blorb_file(file_buffer).get_resources()
 
 
 def _get_resource_description(file_buffer, resource, n):
-    r, length = _get_chunk(file_buffer, "RDes")
-    if r is None:
-        return None
-    rdes = file_buffer[r+4:]
-    rdes_len = read_int(file_buffer, r)
-    n = 0
-    b = 0
-    while n < rdes_len:
-        res_usage = rdes[b:b+4]
-        res_num = read_int(rdes, b+4)
-        res_len = read_int(rdes, b+8)
-        if res_usage == resource and res_num == n:
-            text_start = b + 12
-            text = rdes[text_start:text_start+length]
-            return text
-        b += 12 + res_len
-    return None
+    return _get_blorb_file(file_buffer).get_resource_description(resource, n)